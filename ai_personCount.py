@@ -1,135 +1,129 @@
 import os
 import cv2
-import csv
 import numpy as np
 import json
 import argparse
-from datetime import datetime, timedelta # เพิ่ม timedelta
-import re
+import time
+from datetime import datetime
 from collections import deque # เพิ่ม deque
 
 # --- Dependencies ---
-from ultralytics import YOLO
-from sort import Sort
-# --- FIX: ตรวจสอบตำแหน่ง config/model_config ---
-try:
-    from config import model_config as cfg
-except ImportError:
-    try:
-        import model_config as cfg
-    except ImportError:
-        class DefaultConfig:
-            MAX_AGE_FRAMES = 120; SCORE_THR = 0.35
-            STATE_RETENTION_S = 10.0
-        cfg = DefaultConfig(); print("Warning: model_config.py not found.")
+from video_io import seek_to_msec, FrameReader
+from motion_gate import MotionGate
+from geometry import counting_roi, counting_points
+from output_sink import OutputSink
+from detection_cache import DetectionCache, DetectionCacheWriter, cache_key
+from timestamp_reader import TimestampClock, GlyphTimestampReader
+from counting_engine import cfg, CameraCounter
 
 # --- การตั้งค่าที่สำคัญ ---
 CONFIG_FILE = 'config/camera_config.json'
-BASE_OUTPUT_DIR = "qa_camera_check" # โฟลเดอร์หลัก
-BASE_OUTPUT_RESULT = "qa_camera_check/ai_result" # โฟลเดอร์หลัก
-SIGN_HISTORY_LENGTH = 3
 # --- REMOVED: INTERVAL_MINUTES ---
 
-current_run_timestamp = datetime.now().strftime('%Y%m%d%H%M%S') # เวลาที่เริ่มรันสคริปต์
-# --- Tesseract ---
-try:
-    import pytesseract
-    # TESSERACT_PATH = r'...'
-    # pytesseract.pytesseract.tesseract_cmd = TESSERACT_PATH
-except ImportError: pytesseract = None; print("Warn: pytesseract not found.")
-
-# =================== MODEL / TRACKER ====================
-print("Loading AI model...")
-model_path = "core/yolov8m.pt" if os.path.exists(os.path.join("core", "yolov8m.pt")) else "yolov8m.pt"
-if not os.path.exists(model_path):
-     model_path_n = "yolov8n.pt"; model_path_n_core = os.path.join("core", "yolov8n.pt")
-     if os.path.exists(model_path_n): model_path = model_path_n; print(f"Warn: {model_path} not found.")
-     elif os.path.exists(model_path_n_core): model_path = model_path_n_core; print(f"Warn: {model_path} not found.")
-     else: raise FileNotFoundError("Could not find yolov8m.pt or yolov8n.pt")
-model = YOLO(model_path, verbose=False)
-tracker = Sort(max_age=cfg.MAX_AGE_FRAMES, min_hits=3, iou_threshold=0.2)
-print("Model loaded successfully.")
+# --- Tesseract: ย้ายไป timestamp_reader.py ---
+
+# =================== MODEL ====================
+# --- MODIFIED: โหลด model ตอนใช้ครั้งแรก (ไม่ใช่ตอน import) -> --help / ชื่อกล้องผิด ไม่ต้องรอโหลด YOLO ---
+_model = None
+
+def find_model_path(warn=True):
+    """path ของ weights ที่จะใช้ (yolov8m ก่อน, ถ้าไม่มีใช้ yolov8n)"""
+    model_path = "core/yolov8m.pt" if os.path.exists(os.path.join("core", "yolov8m.pt")) else "yolov8m.pt"
+    if not os.path.exists(model_path):
+         model_path_n = "yolov8n.pt"; model_path_n_core = os.path.join("core", "yolov8n.pt")
+         if os.path.exists(model_path_n): 
+             if warn: print(f"Warn: {model_path} not found.")
+             model_path = model_path_n
+         elif os.path.exists(model_path_n_core): 
+             if warn: print(f"Warn: {model_path} not found.")
+             model_path = model_path_n_core
+         else: raise FileNotFoundError("Could not find yolov8m.pt or yolov8n.pt")
+    return model_path
+
+def load_model():
+    """โหลด YOLO ครั้งเดียวต่อ process แล้ว cache ไว้ (ultralytics/torch ก็ import ตอนนี้)"""
+    global _model
+    if _model is not None: return _model
+    print("Loading AI model...")
+    model_path = find_model_path()
+    from ultralytics import YOLO
+    _model = YOLO(model_path, verbose=False)
+    print("Model loaded successfully.")
+    return _model
+# --- END MODIFIED ---
 
 # ====================== HELPERS =========================
-def _cross_sign(p, a, b):
-    try: p_arr=np.array(p,dtype=np.float64); a_arr=np.array(a,dtype=np.float64); b_arr=np.array(b,dtype=np.float64)
-    except: return 0
-    val = (b_arr[0]-a_arr[0])*(p_arr[1]-a_arr[1])-(b_arr[1]-a_arr[1])*(p_arr[0]-a_arr[0])
-    return 0 if abs(val)<1e-9 else int(np.sign(val))
-
-def make_side_label(a, b):
-    a,b=np.array(a),np.array(b); mid_below=(a+b)/2.0+np.array([0,100]); return _cross_sign(mid_below,a,b)<0
-
-def get_timestamp_from_frame(frame, roi): # (ยังคงไว้สำหรับ UI Display)
-    if pytesseract is None or roi is None: return None
-    try:
-        x1,y1,x2,y2=roi; h,w,_=frame.shape; x1,y1=max(0,x1),max(0,y1); x2,y2=min(w,x2),min(h,y2)
-        if y2<=y1 or x2<=x1: return None
-        ts_img=frame[y1:y2,x1:x2]; gray=cv2.cvtColor(ts_img,cv2.COLOR_BGR2GRAY)
-        binary=cv2.adaptiveThreshold(gray,255,cv2.ADAPTIVE_THRESH_GAUSSIAN_C,cv2.THRESH_BINARY_INV, blockSize=7, C=3)
-        text=pytesseract.image_to_string(binary,config=r'--oem 3 --psm 6')
-        match = re.search(r'(\d{2})-(\d{2})-(\d{4}).*?(\d{2}:\d{2}:\d{2})', text.replace(" ", ""))
-        if match: 
-            day, month, year, time_str = match.groups()
-            try: return datetime.strptime(f"{day}-{month}-{year} {time_str}", '%d-%m-%Y %H:%M:%S')
-            except ValueError: return None
-    except Exception as e: return None
-    return None
-
-def ensure_dir(dir_path):
-    if not os.path.exists(dir_path): os.makedirs(dir_path); print(f"Created directory: {dir_path}")
-
-# --- NEW: Helper สำหรับแปลงวินาทีเป็น HH:MM:SS ---
-def format_seconds(seconds, hour_offset=None):
-    """แปลงวินาที (float) เป็น string 'HH:MM:SS'"""
-    if seconds is None: return "N/A"
-    
-    total_seconds = int(seconds)
-    
-    # ถ้ามี hour_offset ให้ใช้เป็นชั่วโมง
-    if hour_offset is not None:
-        # คำนวณนาทีและวินาทีที่เหลือ (โดยไม่สนชั่วโมงของ video time)
-        minutes = (total_seconds % 3600) // 60
-        seconds_rem = total_seconds % 60
-        return f"{hour_offset:02d}:{minutes:02d}:{seconds_rem:02d}"
-    else:
-        # ถ้าไม่มี ให้แปลงตามปกติ
-        return str(timedelta(seconds=total_seconds))
-# --- END NEW ---
+# (_cross_sign, make_side_label, format_seconds, ensure_dir ย้ายไป counting_engine.py; is_crossing_line -> geometry.LineSet)
+# (get_timestamp_from_frame ย้ายไป timestamp_reader.py)
+def _crop(frame, roi):
+    if roi is None: return frame, 0, 0
+    x1, y1, x2, y2 = roi
+    return np.ascontiguousarray(frame[y1:y2, x1:x2]), x1, y1
+
+def _person_dets(result, ox=0, oy=0):
+    dets = []
+    for box in result.boxes.data:
+        if len(box)>=6 and int(box[5])==0:
+            x1, y1, x2, y2 = [int(b) for b in box[:4]]
+            dets.append([x1 + ox, y1 + oy, x2 + ox, y2 + oy, float(box[4])])
+    return dets
+
+def detect_persons(frame, roi=None):
+    """
+    รัน YOLO กับเฟรม (หรือเฉพาะกรอบ roi = (x1, y1, x2, y2) ถ้ามี)
+    คืน list ของ [x1, y1, x2, y2, score] ของคน (class 0) ในพิกัดของเฟรมเต็ม
+    """
+    src, ox, oy = _crop(frame, roi)
+    dets = []
+    for r in load_model()(src, stream=True, conf=cfg.SCORE_THR, verbose=False): dets.extend(_person_dets(r, ox, oy))
+    return dets
 
-def is_crossing_line(p1, p2, a, b):
+def detect_persons_batch(frames, roi=None):
     """
-    ตรวจสอบว่าเส้นจาก p1 ไป p2 ตัดกับเส้น a ไป b หรือไม่
-    (ปรับปรุงให้รองรับกรณีจุดอยู่บนเส้น)
+    เหมือน detect_persons แต่ส่งหลายเฟรมเข้า model ใน forward pass เดียว คืน list ของ dets ต่อเฟรม
+    roi เป็นกรอบเดียวใช้กับทุกเฟรม หรือ list ของกรอบต่อเฟรม (เฟรมจากหลายกล้อง)
     """
-    # ตรวจสอบชนิดข้อมูลก่อนเรียก _cross_sign
-    if p1 is None or p2 is None or a is None or b is None:
-        return False
-        
-    s1 = _cross_sign(p1, a, b)
-    s2 = _cross_sign(p2, a, b)
-    
-    # กรณีทั่วไป: ข้ามเส้น (อยู่คนละฝั่ง)
-    if s1 * s2 < 0:
-        s3 = _cross_sign(a, p1, p2)
-        s4 = _cross_sign(b, p1, p2)
-        if s3 * s4 <= 0: return True
-             
-    # กรณีพิเศษ: จุดใดจุดหนึ่งอยู่บนเส้นพอดี
-    elif s1 == 0 and s2 != 0:
-        s3 = _cross_sign(a, p1, p2)
-        s4 = _cross_sign(b, p1, p2)
-        if s3 * s4 <= 0: return True
-             
-    elif s2 == 0 and s1 != 0:
-        s3 = _cross_sign(a, p1, p2)
-        s4 = _cross_sign(b, p1, p2)
-        if s3 * s4 <= 0: return True
+    rois = roi if isinstance(roi, list) else [roi] * len(frames)
+    crops = [_crop(f, r) for f, r in zip(frames, rois)]
+    results = load_model()([c[0] for c in crops], conf=cfg.SCORE_THR, verbose=False)
+    return [_person_dets(r, ox, oy) for r, (_, ox, oy) in zip(results, crops)]
 
-    return False
+# --- NEW: Detection cache (detections ดิบต่อเฟรม) -> รันซ้ำหลังแก้เส้น/พารามิเตอร์โดยไม่ต้องรัน YOLO ใหม่ ---
+def open_detection_cache(video_path, roi, stride=1):
+    """
+    คืน (cache, writer, full_frame_fallback):
+    cache = DetectionCache ที่ key ตรงกัน (None ถ้าไม่มี)
+    writer = DetectionCacheWriter ของ key นี้ สำหรับบันทึกเฟรมที่ต้องรัน detector จริงในรอบนี้ (รวมกับ cache เดิมตอนจบ)
+    key = video content hash + model weights + SCORE_THR + crop ที่ส่งเข้า detector + stride
+    เฟรมที่ cache ของ crop นี้ไม่มี จะใช้ cache ที่รันแบบเต็มเฟรม (--full_frame) ถ้ามี (full_frame_fallback = True)
+    -> บันทึกครั้งเดียวด้วย --full_frame แล้วปรับเส้น/pink_zone (ซึ่งเปลี่ยน crop) ได้โดยไม่ต้องรัน YOLO อีก
+    (เฟรมที่ต้องรัน detector เพิ่มยังใช้ crop และถูกบันทึกลง cache ของ crop)
+    """
+    cache_dir = getattr(cfg, 'DETECTION_CACHE_DIR', 'qa_camera_check/detection_cache')
+    model_path = find_model_path(warn=False)
+    key, parts = cache_key(video_path, model_path, cfg.SCORE_THR, {"roi": list(roi) if roi is not None else None}, stride)
+    cache = DetectionCache.open(cache_dir, video_path, key)
+    if cache is not None: print(f"Detection cache: {cache.path} ({len(cache)} frames)")
+    writer = DetectionCacheWriter(cache_dir, video_path, key, parts, base=cache)
+    full = None
+    if roi is not None and getattr(cfg, 'DETECTION_CACHE_FULL_FRAME_FALLBACK', True):
+        full_key, _ = cache_key(video_path, model_path, cfg.SCORE_THR, {"roi": None}, stride)
+        full = DetectionCache.open(cache_dir, video_path, full_key)
+        if full is not None:
+            print(f"Detection cache: full-frame fallback {full.path} ({len(full)} frames)")
+            if cache is None: cache = full
+            else: cache.fallback = full
+    return cache, writer, full is not None
+
+def _warn_mixed_detections(roi):
+    print(f"Warn: frames missing from the full-frame detection cache are inferred on the crop {roi}; "
+          f"this run mixes full-frame and crop detections (record with --full_frame to avoid it).")
+    return True
+# --- END NEW ---
 
 # ====================== MAIN LOGIC =========================
-def main():
+def main(argv=None):
+    """argv = list ของ argument (None = sys.argv) เพื่อให้ warm worker เรียกซ้ำใน process เดิมได้"""
     # --- MODIFIED: เพิ่ม Arguments สำหรับ Time Range (ใช้ นาที) และ Hour Offset ---
     parser = argparse.ArgumentParser(description="Person Counter (Summary Log + Time Range)")
     parser.add_argument("camera_name", help="Name of the camera config.")
@@ -137,9 +131,19 @@ def main():
     parser.add_argument("--duration_min", type=int, default=None, help="Process for this many minutes (default: process until end of video)")
     # --- NEW: เพิ่ม Argument สำหรับ Hour Offset ---
     parser.add_argument("--video_hour", type=int, default=None, help="Manual hour (e.g., 18) to use for the Log file")
+    parser.add_argument("--stride", type=int, default=1, help="Analyse every Nth frame; skipped frames are grabbed but never decoded to BGR (default: 1)")
+    parser.add_argument("--analysis_fps", type=float, default=None, help="Target analysis fps (overrides --stride, e.g. 8)")
+    parser.add_argument("--full_frame", action="store_true", help="Run the detector on the full frame instead of the crop around the counting geometry")
+    parser.add_argument("--no_motion_gate", action="store_true", help="Run the detector on every frame (disable the pink_zone/line motion gate)")
+    parser.add_argument("--batch", type=int, default=getattr(cfg, 'INFERENCE_BATCH', 1), help="Frames per detector forward pass (offline runs; output is identical to --batch 1)")
+    parser.add_argument("--headless", action="store_true", help="No window and no per-frame drawing/OCR (snapshots are still annotated)")
+    parser.add_argument("--preview_every", "--preview-every", dest="preview_every", type=int, default=0, help="Write an annotated debug frame to disk every N analysed frames (0 = off)")
+    parser.add_argument("--prefetch", type=int, default=getattr(cfg, 'PREFETCH_FRAMES', 8), help="Frames decoded ahead in a background thread (0 = decode inline)")
+    parser.add_argument("--no_detection_cache", action="store_true", help="Always run the detector; do not read or write the per-video detection cache")
     # --- END NEW ---
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
     # --- END MODIFIED ---
+    run_timestamp = datetime.now().strftime('%Y%m%d%H%M%S') # เวลาที่เริ่ม task นี้ (warm worker รันหลาย task ต่อ process)
 
     # --- NEW: รับ Input Hour แบบ Interactive ---
     video_hour = None
@@ -158,32 +162,8 @@ def main():
     config = full_config[args.camera_name]
 
     video_path=config.get('video_path'); display_width=config.get('display_width',1280)
-    red_line=tuple(map(tuple,config['lines']['red']))
-    blue_line=tuple(map(tuple,config['lines']['blue']))
-    green_line=tuple(map(tuple,config['lines']['green']))
-    yellow_line=tuple(map(tuple,config['lines']['yellow']))
     pink_zone = config['pink_zone']
     timestamp_roi=config.get('timestamp_roi')
-    file_name=config.get('file_name');
-
-    # --- MODIFIED: สร้าง Path สำหรับการรันครั้งนี้ ---
-    run_output_dir = os.path.join(BASE_OUTPUT_DIR,"camera", args.camera_name, current_run_timestamp)
-    log_dir = os.path.join(run_output_dir, "logs")
-    person_snapshot_dir = os.path.join(run_output_dir, "person_snapshots")
-    ensure_dir(log_dir); ensure_dir(person_snapshot_dir)
-    
-    event_log_path = os.path.join(log_dir, f"event_log_{args.camera_name}_{current_run_timestamp}.csv")
-    summary_log_path = os.path.join(run_output_dir, f"summary_log_{args.camera_name}_{current_run_timestamp}.csv") # ไฟล์สรุป
-    
-    # --- NEW: กำหนด Path สำหรับ Master Log File ---
-    today_date_str = datetime.now().strftime('%Y%m%d')
-    master_log_filename = f"validation_{today_date_str}.csv"
-    master_log_path = os.path.join(BASE_OUTPUT_RESULT, master_log_filename)
-    # --- END NEW ---
-
-    print(f"--- Starting Run ---")
-    print(f"Event Log: {event_log_path}"); print(f"Snapshots: {person_snapshot_dir}"); print(f"Summary Log: {summary_log_path}")
-    # --- END MODIFIED ---
 
     cap = cv2.VideoCapture(video_path)
     if not cap.isOpened(): raise IOError(f"Cannot open video: {video_path}")
@@ -191,231 +171,171 @@ def main():
     if original_w==0 or original_h==0: raise IOError("Could not read video dimensions.")
     aspect=original_w/max(1,original_h); display_height=int(display_width/aspect)
 
-   
-    counts={"inbound":0}; person_states={}; next_pid=1
-    tid_to_pid = {}
-    
-    neg_is_bottom_red=make_side_label(red_line[0],red_line[1])
-    bottom_sign=-1 if neg_is_bottom_red else 1; top_sign=-bottom_sign
-    
-    video_start_time_processed = None
-    last_frame = None
-
-    try:
-        # --- MODIFIED: เปิดไฟล์ Event Log (เพิ่ม Header ใหม่) ---
-        with open(event_log_path, "w", newline="", encoding='utf-8') as csv_file:
-            csvw = csv.writer(csv_file, delimiter=','); 
-            csvw.writerow(["Cam_name","Timestamp","End_Time","TraceID","Status"])
-            # --- END MODIFIED ---
-
-            while True:
-                current_time_dt = datetime.now()
-                
-                ret, frame = cap.read()
-                if not ret: break
-
-                current_video_msec = cap.get(cv2.CAP_PROP_POS_MSEC)
-                current_video_sec = current_video_msec / 1000.0
-                
-                ocr_timestamp_dt = get_timestamp_from_frame(frame, timestamp_roi)
-                display_timestamp_str = ocr_timestamp_dt.strftime('%d-%m-%Y %H:%M:%S') if ocr_timestamp_dt else ""
-
-                # --- Time Range Check ---
-                process_this_frame = True
-                if current_video_sec < (args.start_min * 60):
-                    process_this_frame = False
-                elif video_start_time_processed is None:
-                    video_start_time_processed = current_video_sec
-                    print(f"Processing started at video time: {format_seconds(video_start_time_processed)}")
-                if args.duration_min is not None and video_start_time_processed is not None and \
-                   (current_video_sec - video_start_time_processed) > (args.duration_min * 60):
-                    print(f"Processing duration of {args.duration_min} minutes reached. Stopping.")
-                    break
-                if process_this_frame:
-                     video_end_time_processed = current_video_sec
-
-                if process_this_frame:
-                    dets=[]; tracks=np.empty((0,5)); valid_results=False
-                    results = model(frame, stream=True, conf=cfg.SCORE_THR, verbose=False)
-                    for r in results:
-                        valid_results=True
-                        for box in r.boxes.data:
-                            if len(box)>=6 and int(box[5])==0: dets.append([int(b) for b in box[:4]]+[float(box[4])])
-                    if valid_results: tracks=tracker.update(np.array(dets) if dets else np.empty((0,5)))
-                    live_tids = {int(t[4]) for t in tracks}
-
-                    # --- State Machine & Re-ID Logic ---
-                    processed_pids_this_frame = set()
-                    for x1, y1, x2, y2, tid in tracks:
-                        tid, bbox = int(tid), (int(x1), int(y1), int(x2), int(y2))
-                        cur_pos = np.array([(x1 + x2) / 2, y1])
-                        pid = tid_to_pid.get(tid)
-                        if pid is None or pid not in person_states:
-                            pid = next_pid; next_pid += 1
-                            tid_to_pid[tid] = pid
-                            # --- MODIFIED: เพิ่ม 'dot_color' ---
-                            person_states[pid] = {'state': 'waiting', 'sign_history': deque(maxlen=SIGN_HISTORY_LENGTH), 
-                                                  'last_frame_seen': frame.copy(), 'last_bbox': bbox, 
-                                                  'last_pos': cur_pos, 'last_tid': tid, 
-                                                  'last_seen_time': current_time_dt, 'prev_pos': None,
-                                                  'dot_color': (0, 0, 255)} # สีแดง BGR
-                        st = person_states[pid]
-                        st['tid'] = tid; st['last_bbox'] = bbox; st['last_frame_seen'] = frame.copy()
-                        st['last_pos'] = cur_pos; st['last_seen_time'] = current_time_dt
-                        processed_pids_this_frame.add(pid)
-                        prev_pos = st.get('prev_pos')
-
-                        if prev_pos is not None:
-                            crossed = is_crossing_line(prev_pos, cur_pos, red_line[0], red_line[1])
-                            if st['state'] == 'waiting' and crossed and cur_pos[1] > prev_pos[1]:
-                                st['state'] = 'crossed_red'
-                                st['dot_color'] = (0, 255, 0) # --- NEW: เปลี่ยนเป็นสีเขียว ---
-                                st['cross_time_sec'] = current_video_sec # <--- **เพิ่มบรรทัดนี้**
-                            elif st['state'] == 'crossed_red' and crossed and cur_pos[1] < prev_pos[1]:
-                                st['state'] = 'waiting'
-                                st['dot_color'] = (0, 0, 255) # --- NEW: เปลี่ยนกลับเป็นสีแดง ---
-                        
-                        st['prev_pos'] = cur_pos.copy()
+    # --- NEW: Frame stride (วิเคราะห์ทุก N เฟรม); SORT ถูกปรับตาม stride ใน CameraCounter ---
+    video_fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+    stride = max(1, args.stride)
+    if args.analysis_fps and video_fps > 0:
+        stride = max(1, int(round(video_fps / args.analysis_fps)))
+    # --- END NEW ---
 
-                        # --- MODIFIED: ใช้ dot_color จาก state ---
-                        dot_color = st.get('dot_color', (0, 0, 255)) # Default สีแดง
-                        cv2.rectangle(frame,(bbox[0],bbox[1]),(bbox[2],bbox[3]),(255,255,0),2)
-                        cv2.putText(frame,f'PID:{pid} ({st["state"]})',(bbox[0],max(20,bbox[1]-5)),cv2.FONT_HERSHEY_SIMPLEX,0.5,(255,255,255),1)
-                        cv2.circle(frame,(int(cur_pos[0]),int(cur_pos[1])),5, dot_color,-1) # ใช้ dot_color
-                        # --- END MODIFIED ---
+    # --- MODIFIED: Tracker, state machine และไฟล์ output ของกล้องนี้อยู่ใน CameraCounter ---
+    sink = OutputSink(workers=getattr(cfg, 'OUTPUT_WRITER_THREADS', 2), max_queue=getattr(cfg, 'OUTPUT_QUEUE_SIZE', 256))
+    # --- NEW: OCR timestamp เป็นครั้งคราว แล้วแปลงเวลาวิดีโอ -> เวลาจริง (แทน --video_hour เมื่อ anchor ได้) ---
+    ts_reader = GlyphTimestampReader(args.camera_name, min_score=getattr(cfg, 'OCR_TEMPLATE_MIN_SCORE', 0.8)) \
+        if getattr(cfg, 'OCR_TEMPLATE_ENABLED', True) else None
+    clock = TimestampClock(timestamp_roi, anchor_reads=getattr(cfg, 'OCR_ANCHOR_READS', 3), recheck_s=getattr(cfg, 'OCR_RECHECK_S', 60.0),
+                           sample_s=getattr(cfg, 'OCR_SAMPLE_S', 1.0), max_skew_s=getattr(cfg, 'OCR_MAX_SKEW_S', 2.0), reader=ts_reader)
+    counter = CameraCounter(args.camera_name, config, run_timestamp, video_hour=video_hour, stride=stride, sink=sink, clock=clock)
+    if stride > 1:
+        print(f"Frame stride: {stride} (~{video_fps / stride:.1f} fps analysed), SORT max_age={counter.max_age}, min_hits={counter.min_hits}")
+    # --- END MODIFIED ---
 
-                    # --- Process Disappeared People & Cleanup ---
-                    pids_to_remove = set()
-                    retention_seconds = getattr(cfg, 'STATE_RETENTION_S', 10.0)
-                    for pid, st in person_states.items():
-                        if pid not in processed_pids_this_frame:
-                            if st['state'] == 'crossed_red':
-                                 counts['inbound'] += 1
-                                 
-                                 # --- MODIFIED: ใช้เวลา "ข้ามเส้น" (Cross Time) ที่เก็บไว้ ---
-                                 cross_time_sec = st.get('cross_time_sec', current_video_sec) # 1. ดึงเวลาที่ข้ามเส้น
-                                 exit_time_sec = current_video_sec # 2. เวลาปัจจุบันคือเวลาที่หายไป
+    # --- NEW: Seek ไปยัง start_min ด้วย keyframe index แทนการ decode ทิ้งทีละเฟรม ---
+    if args.start_min > 0:
+        start_frame = seek_to_msec(cap, video_path, args.start_min * 60 * 1000.0)
+        print(f"Seeked to frame {start_frame} (start_min={args.start_min})")
+    # --- END NEW ---
 
-                                 # จัดรูปแบบเวลาทั้งสอง
-                                 cross_time_str = format_seconds(cross_time_sec, video_hour)
-                                 exit_time_str = format_seconds(exit_time_sec, video_hour)
+    # --- NEW: Motion gate บริเวณ pink_zone + เส้นนับ (ข้าม YOLO เมื่อไม่มีอะไรขยับ) ---
+    motion_gate = None
+    if getattr(cfg, 'MOTION_GATE_ENABLED', True) and not args.no_motion_gate:
+        motion_gate = MotionGate(counting_points(config), original_w, original_h,
+                                 scale=getattr(cfg, 'MOTION_GATE_SCALE', 0.25),
+                                 pixel_thr=getattr(cfg, 'MOTION_GATE_PIXEL_THR', 25),
+                                 min_changed_ratio=getattr(cfg, 'MOTION_GATE_MIN_CHANGED', 0.002),
+                                 hold_frames=getattr(cfg, 'MOTION_GATE_HOLD_FRAMES', 10))
+    # --- END NEW ---
 
-                                 video_time_str = format_seconds(cross_time_sec, video_hour) 
-                                 print(f"PID {pid}: Exited -> COUNT = {counts['inbound']} (Video Time: {video_time_str})")
-                                 csvw.writerow([args.camera_name, cross_time_str, exit_time_str, pid, 'entrance'])
-                                 # --- NEW: บันทึกลง Master Validation Log ---
-                                 try:
-                                     # หา Path ของโฟลเดอร์จากชื่อไฟล์
-                                     master_log_dir = os.path.dirname(master_log_path) #
-                                     ensure_dir(master_log_dir) # <-- ใช้ฟังก์ชันที่มีอยู่แล้ว
-                                     
-                                     # ตรวจสอบว่าไฟล์ Master Log มี Header หรือยัง (ถ้าเพิ่งสร้าง)
-                                     file_exists = os.path.isfile(master_log_path)
-                                     
-                                     with open(master_log_path, "a", newline="", encoding='utf-8') as master_f:
-                                         master_csvw = csv.writer(master_f, delimiter=',')
-                                         
-                                         if not file_exists:
-                                             master_csvw.writerow(["Cam_name", "Timestamp", "EndTime", "TraceID", "Status"]) # เขียน Header
-                                             
-                                         # เขียนข้อมูล (4 columns ตามที่คุณต้องการ)
-                                         master_csvw.writerow([file_name, cross_time_str, exit_time_str, pid, 'entrance'])
-                                 
-                                 except Exception as e:
-                                     print(f"Error writing to Master Log: {e}")
-                                 # --- END NEW ---
+    # --- NEW: Crop เฉพาะบริเวณเส้น/pink_zone ก่อนส่งเข้า detector ---
+    inference_roi = None
+    use_cache = getattr(cfg, 'DETECTION_CACHE_ENABLED', True) and not args.no_detection_cache
+    record_full = use_cache and getattr(cfg, 'DETECTION_CACHE_RECORD_FULL_FRAME', False)
+    if getattr(cfg, 'ROI_INFERENCE_ENABLED', True) and not args.full_frame and not record_full:
+        inference_roi = counting_roi(config, original_w, original_h, getattr(cfg, 'ROI_MARGIN_PX', 120))
+    if inference_roi is not None: print(f"Inference ROI: {inference_roi} (frame {original_w}x{original_h})")
+    else: print("Inference ROI: full frame")
+    # --- END NEW ---
+    # --- NEW: ใช้ detections จาก cache ถ้ามี; model โหลดเมื่อมีเฟรมที่ cache ไม่มีเท่านั้น ---
+    det_cache = cache_writer = None; mixed_warned = True
+    if use_cache:
+        det_cache, cache_writer, full_fallback = open_detection_cache(video_path, inference_roi, stride)
+        mixed_warned = not full_fallback
+    if det_cache is None: load_model() # หลังตรวจ config/วิดีโอแล้วเท่านั้น
+    # --- END NEW ---
+    reader = FrameReader(cap, prefetch=args.prefetch, stride=stride) # --- NEW: decode ล่วงหน้าใน background thread ---
+    batch_size = max(1, args.batch)
+    throughput = {"frames": 0, "inference_calls": 0, "inferred_frames": 0}
+    run_started = time.perf_counter()
 
-                                 last_frame_s = st.get('last_frame_seen')
-                                 if last_frame_s is not None:
-                                      frame_s = last_frame_s.copy()
-                                      cv2.polylines(frame_s, [np.array(pink_zone, dtype=np.int32)], isClosed=True, color=(255, 182, 193), thickness=2)
-                                      cv2.line(frame_s, red_line[0], red_line[1], (0,0,255), 2)
-                                      cv2.line(frame_s, blue_line[0], blue_line[1], (255,0,0), 2)
-                                      cv2.line(frame_s, green_line[0], green_line[1], (0,255,0), 2)
-                                      cv2.line(frame_s, yellow_line[0], yellow_line[1], (0,255,255), 2)
-                                      
-                                      last_bb = st.get('last_bbox')
-                                      if last_bb: cv2.rectangle(frame_s,(last_bb[0],last_bb[1]),(last_bb[2],last_bb[3]),(0,255,0),3)
-                                      video_time_fname = f"{int(cross_time_sec // 3600):02d}h{int((cross_time_sec % 3600) // 60):02d}m{int(cross_time_sec % 60):02d}s"
-                                      snap_f = os.path.join(person_snapshot_dir, f"inbound_pid{pid}_{video_time_fname}.jpg")
+    try:
+        # --- NEW: อ่านเฟรมเป็นชุดละ batch_size แล้วรัน detector ครั้งเดียวต่อชุด ---
+        # แต่ละเฟรมใน pending: [frame, video_msec, frame_idx, motion, dets]
+        # (dets = None คือยังไม่ได้รัน detector; tracker/state machine ยังเดินทีละเฟรมตามลำดับ)
+        pending = deque(); stream_done = False
+        while True:
+            if not pending and not stream_done:
+                while len(pending) < batch_size:
+                    ret, frame, current_video_msec, frame_idx = reader.read()
+                    if not ret: stream_done = True; break
+                    current_video_sec = current_video_msec / 1000.0
+
+                    # --- Time Range Check ---
+                    # (หลัง seek แล้วกรณีนี้แทบไม่เกิด แต่ถ้า backend seek ไม่ถึงก็ข้ามเฟรมโดยไม่ต้อง OCR/วาด)
+                    if current_video_sec < (args.start_min * 60):
+                        continue
+                    if args.duration_min is not None and counter.video_start_time_processed is not None and \
+                       (current_video_sec - counter.video_start_time_processed) > (args.duration_min * 60):
+                        print(f"Processing duration of {args.duration_min} minutes reached. Stopping.")
+                        stream_done = True; break
+                    counter.mark_processed(current_video_sec)
+
+                    motion = motion_gate.observe(frame) if motion_gate is not None else True
+                    # batch > 1 ต้อง copy เพราะ buffer ของ FrameReader ใช้ได้ถึง read() ครั้งถัดไปเท่านั้น
+                    pending.append([frame.copy() if batch_size > 1 else frame, current_video_msec, frame_idx, motion, None])
+
+                to_detect = [p for p in pending if p[3]]
+                if det_cache is not None:
+                    for p in to_detect: p[4] = det_cache.get(p[2])
+                    to_detect = [p for p in to_detect if p[4] is None]
+                if to_detect:
+                    if not mixed_warned: mixed_warned = _warn_mixed_detections(inference_roi)
+                    for p, dets in zip(to_detect, detect_persons_batch([p[0] for p in to_detect], inference_roi)): p[4] = dets
+                    throughput['inference_calls'] += 1; throughput['inferred_frames'] += len(to_detect)
+                    if cache_writer is not None:
+                        for p in to_detect: cache_writer.add(p[2], p[1], p[4], motion=p[3])
+            if not pending: break
+
+            frame, current_video_msec, frame_idx, motion, dets = pending.popleft()
+            current_video_sec = current_video_msec / 1000.0
+            throughput['frames'] += 1
+
+            # --- MODIFIED: OCR เฉพาะรอบ anchor/recheck; เวลาที่แสดงคำนวณจาก mapping ---
+            clock.observe(frame, current_video_sec)
+            render_preview = args.preview_every > 0 and throughput['frames'] % args.preview_every == 1 % args.preview_every
+            display_timestamp_str = ""
+            if not args.headless or render_preview:
+                wall_dt = clock.wall_time(current_video_sec)
+                display_timestamp_str = wall_dt.strftime('%d-%m-%Y %H:%M:%S') if wall_dt else ""
+            # --- END MODIFIED ---
 
-                                      cv2.imwrite(snap_f, frame_s); print(f"Saved snapshot: {os.path.basename(snap_f)}")
-                                      st['state'] = 'counted'
-                                 else: print(f"Warn: No snapshot for PID {pid}.")
-                            
-                            if current_time_dt - st.get('last_seen_time', datetime.min) > timedelta(seconds=retention_seconds):
-                                pids_to_remove.add(pid)
-                            elif st['state'] != 'counted':
-                                 st['state'] = 'waiting'
-                                 last_tid = st.get('last_tid')
-                                 if last_tid in tid_to_pid and tid_to_pid[last_tid] == pid: del tid_to_pid[last_tid]
-                    for pid in pids_to_remove:
-                        if pid in person_states:
-                            last_tid = person_states[pid].get('last_tid')
-                            if last_tid in tid_to_pid and tid_to_pid[last_tid] == pid: del tid_to_pid[last_tid]
-                            del person_states[pid]
-                
-                # --- UI Display ---
-                cv2.polylines(frame, [np.array(pink_zone, dtype=np.int32)], isClosed=True, color=(255, 182, 193), thickness=2)
-                cv2.line(frame, red_line[0], red_line[1], (0,0,255), 2)
-                cv2.line(frame, blue_line[0], blue_line[1], (255,0,0), 2)
-                cv2.line(frame, green_line[0], green_line[1], (0,255,0), 2)
-                cv2.line(frame, yellow_line[0], yellow_line[1], (0,255,255), 2)
-                
-                # --- MODIFIED: เพิ่ม Video Time (HH:MM:SS) ใต้ Inbound ---
-                inbound_text = f"Entrance: {counts['inbound']}" # แก้ไขคำว่า "Extrance"
-                video_time_text = f"Video Time: {format_seconds(current_video_sec, video_hour)}"
-                cv2.putText(frame, inbound_text, (10, original_h - 40), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
-                cv2.putText(frame, video_time_text, (10, original_h - 15), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 255), 2) # แสดงเวลาด้านล่าง
-                # --- END MODIFIED ---
-                
-                if display_timestamp_str:
-                     try:
-                          font_scale=0.6; thickness=1; font=cv2.FONT_HERSHEY_SIMPLEX; text_x,text_y=10,30
-                          (tw,th),bl=cv2.getTextSize(display_timestamp_str,font,font_scale,thickness)
-                          pad=5; bx1=max(text_x-pad,0); by1=max(text_y-th-pad-bl,0); bx2=min(text_x+tw+pad,frame.shape[1]); by2=min(text_y+pad,frame.shape[0])
-                          if by2>by1 and bx2>bx1: cv2.rectangle(frame,(bx1,by1),(bx2,by2),(0,0,0),-1)
-                     except: pass
-                cv2.putText(frame, display_timestamp_str, (10,30), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0,255,255), 1)
-                
-                cv2.imshow('Video Analysis', cv2.resize(frame, (display_width, display_height)))
-                k = cv2.waitKey(10) & 0xFF
-                if k == 27: break
-                elif k == ord('p'): paused = not paused
+            if motion_gate is None or motion_gate.decide(motion, counter.live_boxes):
+                if dets is None and det_cache is not None: dets = det_cache.get(frame_idx)
+                if dets is None: # gate เปิดเพราะมี track ค้างในโซน แต่เฟรมนี้ไม่ได้อยู่ใน batch
+                    if not mixed_warned: mixed_warned = _warn_mixed_detections(inference_roi)
+                    dets = detect_persons(frame, inference_roi)
+                    throughput['inference_calls'] += 1; throughput['inferred_frames'] += 1
+                    if cache_writer is not None: cache_writer.add(frame_idx, current_video_msec, dets, motion=motion)
+            else:
+                dets = [] # (gate ปิด: ส่ง detection ว่างให้ SORT เพื่อให้ track ageing ถูกต้อง)
+            if cache_writer is not None: cache_writer.add(frame_idx, current_video_msec, None, motion=motion) # timeline สำหรับ replay
+
+            # --- Tracking + State Machine + Count/Log/Snapshot ---
+            counter.update(frame, current_video_sec, dets, draw=not args.headless, frame_idx=frame_idx)
+            if render_preview: counter.save_preview(frame, current_video_sec, frame_idx, display_timestamp_str)
+
+            # --- UI Display ---
+            if args.headless: continue # --- NEW: ไม่วาด/resize/imshow/waitKey ---
+            counter.draw_overlay(frame, current_video_sec, display_timestamp_str)
+            cv2.imshow('Video Analysis', cv2.resize(frame, (display_width, display_height)))
+            k = cv2.waitKey(10) & 0xFF
+            if k == 27: break
+            elif k == ord('p'): paused = not paused
             
     except KeyboardInterrupt:
         print("\nUser interrupted process (Ctrl+C).")
         # --- NEW: บันทึกเวลา OCR สุดท้าย แม้จะกด Ctrl+C ---
         try:
-             video_end_time_processed = cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+             counter.video_end_time_processed = reader.position_msec / 1000.0
         except:
              pass # ถ้า cap ปิดไปแล้ว
         # --- END NEW ---
     finally:
-        # # --- บันทึก Summary Log ---
-        # print("\n--- Writing Summary Log ---")
-        # try:
-        #     with open(summary_log_path, "w", newline="", encoding='utf-8') as summary_f:
-        #         summary_csvw = csv.writer(summary_f, delimiter=',')
-        #         # --- NEW: เพิ่ม Header Hour Offset ---
-        #         summary_csvw.writerow(["Camera Name", "Total Inbound", "Video Start Time Processed (HH:MM:SS)", "Video End Time Processed (HH:MM:SS)", "Run Timestamp"])
-        #         # --- END NEW ---
-                
-        #         start_str = format_seconds(video_start_time_processed, video_hour)
-        #         end_str = format_seconds(video_end_time_processed, video_hour)
-        #         hour_offset_str = str(args.video_hour) if args.video_hour is not None else ""
-                
-        #         # --- NEW: เพิ่ม Data Hour Offset ---
-        #         summary_csvw.writerow([args.camera_name, counts["inbound"], start_str, end_str, current_run_timestamp])
-        #         # --- END NEW ---
-        #     print(f"Saved summary log to: {summary_log_path}")
-        # except Exception as e: print(f"Error writing summary log: {e}")
-        
-        # if 'csv_file' in locals() and csv_file is not None and not csv_file.closed:
-        #     csv_file.close()
-        #     print("Closed event log file.")
+        # --- NEW: Run Summary (สถิติ motion gate / throughput ต่อกล้อง) ---
+        run_stats = {}
+        if motion_gate is not None: run_stats.update(motion_gate.stats())
+        run_stats.update(clock.stats())
+        elapsed = time.perf_counter() - run_started
+        run_stats.update({"batch_size": batch_size, "frames_processed": throughput["frames"],
+                          "inference_calls": throughput["inference_calls"], "inferred_frames": throughput["inferred_frames"],
+                          "elapsed_s": round(elapsed, 2), "fps": round(throughput["frames"] / elapsed, 1) if elapsed > 0 else 0.0})
+        sink.flush() # --- NEW: รอ snapshot ที่ค้างในคิวให้เขียนเสร็จ (รวมกรณี Ctrl+C) ---
+        run_stats.update(sink.stats())
+        if det_cache is not None: run_stats.update(det_cache.stats())
+        if cache_writer is not None:
+            try:
+                saved = cache_writer.close({"stride": stride, "frame_size": [original_w, original_h],
+                                            "clock_history": [[sec, base.isoformat()] for sec, base in clock.history]})
+                if saved: print(f"Detection cache saved: {saved} ({cache_writer.inferred} new detector frames)")
+            except Exception as e:
+                print(f"Warn: could not save detection cache: {e}")
+        if det_cache is not None: det_cache.close()
+        counter.write_summary(run_stats)
+        counter.close()
+        sink.close()
+        # --- END NEW ---
+        reader.stop()
         cap.release()
-        cv2.destroyAllWindows()
+        if not args.headless: cv2.destroyAllWindows()
         print("Process finished.")
 
 if __name__ == "__main__":
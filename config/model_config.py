@@ -12,7 +12,7 @@ SAVE_SNAPSHOTS_MISS   = True
 
 # Tracking / Timing
 INBOUND_TIMEOUT_S   = 30.0
-STATE_RETENTION_S   = 25.0
+STATE_RETENTION_S   = 25.0  # วินาทีวิดีโอ (ไม่ใช่เวลาเครื่อง) ที่เก็บ state ของคนที่หายไป
 REID_MAX_GAP_S      = 8.0
 REID_DIST_PX        = 300
 REID_IOU_THRESH     = 0.01
@@ -20,6 +20,54 @@ MAX_AGE_FRAMES      = 120
 
 # Detection
 SCORE_THR           = 0.35
+ROI_INFERENCE_ENABLED = True  # รัน detector เฉพาะกรอบรอบเส้น/pink_zone
+ROI_MARGIN_PX         = 120   # margin รอบ geometry (override ต่อกล้องด้วย 'roi_margin')
+# Detection cache: detections ดิบต่อเฟรม (key = video + model + SCORE_THR + crop + stride) -> รันซ้ำโดยไม่ต้องรัน YOLO
+DETECTION_CACHE_ENABLED = True
+DETECTION_CACHE_DIR     = "qa_camera_check/detection_cache"
+DETECTION_CACHE_FULL_FRAME_FALLBACK = True  # เฟรมที่ cache ของ crop นี้ไม่มี -> ใช้ cache ที่บันทึกด้วย --full_frame
+DETECTION_CACHE_RECORD_FULL_FRAME = False   # True = รันเต็มเฟรมเสมอเมื่อเปิด cache (ช้ากว่า แต่ cache ใช้ต่อได้หลังแก้เส้น)
+
+# Decoding: จำนวนเฟรมที่ decode ล่วงหน้าใน background thread (0 = ปิด)
+PREFETCH_FRAMES     = 8
+INFERENCE_BATCH     = 1  # จำนวนเฟรมต่อ forward pass (--batch)
+
+# Output: snapshot/master log เขียนใน background threads (0 = เขียนทันทีใน loop หลัก)
+OUTPUT_WRITER_THREADS = 2
+OUTPUT_QUEUE_SIZE     = 256
+MASTER_LOG_FLUSH_S    = 5.0  # รวมแถว validation_<date>.csv แล้ว flush (ภายใต้ file lock) ทุกกี่วินาที
+
+# run_processor: warm worker process ที่โหลด model ค้างไว้ข้ามวิดีโอ
+WARM_WORKER_MAX_TASKS  = 20    # recycle worker หลังรันครบกี่ task (0 = subprocess ใหม่ทุก task)
+WARM_WORKER_MAX_RSS_MB = 6000  # recycle เมื่อ RSS หลังจบ task เกินนี้ (None = ไม่เช็ค)
+RUN_WORKERS            = 1     # run_processor --workers: จำนวนกล้องที่รันพร้อมกัน (แบ่ง core ให้เท่าๆ กัน)
+# task_store.py: คิวงานของ run_processor (SQLite) -> lease/heartbeat + retry แบบ backoff
+TASK_DB_PATH           = "qa_camera_check/tasks.sqlite3"
+TASK_LEASE_S           = 300.0 # task ที่ไม่ heartbeat นานเกินนี้ (processor ตาย) ถูก claim ใหม่ได้
+TASK_HEARTBEAT_S       = 30.0
+TASK_MAX_ATTEMPTS      = 3     # ล้มเหลวครบกี่ครั้งแล้วเลิก (status = gave_up)
+TASK_RETRY_BACKOFF_S   = 60.0  # retry ครั้งที่ n รอ backoff * 2^(n-1) วินาที
+# run_processor: output ของแต่ละ task -> qa_camera_check/task_logs/<camera>.log (rotate)
+TASK_LOG_DIR           = "qa_camera_check/task_logs"
+TASK_LOG_MAX_BYTES     = 5_000_000
+TASK_LOG_BACKUPS       = 3
+TASK_LOG_RING_LINES    = 200   # บรรทัดท้ายๆ ที่แนบกับ task record (last_error) ตอน fail
+
+# OCR timestamp: anchor จาก read ที่ตรงกันหลายครั้ง แล้ว OCR ซ้ำเป็นระยะเพื่อตรวจ drift/jump
+OCR_ANCHOR_READS = 3     # จำนวน read ติดกันที่ต้องตรงกัน
+OCR_SAMPLE_S     = 1.0   # ระยะห่าง (วินาทีวิดีโอ) ระหว่าง read ตอนยังไม่ anchor
+OCR_RECHECK_S    = 60.0  # OCR ซ้ำทุกกี่วินาทีหลัง anchor
+OCR_MAX_SKEW_S   = 2.0   # ต่างกันเกินนี้ = นาฬิกาไม่ตรง/กระโดด
+OCR_ANCHOR_WAIT_S = 120.0 # พักแถว event ไว้รอ anchor ได้นานสุดกี่วินาทีวิดีโอ (แล้วเขียนด้วย video_hour แบบเดิม)
+OCR_TEMPLATE_ENABLED   = True  # อ่านตัวเลขด้วย glyph template (เรียนจาก Tesseract, cache ต่อกล้อง)
+OCR_TEMPLATE_MIN_SCORE = 0.8   # score ต่ำกว่านี้ -> ใช้ Tesseract
+
+# Motion gate (ข้าม YOLO เมื่อไม่มีการเคลื่อนไหวใน pink_zone)
+MOTION_GATE_ENABLED      = True
+MOTION_GATE_SCALE        = 0.25   # ย่อภาพก่อนเทียบ
+MOTION_GATE_PIXEL_THR    = 25     # ค่าต่าง gray level ที่นับว่า pixel เปลี่ยน
+MOTION_GATE_MIN_CHANGED  = 0.002  # สัดส่วน pixel ที่เปลี่ยนขั้นต่ำ
+MOTION_GATE_HOLD_FRAMES  = 10     # เปิดต่อกี่เฟรมหลังเจอการเคลื่อนไหว
 
 # Anti-double-count (RED)
 RED_DEBOUNCE_S         = 0.6
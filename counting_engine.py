@@ -0,0 +1,370 @@
+import os
+import csv
+import math
+import cv2
+import numpy as np
+from datetime import timedelta
+from collections import deque
+
+from sort import Sort
+from geometry import LineSet
+from video_io import FrameRing, peak_memory_mb
+from output_sink import OutputSink
+from master_log import MasterLogWriter
+# --- FIX: ตรวจสอบตำแหน่ง config/model_config ---
+try:
+    from config import model_config as cfg
+except ImportError:
+    try:
+        import model_config as cfg
+    except ImportError:
+        class DefaultConfig:
+            MAX_AGE_FRAMES = 120; SCORE_THR = 0.35
+            STATE_RETENTION_S = 10.0
+        cfg = DefaultConfig(); print("Warning: model_config.py not found.")
+
+# --- การตั้งค่าที่สำคัญ ---
+BASE_OUTPUT_DIR = "qa_camera_check" # โฟลเดอร์หลัก
+BASE_OUTPUT_RESULT = "qa_camera_check/ai_result" # โฟลเดอร์หลัก
+SIGN_HISTORY_LENGTH = 3
+TRACKER_MIN_HITS = 3
+
+# ====================== HELPERS =========================
+def _cross_sign(p, a, b):
+    try: val = (float(b[0])-float(a[0]))*(float(p[1])-float(a[1]))-(float(b[1])-float(a[1]))*(float(p[0])-float(a[0]))
+    except (TypeError, ValueError, IndexError): return 0
+    return 0 if abs(val)<1e-9 else (1 if val > 0 else -1)
+
+def make_side_label(a, b):
+    a,b=np.array(a),np.array(b); mid_below=(a+b)/2.0+np.array([0,100]); return _cross_sign(mid_below,a,b)<0
+
+def ensure_dir(dir_path):
+    if not os.path.exists(dir_path): os.makedirs(dir_path); print(f"Created directory: {dir_path}")
+
+# --- NEW: Helper สำหรับแปลงวินาทีเป็น HH:MM:SS ---
+def format_seconds(seconds, hour_offset=None):
+    """แปลงวินาที (float) เป็น string 'HH:MM:SS'"""
+    if seconds is None: return "N/A"
+
+    total_seconds = int(seconds)
+
+    # ถ้ามี hour_offset ให้ใช้เป็นชั่วโมง
+    if hour_offset is not None:
+        # คำนวณนาทีและวินาทีที่เหลือ (โดยไม่สนชั่วโมงของ video time)
+        minutes = (total_seconds % 3600) // 60
+        seconds_rem = total_seconds % 60
+        return f"{hour_offset:02d}:{minutes:02d}:{seconds_rem:02d}"
+    else:
+        # ถ้าไม่มี ให้แปลงตามปกติ
+        return str(timedelta(seconds=total_seconds))
+# --- END NEW ---
+
+# ====================== PER-CAMERA COUNTER =========================
+class CameraCounter:
+    """
+    Logic การนับคนของกล้อง 1 ตัว แยกจาก video I/O และ model:
+    SORT tracker -> tid_to_pid -> person_states -> ตรวจการข้ามเส้นแดง -> event log / master log / snapshot
+    แต่ละกล้องมี tracker, state และไฟล์ output ของตัวเอง (ใช้หลายตัวพร้อมกันใน process เดียวได้)
+    """
+    def __init__(self, camera_name, config, run_timestamp, video_hour=None, stride=1, log_prefix="", sink=None, master_log=None, clock=None,
+                 frame_source=None):
+        self.camera_name = camera_name; self.run_timestamp = run_timestamp
+        self.video_hour = video_hour; self.log_prefix = log_prefix
+        self.clock = clock # TimestampClock (ถ้า anchor ได้จะใช้แทน video_hour)
+        # --- NEW: snapshot เขียนผ่าน OutputSink (ไม่ส่ง = เขียนทันทีแบบเดิม); master log ผ่าน MasterLogWriter ---
+        self.sink = sink if sink is not None else OutputSink(workers=0)
+        self.file_name = config.get('file_name')
+        self.red_line = tuple(map(tuple, config['lines']['red']))
+        self.blue_line = tuple(map(tuple, config['lines']['blue']))
+        self.green_line = tuple(map(tuple, config['lines']['green']))
+        self.yellow_line = tuple(map(tuple, config['lines']['yellow']))
+        self.pink_zone = config['pink_zone']
+        # --- NEW: ทุกเส้นใน config compile ครั้งเดียว; line_events = การข้ามทุกเส้นของเฟรมล่าสุด [(pid, line, direction)] ---
+        self.lines = LineSet.from_config(config); self._red = self.lines.index['red']
+        self.line_events = []
+
+        # --- NEW: ค่า tuning ต่อกล้อง (key ใน camera_config.json, เช่นจาก param_sweep.py --apply) ทับค่าใน model_config ---
+        self.max_age_frames = config.get('max_age_frames', cfg.MAX_AGE_FRAMES)
+        self.score_thr = config.get('score_thr') # กรอง detections ซ้ำหลัง detector (ใช้ได้เฉพาะค่าที่ >= SCORE_THR)
+        # --- END NEW ---
+        # --- SORT: ปรับ max_age/min_hits ตาม stride ให้ตรงกับ fps ที่วิเคราะห์จริง ---
+        self.max_age = max(1, int(math.ceil(self.max_age_frames / stride)))
+        self.min_hits = max(1, int(round(TRACKER_MIN_HITS / stride)))
+        self.tracker = Sort(max_age=self.max_age, min_hits=self.min_hits, iou_threshold=0.2)
+
+        self.counts = {"inbound": 0}; self.person_states = {}; self.next_pid = 1
+        self.tid_to_pid = {}
+        self.live_boxes = []; self.visible_pids = set()
+        # --- NEW: person state เก็บแค่ frame index (frame_ref) + bbox; ตัวภาพอยู่ใน ring ที่นับ reference ---
+        self.frame_ring = FrameRing(); self._frame_no = 0
+        # --- NEW: replay (update() ด้วย frame=None): frame_source(frame_idx) -> ภาพสำหรับ snapshot (None = ไม่ทำ snapshot) ---
+        self.frame_source = frame_source
+        # retention เป็นวินาทีวิดีโอ (เทียบกับ last_seen_time = current_video_sec) ไม่ใช่ datetime.now():
+        # ผลนับไม่ขึ้นกับความเร็วเครื่อง/stride และ replay จาก detection cache ได้ผลเหมือนรันจริง
+        self.retention_seconds = config.get('state_retention_s', getattr(cfg, 'STATE_RETENTION_S', 10.0))
+        self.video_start_time_processed = None
+        self.video_end_time_processed = None
+        # --- NEW: แถว event ที่เกิดก่อน clock anchor -> พักไว้แล้วเขียนด้วยเวลาจริงเมื่อ anchor ได้ (ทั้ง run ใช้ฐานเวลาเดียวกัน) ---
+        self._held_rows = [] # [(pid, cross_time_sec, exit_time_sec)]
+        self.anchor_wait_s = getattr(cfg, 'OCR_ANCHOR_WAIT_S', 120.0)
+
+        # --- MODIFIED: สร้าง Path สำหรับการรันครั้งนี้ ---
+        self.run_output_dir = os.path.join(BASE_OUTPUT_DIR, "camera", camera_name, run_timestamp)
+        log_dir = os.path.join(self.run_output_dir, "logs")
+        self.person_snapshot_dir = os.path.join(self.run_output_dir, "person_snapshots")
+        self.preview_dir = os.path.join(self.run_output_dir, "previews")
+        ensure_dir(log_dir); ensure_dir(self.person_snapshot_dir)
+        self.event_log_path = os.path.join(log_dir, f"event_log_{camera_name}_{run_timestamp}.csv")
+        self.summary_log_path = os.path.join(self.run_output_dir, f"summary_log_{camera_name}_{run_timestamp}.csv") # ไฟล์สรุป
+
+        # --- NEW: กำหนด Path สำหรับ Master Log File ---
+        today_date_str = run_timestamp[:8]
+        self.master_log_path = os.path.join(BASE_OUTPUT_RESULT, f"validation_{today_date_str}.csv")
+        # เปิดไฟล์ค้างไว้ + flush เป็นชุดภายใต้ file lock (ส่ง master_log มาเพื่อใช้ร่วมกันหลายกล้องใน process เดียว)
+        self._owns_master_log = master_log is None
+        self.master_log = master_log if master_log is not None else \
+            MasterLogWriter(self.master_log_path, flush_interval=getattr(cfg, 'MASTER_LOG_FLUSH_S', 5.0))
+        # --- END NEW ---
+
+        print(f"--- Starting Run ---")
+        print(f"Event Log: {self.event_log_path}"); print(f"Snapshots: {self.person_snapshot_dir}"); print(f"Summary Log: {self.summary_log_path}")
+
+        # --- MODIFIED: เปิดไฟล์ Event Log (เพิ่ม Header ใหม่) ---
+        self._csv_file = open(self.event_log_path, "w", newline="", encoding='utf-8')
+        self._csvw = csv.writer(self._csv_file, delimiter=',')
+        self._csvw.writerow(["Cam_name","Timestamp","End_Time","TraceID","Status"])
+
+    def format_time(self, video_sec):
+        """'HH:MM:SS' สำหรับ log: เวลาจริงจาก TimestampClock ถ้า anchor แล้ว ไม่งั้นใช้ format_seconds + video_hour แบบเดิม"""
+        wall_dt = self.clock.wall_time(video_sec) if self.clock is not None else None
+        if wall_dt is not None: return wall_dt.strftime('%H:%M:%S')
+        return format_seconds(video_sec, self.video_hour)
+
+    def _waiting_for_anchor(self, video_sec):
+        """clock ยังไม่ anchor แต่น่าจะได้ภายใน anchor_wait_s วินาทีวิดีโอแรกของ run"""
+        clock = self.clock
+        if clock is None or clock.anchored or not getattr(clock, 'enabled', True): return False
+        start = self.video_start_time_processed
+        return start is None or video_sec - start < self.anchor_wait_s
+
+    def _flush_held_rows(self):
+        rows, self._held_rows = self._held_rows, []
+        for pid, cross_time_sec, exit_time_sec in rows: self._write_count_row(pid, cross_time_sec, exit_time_sec)
+
+    def _write_count_row(self, pid, cross_time_sec, exit_time_sec):
+        cross_time_str = self.format_time(cross_time_sec); exit_time_str = self.format_time(exit_time_sec)
+        self._csvw.writerow([self.camera_name, cross_time_str, exit_time_str, pid, 'entrance'])
+        # --- NEW: บันทึกลง Master Validation Log (buffer แล้ว flush เป็นชุดโดย MasterLogWriter) ---
+        try: self.master_log.write_row([self.file_name, cross_time_str, exit_time_str, pid, 'entrance'])
+        except Exception as e: print(f"{self.log_prefix}Error writing to Master Log: {e}")
+        # --- END NEW ---
+
+    def mark_processed(self, video_sec):
+        """บันทึกช่วงเวลาวิดีโอที่ประมวลผลแล้ว (สำหรับ summary)"""
+        if self.video_start_time_processed is None:
+            self.video_start_time_processed = video_sec
+            print(f"{self.log_prefix}Processing started at video time: {format_seconds(video_sec)}")
+        self.video_end_time_processed = video_sec
+
+    def _release_frame(self, st):
+        if st.get('frame_ref') is not None:
+            self.frame_ring.release(st['frame_ref']); st['frame_ref'] = None
+
+    def update(self, frame, current_video_sec, dets, draw=True, frame_idx=None):
+        """
+        ประมวลผล 1 เฟรม: อัปเดต SORT ด้วย dets แล้วเดิน state machine ของทุกคน
+        เฟรมจะถูกคัดลอกเข้า frame_ring เฉพาะเมื่อมีคนสถานะ crossed_red (อาจต้องใช้ทำ snapshot); คืน tracks ของเฟรมนี้
+        frame=None (replay จาก detections ที่บันทึกไว้): เก็บแค่ frame index แล้วขอภาพจาก frame_source ตอนนับ
+        """
+        if frame_idx is None: frame_idx = self._frame_no
+        self._frame_no += 1
+        if self._held_rows and not self._waiting_for_anchor(current_video_sec): self._flush_held_rows()
+        if self.score_thr is not None and len(dets): dets = [d for d in dets if d[4] >= self.score_thr]
+        tracks = self.tracker.update(np.array(dets) if len(dets) else np.empty((0,5)))
+        self.live_boxes = [tuple(t[:4]) for t in tracks]
+        person_states = self.person_states; tid_to_pid = self.tid_to_pid
+
+        # --- State Machine & Re-ID Logic ---
+        processed_pids_this_frame = set()
+        pids = []; prev_pts = np.full((len(tracks), 2), np.nan); cur_pts = np.empty((len(tracks), 2))
+        for i, (x1, y1, x2, y2, tid) in enumerate(tracks):
+            tid, bbox = int(tid), (int(x1), int(y1), int(x2), int(y2))
+            cur_pos = np.array([(x1 + x2) / 2, y1])
+            pid = tid_to_pid.get(tid)
+            if pid is None or pid not in person_states:
+                pid = self.next_pid; self.next_pid += 1
+                tid_to_pid[tid] = pid
+                # --- MODIFIED: เพิ่ม 'dot_color' ---
+                person_states[pid] = {'state': 'waiting', 'sign_history': deque(maxlen=SIGN_HISTORY_LENGTH),
+                                      'frame_ref': None, 'last_bbox': bbox,
+                                      'last_pos': cur_pos, 'last_tid': tid,
+                                      'last_seen_time': current_video_sec, 'prev_pos': None,
+                                      'dot_color': (0, 0, 255)} # สีแดง BGR
+            st = person_states[pid]
+            st['tid'] = tid; st['last_bbox'] = bbox
+            st['last_pos'] = cur_pos; st['last_seen_time'] = current_video_sec
+            processed_pids_this_frame.add(pid)
+            if st.get('prev_pos') is not None: prev_pts[i] = st['prev_pos']
+            cur_pts[i] = cur_pos; pids.append(pid)
+            st['prev_pos'] = cur_pos.copy()
+
+        # --- NEW: prev->cur ของทุก track เทียบกับทุกเส้นใน NumPy ครั้งเดียว (แทนการทดสอบ _cross_sign ทีละ track ทีละเส้น) ---
+        crossed, direction = self.lines.crossings(prev_pts, cur_pts)
+        self.line_events = [(pids[i], name, d) for i, name, d in self.lines.events(crossed, direction)]
+        for i in np.flatnonzero(crossed[:, self._red]):
+            st = person_states[pids[i]]
+            if st['state'] == 'waiting' and cur_pts[i, 1] > prev_pts[i, 1]:
+                st['state'] = 'crossed_red'
+                st['dot_color'] = (0, 255, 0) # --- NEW: เปลี่ยนเป็นสีเขียว ---
+                st['cross_time_sec'] = current_video_sec # <--- **เพิ่มบรรทัดนี้**
+            elif st['state'] == 'crossed_red' and cur_pts[i, 1] < prev_pts[i, 1]:
+                st['state'] = 'waiting'
+                st['dot_color'] = (0, 0, 255) # --- NEW: เปลี่ยนกลับเป็นสีแดง ---
+        # --- END NEW ---
+
+        # --- NEW: เก็บภาพเฟรมนี้ (ก่อนวาดอะไรลงไป) เฉพาะเมื่อมีคนที่อาจถูกนับในเฟรมถัดๆ ไป ---
+        for pid in processed_pids_this_frame:
+            st = person_states[pid]
+            new_ref = None
+            if st['state'] == 'crossed_red': new_ref = self.frame_ring.put(frame_idx, frame) if frame is not None else frame_idx
+            self._release_frame(st); st['frame_ref'] = new_ref
+        # --- END NEW ---
+        if draw and frame is not None:
+            for pid in processed_pids_this_frame: self._draw_person(frame, pid, person_states[pid])
+
+        self.visible_pids = processed_pids_this_frame
+
+        # --- Process Disappeared People & Cleanup ---
+        pids_to_remove = set()
+        for pid, st in person_states.items():
+            if pid not in processed_pids_this_frame:
+                if st['state'] == 'crossed_red':
+                    self._count_exit(pid, st, current_video_sec)
+
+                if current_video_sec - st.get('last_seen_time', float('-inf')) > self.retention_seconds:
+                    pids_to_remove.add(pid)
+                elif st['state'] != 'counted':
+                     st['state'] = 'waiting'
+                     self._release_frame(st)
+                     last_tid = st.get('last_tid')
+                     if last_tid in tid_to_pid and tid_to_pid[last_tid] == pid: del tid_to_pid[last_tid]
+        for pid in pids_to_remove:
+            if pid in person_states:
+                last_tid = person_states[pid].get('last_tid')
+                if last_tid in tid_to_pid and tid_to_pid[last_tid] == pid: del tid_to_pid[last_tid]
+                self._release_frame(person_states[pid])
+                del person_states[pid]
+        return tracks
+
+    def _count_exit(self, pid, st, current_video_sec):
+        """คนที่ข้ามเส้นแดงแล้วหายไป -> นับ, เขียน log และบันทึก snapshot"""
+        self.counts['inbound'] += 1
+
+        # --- MODIFIED: ใช้เวลา "ข้ามเส้น" (Cross Time) ที่เก็บไว้ ---
+        cross_time_sec = st.get('cross_time_sec', current_video_sec) # 1. ดึงเวลาที่ข้ามเส้น
+        exit_time_sec = current_video_sec # 2. เวลาปัจจุบันคือเวลาที่หายไป
+
+        print(f"{self.log_prefix}PID {pid}: Exited -> COUNT = {self.counts['inbound']} (Video Time: {self.format_time(cross_time_sec)})")
+        # --- MODIFIED: เขียน event log / master log (พักไว้ก่อนถ้า clock ยังไม่ anchor) ---
+        if self._waiting_for_anchor(exit_time_sec): self._held_rows.append((pid, cross_time_sec, exit_time_sec))
+        else: self._write_count_row(pid, cross_time_sec, exit_time_sec)
+
+        frame_ref = st.get('frame_ref')
+        last_frame_s = self.frame_ring.get(frame_ref) if frame_ref is not None else None
+        if last_frame_s is None and frame_ref is not None and self.frame_source is not None:
+            last_frame_s = self.frame_source(frame_ref) # replay: seek วิดีโอไปยังเฟรมที่บันทึกไว้
+        if last_frame_s is not None:
+             frame_s = last_frame_s.copy()
+             self.draw_geometry(frame_s)
+
+             last_bb = st.get('last_bbox')
+             if last_bb: cv2.rectangle(frame_s,(last_bb[0],last_bb[1]),(last_bb[2],last_bb[3]),(0,255,0),3)
+             video_time_fname = f"{int(cross_time_sec // 3600):02d}h{int((cross_time_sec % 3600) // 60):02d}m{int(cross_time_sec % 60):02d}s"
+             snap_f = os.path.join(self.person_snapshot_dir, f"inbound_pid{pid}_{video_time_fname}.jpg")
+
+             self.sink.write_image(snap_f, frame_s); print(f"{self.log_prefix}Saved snapshot: {os.path.basename(snap_f)}")
+             st['state'] = 'counted'
+             self._release_frame(st)
+        elif frame_ref is not None and frame_ref not in self.frame_ring: # replay ที่ไม่ได้ขอ snapshot: state เหมือนตอนมีภาพ
+             st['state'] = 'counted'; st['frame_ref'] = None
+        else: print(f"{self.log_prefix}Warn: No snapshot for PID {pid}.")
+
+    def _draw_person(self, frame, pid, st):
+        # --- MODIFIED: ใช้ dot_color จาก state ---
+        bbox = st['last_bbox']; cur_pos = st['last_pos']
+        dot_color = st.get('dot_color', (0, 0, 255)) # Default สีแดง
+        cv2.rectangle(frame,(bbox[0],bbox[1]),(bbox[2],bbox[3]),(255,255,0),2)
+        cv2.putText(frame,f'PID:{pid} ({st["state"]})',(bbox[0],max(20,bbox[1]-5)),cv2.FONT_HERSHEY_SIMPLEX,0.5,(255,255,255),1)
+        cv2.circle(frame,(int(cur_pos[0]),int(cur_pos[1])),5, dot_color,-1) # ใช้ dot_color
+        # --- END MODIFIED ---
+
+    def save_preview(self, frame, current_video_sec, frame_idx, display_timestamp_str=""):
+        """
+        (Headless) บันทึกภาพ debug 1 เฟรมลงดิสก์: วาดบนสำเนา ไม่แตะเฟรมที่ใช้ประมวลผล
+        ใช้หลัง update() ของเฟรมเดียวกัน (วาด box ของคนที่เห็นในเฟรมนี้)
+        """
+        preview = frame.copy()
+        for pid in self.visible_pids:
+            st = self.person_states.get(pid)
+            if st is not None: self._draw_person(preview, pid, st)
+        self.draw_overlay(preview, current_video_sec, display_timestamp_str)
+        ensure_dir(self.preview_dir)
+        preview_f = os.path.join(self.preview_dir, f"preview_{frame_idx:07d}.jpg")
+        self.sink.write_image(preview_f, preview)
+        return preview_f
+
+    def draw_geometry(self, frame):
+        cv2.polylines(frame, [np.array(self.pink_zone, dtype=np.int32)], isClosed=True, color=(255, 182, 193), thickness=2)
+        cv2.line(frame, self.red_line[0], self.red_line[1], (0,0,255), 2)
+        cv2.line(frame, self.blue_line[0], self.blue_line[1], (255,0,0), 2)
+        cv2.line(frame, self.green_line[0], self.green_line[1], (0,255,0), 2)
+        cv2.line(frame, self.yellow_line[0], self.yellow_line[1], (0,255,255), 2)
+
+    def draw_overlay(self, frame, current_video_sec, display_timestamp_str=""):
+        """วาดเส้น/โซน, จำนวนที่นับได้, เวลาวิดีโอ และ timestamp (OCR) ลงบนเฟรมสำหรับแสดงผล"""
+        self.draw_geometry(frame)
+        frame_h = frame.shape[0]
+
+        # --- MODIFIED: เพิ่ม Video Time (HH:MM:SS) ใต้ Inbound ---
+        inbound_text = f"Entrance: {self.counts['inbound']}" # แก้ไขคำว่า "Extrance"
+        video_time_text = f"Video Time: {self.format_time(current_video_sec)}"
+        cv2.putText(frame, inbound_text, (10, frame_h - 40), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
+        cv2.putText(frame, video_time_text, (10, frame_h - 15), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 255), 2) # แสดงเวลาด้านล่าง
+        # --- END MODIFIED ---
+
+        if display_timestamp_str:
+             try:
+                  font_scale=0.6; thickness=1; font=cv2.FONT_HERSHEY_SIMPLEX; text_x,text_y=10,30
+                  (tw,th),bl=cv2.getTextSize(display_timestamp_str,font,font_scale,thickness)
+                  pad=5; bx1=max(text_x-pad,0); by1=max(text_y-th-pad-bl,0); bx2=min(text_x+tw+pad,frame.shape[1]); by2=min(text_y+pad,frame.shape[0])
+                  if by2>by1 and bx2>bx1: cv2.rectangle(frame,(bx1,by1),(bx2,by2),(0,0,0),-1)
+             except: pass
+        cv2.putText(frame, display_timestamp_str, (10,30), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0,255,255), 1)
+
+    def write_summary(self, extra_stats=None):
+        """เขียน Summary Log (1 แถว) + แสดงผลใน console"""
+        self._flush_held_rows() # run จบก่อน anchor -> เขียนด้วย video_hour แบบเดิม
+        run_stats = {"Camera Name": self.camera_name, "Total Inbound": self.counts["inbound"],
+                     "Video Start Time Processed (HH:MM:SS)": self.format_time(self.video_start_time_processed),
+                     "Video End Time Processed (HH:MM:SS)": self.format_time(self.video_end_time_processed),
+                     "Run Timestamp": self.run_timestamp}
+        run_stats.update(extra_stats or {})
+        try: self.master_log.flush()
+        except Exception as e: print(f"{self.log_prefix}Error writing to Master Log: {e}")
+        run_stats.update(self.master_log.stats())
+        run_stats.update(self.frame_ring.stats()); run_stats["peak_rss_mb"] = peak_memory_mb()
+        print(f"\n--- Run Summary {self.log_prefix}---")
+        for key, value in run_stats.items(): print(f"{key}: {value}")
+        try:
+            with open(self.summary_log_path, "w", newline="", encoding='utf-8') as summary_f:
+                summary_csvw = csv.DictWriter(summary_f, fieldnames=list(run_stats.keys()))
+                summary_csvw.writeheader(); summary_csvw.writerow(run_stats)
+            print(f"Saved summary log to: {self.summary_log_path}")
+        except Exception as e: print(f"Error writing summary log: {e}")
+        return run_stats
+
+    def close(self):
+        if self._csv_file is not None and not self._csv_file.closed:
+            self._flush_held_rows()
+            self._csv_file.close()
+        if self._owns_master_log: self.master_log.close()
@@ -3,30 +3,61 @@ import os
 import glob
 import datetime
 
+# ======================================================================
+# !! ตัวแปรตั้งค่า: !!
+# ======================================================================
+
+# 1. กำหนดจำนวนนาทีที่จะตรวจสอบ (จากต้นชั่วโมง)
+MINUTES_TO_CHECK = 1
+
+# 2. กำหนดชื่อคอลัมน์ "เวลา" ในไฟล์ TDG (AI Model for data validation.csv)
+TDG_TIMESTAMP_COLUMN = 'Timestamp' 
+
+# 3. !! ใหม่: กำหนด % Accuracy ขั้นต่ำสำหรับ 'Y'
+ACCURACY_CHECK_THRESHOLD = 50.0 
+
+# ======================================================================
+
+SS_FOLDER = "./ss_data/raw_data" #<- โฟลเดอร์ที่เก็บไฟล์ Excel (ground truth ต่อกล้อง: <Cam_name>.xlsx)
+
+
+# --- NEW: logic ที่ใช้ร่วมกับ param_sweep.py (นับใน window + สูตร accuracy เดียวกัน) ---
+def ss_event_times(df_cam):
+    """เวลา start_time ของแถว action == 1 ในไฟล์ SS (None = ไฟล์ไม่มีคอลัมน์ที่ต้องใช้)"""
+    if 'action' not in df_cam.columns or 'start_time' not in df_cam.columns: return None
+    times = pd.to_datetime(df_cam.loc[df_cam['action'] == 1, 'start_time'], errors='coerce')
+    return times.dropna()
+
+
+def count_in_window(times, minutes=MINUTES_TO_CHECK):
+    """
+    นับ event ใน window [ต้นชั่วโมงของ event แรก, + minutes) -> (count, earliest, window_start, window_end)
+    times ว่าง -> (0, None, None, None)
+    """
+    times = pd.Series(times).dropna().sort_values()
+    if times.empty: return 0, None, None, None
+    earliest = times.iloc[0]
+    start = earliest.replace(minute=0, second=0, microsecond=0)
+    limit = start + pd.Timedelta(minutes=minutes)
+    return int(((times >= start) & (times < limit)).sum()), earliest, start, limit
+
+
+def accuracy_pct(ss_count, tdg_count):
+    """(1 - |SS - TDG| / TDG) * 100, ปัดค่าติดลบเป็น 0; TDG = 0 -> 100 ถ้า SS = 0 ด้วย ไม่งั้น 0"""
+    if tdg_count == 0: return 100.0 if ss_count == 0 else 0.0
+    return max(0.0, (1 - (abs(ss_count - tdg_count) / tdg_count)) * 100)
+# --- END NEW ---
+
+
 def process_data_validation():
     
-    # ======================================================================
-    # !! ตัวแปรตั้งค่า: !!
-    # ======================================================================
-    
-    # 1. กำหนดจำนวนนาทีที่จะตรวจสอบ (จากต้นชั่วโมง)
-    MINUTES_TO_CHECK = 1
-    
-    # 2. กำหนดชื่อคอลัมน์ "เวลา" ในไฟล์ TDG (AI Model for data validation.csv)
-    TDG_TIMESTAMP_COLUMN = 'Timestamp' 
-    
-    # 3. !! ใหม่: กำหนด % Accuracy ขั้นต่ำสำหรับ 'Y'
-    ACCURACY_CHECK_THRESHOLD = 50.0 
-    
-    # ======================================================================
-    
     print(f"Starting Data Validation Process (v6 - Accuracy Logic)...")
     print(f"Config: Checking first {MINUTES_TO_CHECK} minutes of the hour.")
     print(f"Config: Accuracy Threshold set to {ACCURACY_CHECK_THRESHOLD}%.")
     
     # --- 1. กำหนด Path ---
     folder1_path = "./qa_camera_check/ai_result"  # <-- โฟลเดอร์ที่เก็บไฟล์ TDG
-    folder2_path = "./ss_data/raw_data" #<- โฟลเดอร์ที่เก็บไฟล์ Excel ที่ต้องการตรวจสอบ
+    folder2_path = SS_FOLDER #<- โฟลเดอร์ที่เก็บไฟล์ Excel ที่ต้องการตรวจสอบ
     output_folder_path = "./qa_camera_check/output" #<- โฟลเดอร์ที่เก็บไฟล์ Output
     
     today_date_str = datetime.datetime.now().strftime('%Y%m%d')
@@ -103,39 +134,20 @@ def process_data_validation():
             # !! ========================================================== !!
             print(f"--- DEBUG (SS count) ---")
             df_cam = pd.read_excel(xlsx_file_path)
+            ss_times = ss_event_times(df_cam)
             
-            if 'action' not in df_cam.columns or 'start_time' not in df_cam.columns:
+            if ss_times is None:
                 print(f"Warning: File {base_name} is missing 'action' or 'start_time' column. SS count = 0.")
                 ss_count = 0
+            elif ss_times.empty:
+                print(f"No 'action == 1' with a valid 'start_time'. SS count = 0.")
+                ss_count = 0
             else:
-                df_filtered = df_cam[df_cam['action'] == 1].copy()
-                print(f"Found {len(df_filtered)} rows with 'action == 1'.")
-                
-                if df_filtered.empty:
-                    print(f"No 'action == 1'. SS count = 0.")
-                    ss_count = 0
-                else:
-                    df_filtered['start_time'] = pd.to_datetime(df_filtered['start_time'], errors='coerce')
-                    df_filtered = df_filtered.dropna(subset=['start_time'])
-                    
-                    if df_filtered.empty:
-                        print(f"No valid 'start_time'. SS count = 0.")
-                        ss_count = 0
-                    else:
-                        df_sorted = df_filtered.sort_values(by='start_time')
-                        earliest_ss_time = df_sorted['start_time'].iloc[0]
-                        ss_min_time = earliest_ss_time.replace(minute=0, second=0, microsecond=0)
-                        ss_time_limit = ss_min_time + pd.Timedelta(minutes=MINUTES_TO_CHECK)
-                        
-                        print(f"(SS) Earliest timestamp: {earliest_ss_time}")
-                        print(f"(SS) Calculated window: {ss_min_time} TO {ss_time_limit}")
-
-                        df_ss_in_window = df_sorted[
-                            (df_sorted['start_time'] >= ss_min_time) & 
-                            (df_sorted['start_time'] < ss_time_limit)
-                        ]
-                        ss_count = len(df_ss_in_window)
-                        print(f"Result SS count (in window): {ss_count}")
+                print(f"Found {len(ss_times)} rows with 'action == 1' and a valid 'start_time'.")
+                ss_count, earliest_ss_time, ss_min_time, ss_time_limit = count_in_window(ss_times, MINUTES_TO_CHECK)
+                print(f"(SS) Earliest timestamp: {earliest_ss_time}")
+                print(f"(SS) Calculated window: {ss_min_time} TO {ss_time_limit}")
+                print(f"Result SS count (in window): {ss_count}")
 
             # 
             # !! ========================================================== !!
@@ -151,20 +163,11 @@ def process_data_validation():
                 tdg_count = 0
             else:
                 print(f"Found {len(df_tdg_cam_specific)} total rows for this Cam in TDG.")
-                df_tdg_cam_sorted = df_tdg_cam_specific.sort_values(by=TDG_TIMESTAMP_COLUMN)
-                
-                earliest_tdg_time = df_tdg_cam_sorted[TDG_TIMESTAMP_COLUMN].iloc[0]
-                tdg_min_time = earliest_tdg_time.replace(minute=0, second=0, microsecond=0)
-                tdg_time_limit = tdg_min_time + pd.Timedelta(minutes=MINUTES_TO_CHECK)
+                tdg_count, earliest_tdg_time, tdg_min_time, tdg_time_limit = \
+                    count_in_window(df_tdg_cam_specific[TDG_TIMESTAMP_COLUMN], MINUTES_TO_CHECK)
                 
                 print(f"(TDG) Earliest timestamp: {earliest_tdg_time}")
                 print(f"(TDG) Calculated window: {tdg_min_time} TO {tdg_time_limit}")
-
-                df_tdg_in_window = df_tdg_cam_sorted[
-                    (df_tdg_cam_sorted[TDG_TIMESTAMP_COLUMN] >= tdg_min_time) &
-                    (df_tdg_cam_sorted[TDG_TIMESTAMP_COLUMN] < tdg_time_limit)
-                ]
-                tdg_count = len(df_tdg_in_window)
                 print(f"Result TDG count (in window): {tdg_count}")
             
 
@@ -174,20 +177,8 @@ def process_data_validation():
             # !! ========================================================== !!
             print(f"--- RESULT ---")
             difference = abs(ss_count - tdg_count)
-            accuracy = 0.0 # ตั้งต้น
-            
-            if tdg_count == 0:
-                if ss_count == 0:
-                    accuracy = 100.0 # ตรงกัน (0 ทั้งคู่)
-                else:
-                    accuracy = 0.0 # ผิด (TDG คาดหวัง 0 แต่ SS ได้ {ss_count})
-            else:
-                # คำนวณ accuracy ตามสูตร
-                accuracy = (1 - (difference / tdg_count)) * 100
-            
-            # ถ้า SS มากกว่า TDG เยอะๆ accuracy อาจติดลบได้ ให้ปัดเป็น 0
-            if accuracy < 0:
-                accuracy = 0.0
+            # TDG = 0: 100% ถ้า SS = 0 ด้วย; ไม่งั้น (1 - diff/TDG) * 100 (ติดลบปัดเป็น 0)
+            accuracy = accuracy_pct(ss_count, tdg_count)
 
             # เปรียบเทียบกับ Threshold
             check_val = 'Y' if accuracy >= ACCURACY_CHECK_THRESHOLD else 'N'
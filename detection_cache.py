@@ -0,0 +1,279 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+from array import array
+
+import numpy as np
+
+# --- Detection cache: detections ดิบต่อเฟรม (หลัง SCORE_THR) เก็บแยกตาม video + model + preprocessing ---
+# <cache_dir>/<video>_<key>/
+#   frames.npy  structured (frame, msec, start, count, flags) ทุกเฟรมที่วิเคราะห์ เรียงตาม frame -> searchsorted ได้ทันที
+#               flags: INFERRED = มี detections ของเฟรมนี้, MOTION = motion gate เห็นการเคลื่อนไหว (ใช้ตอน replay)
+#   boxes.npy   int32 (N, 4) x1 y1 x2 y2 พิกัดเฟรมเต็ม
+#   scores.npy  float64 (N,)
+#   meta.json   ส่วนประกอบของ key (รวม stride) + จำนวนเฟรม/กล่อง + ข้อมูลของรอบที่บันทึก (ขนาดเฟรม, clock anchors)
+# เปิดด้วย np.load(mmap_mode='r') -> ไม่ต้องโหลดทั้งไฟล์เข้า RAM
+CACHE_VERSION = 3 # 3: stride อยู่ใน key
+FRAME_DTYPE = np.dtype([("frame", "<i8"), ("msec", "<f8"), ("start", "<i8"), ("count", "<i4"), ("flags", "u1")])
+INFERRED = 1
+MOTION = 2
+_HASH_CHUNK = 1 << 20   # 1 MiB
+_HASH_SAMPLES = 16      # จำนวนช่วงที่สุ่มอ่านจากไฟล์วิดีโอ
+
+_file_hash_memo = {}
+
+
+def video_fingerprint(video_path):
+    """
+    hash เนื้อหาวิดีโอแบบสุ่มช่วง: ขนาดไฟล์ + 16 ช่วง ช่วงละ 1 MiB กระจายทั้งไฟล์ (วิดีโอ 1 ชั่วโมงใช้เวลาไม่กี่ ms)
+    ไม่ขึ้นกับชื่อ/mtime -> copy/ย้ายไฟล์แล้ว cache ยังใช้ได้; ไฟล์ถูก encode ใหม่ -> key เปลี่ยน
+    """
+    size = os.path.getsize(video_path)
+    h = hashlib.sha1(str(size).encode())
+    with open(video_path, "rb") as f:
+        for i in range(_HASH_SAMPLES):
+            f.seek(max(0, (size - _HASH_CHUNK) * i // max(1, _HASH_SAMPLES - 1)))
+            h.update(f.read(_HASH_CHUNK))
+    return h.hexdigest()
+
+
+def file_hash(path):
+    """sha1 ของทั้งไฟล์ (ใช้กับ model weights); จำไว้ต่อ process ตาม path+size+mtime"""
+    st = os.stat(path)
+    memo_key = (os.path.abspath(path), st.st_size, st.st_mtime)
+    if memo_key not in _file_hash_memo:
+        h = hashlib.sha1()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(_HASH_CHUNK), b""): h.update(chunk)
+        _file_hash_memo[memo_key] = h.hexdigest()
+    return _file_hash_memo[memo_key]
+
+
+def cache_key(video_path, model_path, score_thr, preprocessing, stride=1):
+    """
+    คืน (key, parts); preprocessing = dict ของสิ่งที่เปลี่ยนภาพก่อนเข้า detector (เช่น crop roi)
+    stride อยู่ใน key: timeline ของ cache ถูกรวมข้ามหลายรอบ -> ระยะห่างเฟรมต้องเท่ากันทั้ง cache
+    (replay สร้าง CameraCounter(stride=...) จาก meta ซึ่ง max_age/min_hits ขึ้นกับ stride)
+    """
+    parts = {"version": CACHE_VERSION, "video": video_fingerprint(video_path), "model": file_hash(model_path),
+             "score_thr": float(score_thr), "preprocessing": preprocessing, "stride": int(stride)}
+    key = hashlib.sha1(json.dumps(parts, sort_keys=True).encode()).hexdigest()
+    return key, parts
+
+
+def find_caches(cache_dir, video_path):
+    """cache ทุกชุดของวิดีโอนี้ (ทุก model/SCORE_THR/crop) ใหม่สุดก่อน -> ใช้ตอน replay ที่ไม่รู้ crop ล่วงหน้า"""
+    if not os.path.isdir(cache_dir): return []
+    fingerprint = video_fingerprint(video_path); found = []
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        if ".tmp-" in name or ".old-" in name or not os.path.exists(os.path.join(path, "meta.json")): continue
+        try:
+            cache = DetectionCache(path)
+        except Exception:
+            continue
+        if cache.meta.get("parts", {}).get("video") == fingerprint: found.append(cache)
+    found.sort(key=lambda c: c.meta.get("created", ""), reverse=True)
+    return found
+
+
+def cache_path(cache_dir, video_path, key):
+    stem = os.path.splitext(os.path.basename(video_path))[0]
+    return os.path.join(cache_dir, f"{stem}_{key[:16]}")
+
+
+class DetectionCache:
+    """
+    อ่าน cache ที่บันทึกไว้: get(frame_idx) -> list ของ [x1, y1, x2, y2, score] หรือ None ถ้าเฟรมนี้ไม่มีใน cache
+    fallback = cache อีกชุด (เช่น แบบเต็มเฟรม) ที่ใช้กับเฟรมที่ชุดนี้ไม่มี detections
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "meta.json"), "r", encoding='utf-8') as f: self.meta = json.load(f)
+        self.frames = np.load(os.path.join(path, "frames.npy"), mmap_mode="r")
+        self.boxes = np.load(os.path.join(path, "boxes.npy"), mmap_mode="r")
+        self.scores = np.load(os.path.join(path, "scores.npy"), mmap_mode="r")
+        self._frame_idx = np.asarray(self.frames["frame"])
+        self._flags = np.asarray(self.frames["flags"])
+        self.hits = 0; self.misses = 0
+        self.fallback = None; self.fallback_hits = 0
+
+    @classmethod
+    def open(cls, cache_dir, video_path, key):
+        """None ถ้ายังไม่มี cache ของ key นี้ (หรือไฟล์เสีย)"""
+        path = cache_path(cache_dir, video_path, key)
+        if not os.path.exists(os.path.join(path, "meta.json")): return None
+        try:
+            cache = cls(path)
+        except Exception as e:
+            print(f"Warn: detection cache {path} unreadable ({e}); ignoring it.")
+            return None
+        return cache if cache.meta.get("key") == key else None
+
+    def __len__(self):
+        return len(self._frame_idx)
+
+    def _row(self, frame_idx):
+        i = int(np.searchsorted(self._frame_idx, frame_idx))
+        return i if i < len(self._frame_idx) and self._frame_idx[i] == frame_idx else None
+
+    def _dets(self, i):
+        start, count = int(self.frames["start"][i]), int(self.frames["count"][i])
+        boxes = self.boxes[start:start + count].tolist(); scores = self.scores[start:start + count].tolist()
+        return [b + [s] for b, s in zip(boxes, scores)]
+
+    def _from_fallback(self, frame_idx):
+        dets = self.fallback.get(frame_idx) if self.fallback is not None else None
+        if dets is not None: self.fallback_hits += 1
+        return dets
+
+    def get(self, frame_idx):
+        i = self._row(frame_idx)
+        if i is None or not self._flags[i] & INFERRED:
+            dets = self._from_fallback(frame_idx)
+            if dets is None: self.misses += 1
+            return dets
+        self.hits += 1
+        return self._dets(i)
+
+    def timeline(self):
+        """
+        ไล่ทุกเฟรมที่รอบบันทึกวิเคราะห์ตามลำดับ: (frame_idx, msec, motion, dets)
+        dets = None ถ้าเฟรมนั้นไม่ได้รัน detector (motion gate ปิด) และ fallback ก็ไม่มี
+        """
+        frames = np.asarray(self.frames)
+        for i in range(len(frames)):
+            flags = int(frames["flags"][i])
+            yield (int(frames["frame"][i]), float(frames["msec"][i]), bool(flags & MOTION),
+                   self._dets(i) if flags & INFERRED else self._from_fallback(int(frames["frame"][i])))
+
+    @property
+    def inferred_frames(self):
+        return int(np.count_nonzero(self._flags & INFERRED))
+
+    def msec(self, frame_idx):
+        i = self._row(frame_idx)
+        return None if i is None else float(self.frames["msec"][i])
+
+    def frame_indices(self):
+        return self._frame_idx
+
+    def stats(self):
+        stats = {"det_cache_hits": self.hits, "det_cache_misses": self.misses}
+        if self.fallback is not None: stats["det_cache_fallback_hits"] = self.fallback_hits
+        return stats
+
+    def close(self):
+        """ปล่อย mmap (Windows ลบ/เปลี่ยนชื่อ directory ที่ยังถูก map อยู่ไม่ได้)"""
+        self.frames = self.boxes = self.scores = None
+        self._frame_idx = np.zeros(0, np.int64); self._flags = np.zeros(0, np.uint8)
+        if self.fallback is not None: self.fallback.close()
+
+
+class DetectionCacheWriter:
+    """
+    เก็บ detections ของแต่ละเฟรมที่รัน detector จริง (append ลง array แบบ compact) แล้วเขียน cache ตอน close()
+    ถ้าให้ base (DetectionCache เดิมของ key เดียวกัน) มา จะรวมเฟรมเดิมกับเฟรมใหม่เป็น cache ชุดเดียว
+    (เช่น รอบก่อนรันแค่ช่วง --start_min/--duration_min หรือ motion gate ข้ามเฟรมที่รอบนี้ต้องใช้)
+    เขียนลง directory ชั่วคราวแล้วสลับชื่อ -> ผู้อ่านไม่เห็น cache ครึ่งๆ กลางๆ
+    """
+    def __init__(self, cache_dir, video_path, key, parts, base=None):
+        self.path = cache_path(cache_dir, video_path, key)
+        self.key = key; self.parts = parts; self.base = base
+        self.video_path = video_path
+        self._frame = array("q"); self._msec = array("d"); self._count = array("i"); self._flags = array("B")
+        self._boxes = array("i"); self._scores = array("d")
+        self._seen = set()
+        self.inferred = 0
+
+    def add(self, frame_idx, msec, dets=None, motion=True):
+        """
+        บันทึก 1 เฟรมที่วิเคราะห์: dets = detections จาก detector (None = เฟรมนี้ไม่ได้รัน detector
+        บันทึกไว้เป็น timeline สำหรับ replay) เฟรมเดิมซ้ำจะถูกข้าม -> เรียกตอนรัน detector ก่อน แล้วค่อยเรียกทุกเฟรม
+        """
+        if frame_idx in self._seen: return
+        self._seen.add(frame_idx)
+        self._frame.append(int(frame_idx)); self._msec.append(float(msec))
+        self._count.append(len(dets) if dets is not None else 0)
+        self._flags.append((INFERRED if dets is not None else 0) | (MOTION if motion else 0))
+        if dets is None: return
+        self.inferred += 1
+        for d in dets:
+            self._boxes.extend(int(v) for v in d[:4]); self._scores.append(float(d[4]))
+
+    def __len__(self):
+        return len(self._frame)
+
+    def _columns(self):
+        n = len(self._frame)
+        frames = np.zeros(n, dtype=FRAME_DTYPE)
+        frames["frame"] = np.frombuffer(self._frame, dtype=np.int64) if n else []
+        frames["msec"] = np.frombuffer(self._msec, dtype=np.float64) if n else []
+        counts = np.frombuffer(self._count, dtype=np.int32) if n else np.zeros(0, np.int32)
+        frames["count"] = counts
+        frames["start"] = np.concatenate(([0], np.cumsum(counts)[:-1])) if n else []
+        frames["flags"] = np.frombuffer(self._flags, dtype=np.uint8) if n else []
+        boxes = np.frombuffer(self._boxes, dtype=np.int32).reshape(-1, 4) if len(self._boxes) else np.zeros((0, 4), np.int32)
+        scores = np.frombuffer(self._scores, dtype=np.float64) if len(self._scores) else np.zeros(0, np.float64)
+        return frames, boxes, scores
+
+    def _merged(self):
+        """
+        รวมกับ cache เดิม: ต่อเฟรมเลือกแถวที่มี detections ก่อน (ของรอบนี้ก่อนของเดิม) แล้วค่อยแถว timeline
+        จากนั้นจัด boxes/scores ใหม่ให้ต่อเนื่องตามลำดับเฟรม (ไม่มีกล่องของแถวที่ถูกทิ้งค้างอยู่)
+        """
+        frames, boxes, scores = self._columns()
+        if self.base is not None and len(self.base):
+            old_frames = np.array(self.base.frames); old_frames["start"] += len(boxes)
+            frames = np.concatenate([frames, old_frames])
+            boxes = np.concatenate([boxes, np.asarray(self.base.boxes)]); scores = np.concatenate([scores, np.asarray(self.base.scores)])
+        order = np.lexsort((np.arange(len(frames)), -(frames["flags"].astype(np.int16) & INFERRED), frames["frame"]))
+        frames = frames[order]
+        first = np.ones(len(frames), dtype=bool); first[1:] = frames["frame"][1:] != frames["frame"][:-1]
+        frames = frames[first]
+        counts = frames["count"].astype(np.int64)
+        new_start = np.concatenate(([0], np.cumsum(counts)[:-1])) if len(frames) else np.zeros(0, np.int64)
+        idx = np.repeat(frames["start"] - new_start, counts) + np.arange(int(counts.sum()))
+        frames["start"] = new_start
+        return frames, boxes[idx], scores[idx]
+
+    def _merged_clock_history(self, history):
+        """
+        clock anchors ของรอบนี้ใช้ในช่วงเวลาวิดีโอที่รอบนี้ครอบคลุม; anchor ของรอบก่อนนอกช่วงนั้นเก็บไว้
+        (ไม่งั้นส่วนของ timeline ที่มาจากรอบก่อนจะถูก replay ด้วย mapping ของรอบล่าสุด)
+        """
+        old = self.base.meta.get("clock_history", []) if self.base is not None else []
+        msec = np.frombuffer(self._msec, dtype=np.float64)
+        lo, hi = float(msec.min()) / 1000.0, float(msec.max()) / 1000.0
+        return sorted([h for h in old if not lo <= float(h[0]) <= hi] + [list(h) for h in history], key=lambda h: float(h[0]))
+
+    def close(self, extra_meta=None):
+        """
+        เขียน cache (ถ้ามีเฟรมใหม่) คืน path หรือ None; extra_meta = ข้อมูลของรอบนี้ (เช่น frame_size) เก็บใน meta.json
+        extra_meta["clock_history"] ถูกรวมกับของ cache เดิมตามช่วงเวลาที่แต่ละรอบครอบคลุม
+        """
+        if not len(self): return None
+        if self.base is not None and not self.inferred and \
+                np.isin(np.frombuffer(self._frame, dtype=np.int64), self.base.frame_indices()).all():
+            return None # ทุกเฟรมของรอบนี้มีใน cache อยู่แล้ว
+        extra_meta = dict(extra_meta or {})
+        if "clock_history" in extra_meta: extra_meta["clock_history"] = self._merged_clock_history(extra_meta["clock_history"])
+        frames, boxes, scores = self._merged() # (ข้อมูลเดิมถูก copy ออกจาก mmap แล้ว)
+        if self.base is not None: self.base.close(); self.base = None
+        tmp = f"{self.path}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp, ignore_errors=True); os.makedirs(tmp)
+        np.save(os.path.join(tmp, "frames.npy"), frames)
+        np.save(os.path.join(tmp, "boxes.npy"), np.ascontiguousarray(boxes, dtype=np.int32))
+        np.save(os.path.join(tmp, "scores.npy"), np.ascontiguousarray(scores, dtype=np.float64))
+        meta = {"key": self.key, "parts": self.parts, "video_path": self.video_path, "frames": int(len(frames)),
+                "boxes": int(len(boxes)), "created": time.strftime("%Y-%m-%d %H:%M:%S")}
+        meta.update(extra_meta)
+        with open(os.path.join(tmp, "meta.json"), "w", encoding='utf-8') as f: json.dump(meta, f, indent=2)
+        old = None
+        if os.path.exists(self.path):
+            old = f"{self.path}.old-{os.getpid()}"; os.replace(self.path, old)
+        os.replace(tmp, self.path)
+        if old: shutil.rmtree(old, ignore_errors=True)
+        return self.path
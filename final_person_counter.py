@@ -5,12 +5,11 @@ import numpy as np
 import json
 import argparse
 from datetime import datetime, timedelta # เพิ่ม timedelta
-import re
 from collections import deque # เพิ่ม deque
 
 # --- Dependencies ---
-from ultralytics import YOLO
 from sort import Sort
+from timestamp_reader import get_timestamp_from_frame # import pytesseract ตอน OCR ครั้งแรก
 # --- FIX: ตรวจสอบตำแหน่ง config/model_config ---
 try:
     from config import model_config as cfg
@@ -30,28 +29,27 @@ SIGN_HISTORY_LENGTH = 3
 INTERVAL_MINUTES = 5 # กำหนดช่วงเวลาเป็น 5 นาที
 
 current_run_timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
-# --- Tesseract ---
-try:
-    import pytesseract
-    # TESSERACT_PATH = r'...'
-    # pytesseract.pytesseract.tesseract_cmd = TESSERACT_PATH
-except ImportError: pytesseract = None; print("Warn: pytesseract not found.")
+# --- Tesseract: ย้ายไป timestamp_reader.py (import ตอนใช้ครั้งแรก) ---
 
 # =================== MODEL / TRACKER ====================
 # ... (ส่วน Model/Tracker เหมือนเดิม) ...
-print("Loading AI model...")
-model_path = "core/yolov8m.pt" if os.path.exists(os.path.join("core", "yolov8m.pt")) else "yolov8m.pt"
-if not os.path.exists(model_path):
-     model_path_n = "yolov8n.pt"; model_path_n_core = os.path.join("core", "yolov8n.pt")
-     if os.path.exists(model_path_n): model_path = model_path_n; print(f"Warn: {model_path} not found.")
-     elif os.path.exists(model_path_n_core): model_path = model_path_n_core; print(f"Warn: {model_path} not found.")
-     else: raise FileNotFoundError("Could not find yolov8m.pt or yolov8n.pt")
-model = YOLO(model_path, verbose=False)
-tracker = Sort(max_age=cfg.MAX_AGE_FRAMES, min_hits=3, iou_threshold=0.2)
-print("Model loaded successfully.")
+# --- MODIFIED: โหลด model/tracker ตอนเริ่ม main() แทนตอน import ---
+model = None; tracker = None
+
+def load_model():
+    global model, tracker
+    if model is not None: return model
+    print("Loading AI model...")
+    from ai_personCount import find_model_path # (yolov8m ก่อน, ถ้าไม่มีใช้ yolov8n)
+    from ultralytics import YOLO
+    model = YOLO(find_model_path(), verbose=False)
+    tracker = Sort(max_age=cfg.MAX_AGE_FRAMES, min_hits=3, iou_threshold=0.2)
+    print("Model loaded successfully.")
+    return model
+# --- END MODIFIED ---
 
 # ====================== HELPERS =========================
-# ... (ฟังก์ชัน _cross_sign, make_side_label, get_timestamp_from_frame, ensure_dir เหมือนเดิม) ...
+# ... (ฟังก์ชัน _cross_sign, make_side_label, ensure_dir เหมือนเดิม; get_timestamp_from_frame อยู่ใน timestamp_reader.py) ...
 def _cross_sign(p, a, b):
     try: p_arr=np.array(p,dtype=np.float64); a_arr=np.array(a,dtype=np.float64); b_arr=np.array(b,dtype=np.float64)
     except: return 0
@@ -61,34 +59,6 @@ def _cross_sign(p, a, b):
 def make_side_label(a, b):
     a,b=np.array(a),np.array(b); mid_below=(a+b)/2.0+np.array([0,100]); return _cross_sign(mid_below,a,b)<0
 
-def get_timestamp_from_frame(frame, roi):
-    if pytesseract is None or roi is None: return None
-    try:
-        x1,y1,x2,y2=roi; h,w,_=frame.shape; x1,y1=max(0,x1),max(0,y1); x2,y2=min(w,x2),min(h,y2)
-        if y2<=y1 or x2<=x1: return None
-        ts_img=frame[y1:y2,x1:x2]; gray=cv2.cvtColor(ts_img,cv2.COLOR_BGR2GRAY)
-        
-        # --- ปรับปรุงการประมวลผลภาพสำหรับ ROI ที่เล็กลง ---
-        # ปรับ blockSize ให้เล็กลง (เช่น 7) และ C (เช่น 3)
-        binary=cv2.adaptiveThreshold(gray,255,cv2.ADAPTIVE_THRESH_GAUSSIAN_C,cv2.THRESH_BINARY_INV, blockSize=7, C=3)
-        # --- จบการปรับปรุง ---
-
-        text=pytesseract.image_to_string(binary,config=r'--oem 3 --psm 6')
-        
-        # --- MODIFIED: แก้ไข Regex ให้ตรงกับ DD-MM-YYYY ---
-        match = re.search(r'(\d{2})-(\d{2})-(\d{4}).*?(\d{2}:\d{2}:\d{2})', text.replace(" ", ""))
-        if match: 
-            day, month, year, time_str = match.groups() # <-- ดึง day, month, year
-            try: 
-                 # ใช้ day ที่ดึงมาได้เลย
-                 return datetime.strptime(f"{day}-{month}-{year} {time_str}", '%d-%m-%Y %H:%M:%S')
-            except ValueError: 
-                 return None
-    except Exception as e:
-        # print(f"OCR Error: {e}") # (Optional: Uncomment for debugging)
-        return None
-    return None
-
 def ensure_dir(dir_path):
     if not os.path.exists(dir_path): os.makedirs(dir_path); print(f"Created directory: {dir_path}")
 
@@ -143,6 +113,7 @@ def main():
     original_w=int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)); original_h=int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
     if original_w==0 or original_h==0: raise IOError("Could not read video dimensions.")
     aspect=original_w/max(1,original_h); display_height=int(display_width/aspect)
+    load_model() # หลังตรวจ config/วิดีโอแล้วเท่านั้น
 
     cv2.namedWindow("Video Analysis", cv2.WINDOW_NORMAL)
     paused=False; mouse_pos_raw=(-1,-1)
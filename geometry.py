@@ -0,0 +1,100 @@
+import numpy as np
+
+
+def bounding_rect(points, margin, frame_w, frame_h):
+    """
+    กรอบสี่เหลี่ยม (x1, y1, x2, y2) ที่ครอบจุดทั้งหมด + margin แล้ว clip ให้อยู่ในเฟรม
+    margin เป็น int (เท่ากันทุกด้าน) หรือ (mx, my); คืน None ถ้าไม่มีจุดหรือกรอบว่าง
+    """
+    pts = np.asarray([p for p in points if p is not None and len(p) >= 2], dtype=np.float64).reshape(-1, 2)
+    if len(pts) == 0: return None
+    mx, my = (margin, margin) if np.isscalar(margin) else (margin[0], margin[1])
+    x1 = max(0, int(np.floor(pts[:, 0].min() - mx))); y1 = max(0, int(np.floor(pts[:, 1].min() - my)))
+    x2 = min(int(frame_w), int(np.ceil(pts[:, 0].max() + mx))); y2 = min(int(frame_h), int(np.ceil(pts[:, 1].max() + my)))
+    if x2 <= x1 or y2 <= y1: return None
+    return (x1, y1, x2, y2)
+
+
+def rects_overlap(a, b):
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+def counting_points(config):
+    """จุดทั้งหมดของ pink_zone และเส้น red/blue/green/yellow (ใช้ทั้ง counting_roi และ MotionGate)"""
+    points = list(config.get('pink_zone') or [])
+    for line in (config.get('lines') or {}).values():
+        points.extend(line or [])
+    return points
+
+
+def counting_roi(config, frame_w, frame_h, default_margin=120, max_area_ratio=0.9):
+    """
+    กรอบสำหรับ crop ภาพก่อนส่งเข้า detector: ครอบเส้น red/blue/green/yellow และ pink_zone
+    + margin (ตั้งต่อกล้องได้ด้วย key 'roi_margin' ใน camera_config.json เป็น int หรือ [mx, my])
+    คืน None (= ใช้ทั้งเฟรม) ถ้าไม่มี geometry หรือกรอบใหญ่เกือบเต็มเฟรมอยู่แล้ว
+    """
+    rect = bounding_rect(counting_points(config), config.get('roi_margin', default_margin), frame_w, frame_h)
+    if rect is None: return None
+    area = (rect[2] - rect[0]) * (rect[3] - rect[1])
+    if area >= max_area_ratio * frame_w * frame_h: return None
+    return rect
+
+
+# --- NEW: เส้นนับทั้งหมดของกล้อง compile ครั้งเดียว แล้วทดสอบทุก track กับทุกเส้นใน NumPy ครั้งเดียวต่อเฟรม ---
+_CROSS_EPS = 1e-9 # |cross product| ต่ำกว่านี้ = อยู่บนเส้นพอดี (เหมือน _cross_sign)
+
+
+def _sign(val):
+    return (val >= _CROSS_EPS).view(np.int8) - (val <= -_CROSS_EPS).view(np.int8)
+
+
+class LineSet:
+    """
+    เส้น (เช่น red/blue/green/yellow ใน config['lines']) เก็บเป็น array จุดเริ่ม a และจุดปลาย b ขนาด (L, 2)
+    crossings(prev, cur): segment prev->cur ของ N track เทียบกับ L เส้นพร้อมกัน (broadcast (N, 1) x (1, L))
+    ผลตรงกับการทดสอบ _cross_sign ทีละคู่แบบเดิมทุกกรณี (รวมกรณีจุดใดจุดหนึ่งอยู่บนเส้นพอดี)
+    """
+    def __init__(self, lines):
+        items = [(name, line) for name, line in lines.items() if line is not None and len(line) >= 2]
+        self.names = tuple(name for name, _ in items)
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.a = np.array([line[0] for _, line in items], dtype=np.float64).reshape(-1, 2)
+        self.b = np.array([line[1] for _, line in items], dtype=np.float64).reshape(-1, 2)
+        self.d = self.b - self.a
+        self._ax, self._ay, self._dx, self._dy = (np.ascontiguousarray(v) for v in (self.a[:, 0], self.a[:, 1], self.d[:, 0], self.d[:, 1]))
+        ends = np.concatenate((self.a, self.b)) # (2L, 2): a ทุกเส้นแล้วตามด้วย b ทุกเส้น
+        self._ex, self._ey = np.ascontiguousarray(ends[:, 0]), np.ascontiguousarray(ends[:, 1])
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config.get('lines') or {})
+
+    def __len__(self):
+        return len(self.names)
+
+    def crossings(self, prev, cur):
+        """
+        prev, cur: (N, 2) ตำแหน่งก่อนหน้า/ปัจจุบันของแต่ละ track (แถว prev ที่เป็น NaN = ยังไม่มีตำแหน่งก่อนหน้า -> ไม่ข้าม)
+        คืน (crossed, direction) ขนาด (N, L): crossed = bool
+        direction = +1 ข้ามจากฝั่งลบไปฝั่งบวกของเส้น (cross product ของ a->b), -1 กลับกัน, 0 = ไม่ข้าม
+        """
+        cur = np.asarray(cur, dtype=np.float64).reshape(-1, 2)
+        prev = np.asarray(prev, dtype=np.float64).reshape(-1, 2)
+        if len(cur) == 0: return np.zeros((0, len(self)), dtype=bool), np.zeros((0, len(self)), dtype=np.int8)
+        prev = np.where(np.isnan(prev), cur, prev) # จุดเดียวกัน = ไม่ข้ามเส้นไหนเลย
+        n, L = len(cur), len(self)
+        pts = np.concatenate((prev, cur)) # ฝั่งของ prev / cur เทียบกับแต่ละเส้น: (b - a) x (p - a)
+        side = _sign(self._dx * (pts[:, 1:2] - self._ay) - self._dy * (pts[:, 0:1] - self._ax))
+        s1, s2 = side[:n], side[n:]
+        m = cur - prev # ฝั่งของปลายเส้น a / b เทียบกับ segment ของ track: (cur - prev) x (end - prev)
+        ends = _sign(m[:, 0:1] * (self._ey - prev[:, 1:2]) - m[:, 1:2] * (self._ex - prev[:, 0:1]))
+        s3, s4 = ends[:, :L], ends[:, L:]
+        crossed = (s1 != s2) & (s1 * s2 <= 0) & (s3 * s4 <= 0)
+        direction = np.sign(s2 - s1) * crossed
+        return crossed, direction
+
+    def events(self, crossed, direction):
+        """[(row, line_name, direction), ...] ของทุกคู่ track/เส้นที่ข้ามในเฟรมนี้"""
+        rows, cols = np.nonzero(crossed)
+        return [(int(r), self.names[c], int(direction[r, c])) for r, c in zip(rows, cols)]
+# --- END NEW ---
@@ -0,0 +1,96 @@
+import os
+import csv
+import io
+import time
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+MASTER_LOG_HEADER = ["Cam_name", "Timestamp", "EndTime", "TraceID", "Status"]
+
+
+def _lock_file(f):
+    """Exclusive lock ทั้งไฟล์ (รอจนได้) ระหว่าง process ที่เขียนไฟล์ validation เดียวกัน"""
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        return
+    f.seek(0)
+    while True:
+        try: msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1); return
+        except OSError: time.sleep(0.05)  # LK_LOCK ลองแค่ 10 ครั้งแล้ว raise
+
+
+def _unlock_file(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+        return
+    f.seek(0)
+    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class MasterLogWriter:
+    """
+    เขียน Master Validation Log (validation_<date>.csv) แบบเปิดไฟล์ค้างไว้ + รวมแถวเป็นชุด
+    - write_row() แค่เก็บเข้า buffer; background thread flush ทุก flush_interval วินาที
+    - ตอน flush จะถือ exclusive file lock แล้วเขียนทุกแถวใน buffer ต่อกันทีเดียว
+      (header เขียนภายใต้ lock เมื่อไฟล์ยังว่าง) -> หลาย process/กล้องเขียนพร้อมกันได้โดยแถวไม่ปนกัน
+    - close() flush ที่เหลือแล้วปิดไฟล์; flush_interval <= 0 = flush ทุกแถว
+    """
+    def __init__(self, path, flush_interval=5.0, header=MASTER_LOG_HEADER):
+        self.path = path; self.header = header
+        self.flush_interval = flush_interval
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._f = open(path, "a", newline="", encoding='utf-8')
+        self._rows = []
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self.rows_written = 0; self.flushes = 0
+        self._thread = None
+        if flush_interval > 0:
+            self._thread = threading.Thread(target=self._flush_loop, name="MasterLogWriter", daemon=True)
+            self._thread.start()
+
+    def write_row(self, row):
+        with self._lock:
+            if self._f is None: raise ValueError(f"Master log {self.path} is closed")
+            self._rows.append(list(row))
+        if self.flush_interval <= 0: self.flush()
+
+    def _flush_loop(self):
+        while not self._closed.wait(self.flush_interval):
+            try: self.flush()
+            except Exception as e: print(f"Error writing to Master Log: {e}")
+
+    def flush(self):
+        with self._lock:
+            if not self._rows or self._f is None: return
+            rows, self._rows = self._rows, []
+            buf = io.StringIO()
+            csv.writer(buf, delimiter=',').writerows(rows)
+            f = self._f
+            _lock_file(f)
+            try:
+                f.seek(0, os.SEEK_END)
+                if self.header and f.tell() == 0:
+                    csv.writer(f, delimiter=',').writerow(self.header)
+                f.write(buf.getvalue())
+                f.flush(); os.fsync(f.fileno())
+            finally:
+                _unlock_file(f)
+            self.rows_written += len(rows); self.flushes += 1
+
+    def close(self):
+        if self._closed.is_set(): return
+        self._closed.set()
+        if self._thread is not None: self._thread.join(timeout=5.0)
+        try: self.flush()
+        finally:
+            with self._lock:
+                if self._f is not None: self._f.close(); self._f = None
+
+    def stats(self):
+        return {"master_log_rows": self.rows_written, "master_log_flushes": self.flushes}
@@ -0,0 +1,59 @@
+import cv2
+
+from geometry import bounding_rect, rects_overlap
+
+
+class MotionGate:
+    """
+    ตัวกรองการเคลื่อนไหวราคาถูกบริเวณที่ใช้นับ ใช้ตัดสินว่าเฟรมนี้ต้องรัน YOLO หรือไม่
+    - zone_points: จุดของ pink_zone + เส้นนับ (geometry.counting_points) เพราะเส้น red อาจอยู่นอก pink_zone
+      ถ้าดูแค่ pink_zone คนที่เดินข้ามเส้นนอกโซนจะไม่ถูก detect -> track หลุด นับผิด
+    - ย่อภาพเฉพาะกรอบนั้น -> grayscale -> frame difference กับเฟรมก่อนหน้า
+    - มีการเคลื่อนไหว = สัดส่วน pixel ที่เปลี่ยนเกิน min_changed_ratio
+    - หลังพบการเคลื่อนไหวจะเปิดต่ออีก hold_frames เฟรม กันคนเดินช้าหลุด
+    ถ้าไม่มี pink_zone และเส้นใน config จะเปิดตลอด (รัน detector ทุกเฟรมแบบเดิม)
+    """
+    def __init__(self, zone_points, frame_w, frame_h, scale=0.25, pixel_thr=25,
+                 min_changed_ratio=0.002, hold_frames=10, margin=0):
+        self.rect = bounding_rect(zone_points or [], margin, frame_w, frame_h)
+        self.scale = scale; self.pixel_thr = pixel_thr
+        self.min_changed_ratio = min_changed_ratio; self.hold_frames = hold_frames
+        self._prev = None; self._hold = 0
+        self.hits = 0    # เฟรมที่รัน detector
+        self.misses = 0  # เฟรมที่ข้าม detector
+
+    def _has_motion(self, frame):
+        x1, y1, x2, y2 = self.rect
+        small = cv2.resize(frame[y1:y2, x1:x2], None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+        gray = cv2.GaussianBlur(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), (5, 5), 0)
+        prev, self._prev = self._prev, gray
+        if prev is None or prev.shape != gray.shape: return True
+        _, mask = cv2.threshold(cv2.absdiff(gray, prev), self.pixel_thr, 255, cv2.THRESH_BINARY)
+        return cv2.countNonZero(mask) >= self.min_changed_ratio * mask.size
+
+    def observe(self, frame):
+        """ส่วนที่ดูแค่ภาพ (รวม hold): True = มีการเคลื่อนไหวในกรอบ gate; ต้องเรียกทุกเฟรมตามลำดับ"""
+        if self.rect is None: return True
+        moving = self._has_motion(frame)
+        if moving: self._hold = self.hold_frames
+        elif self._hold > 0: self._hold -= 1; moving = True
+        return moving
+
+    def decide(self, moving, live_boxes=()):
+        """
+        True = ควรรัน detector กับเฟรมนี้
+        live_boxes: bbox ของ track ที่ยังเห็นอยู่; ถ้ามีกล่องไหนทับกรอบ gate จะรันเสมอ
+        (คนที่ยืนนิ่งในโซนจะได้ไม่หลุดจาก tracker)
+        """
+        if not moving and self.rect is not None and any(rects_overlap(self.rect, b) for b in live_boxes): moving = True
+        if moving: self.hits += 1
+        else: self.misses += 1
+        return moving
+
+    def check(self, frame, live_boxes=()):
+        return self.decide(self.observe(frame), live_boxes)
+
+    def stats(self):
+        total = self.hits + self.misses
+        saved = (100.0 * self.misses / total) if total else 0.0
+        return {"gate_inferred": self.hits, "gate_skipped": self.misses, "inference_saved_pct": round(saved, 1)}
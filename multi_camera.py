@@ -0,0 +1,185 @@
+import os
+import json
+import argparse
+import time
+from datetime import datetime
+import cv2
+
+# YOLO โหลดครั้งเดียวต่อ process (load_model cache ไว้) และใช้ร่วมกันทุกกล้อง
+from ai_personCount import CONFIG_FILE, load_model, detect_persons, detect_persons_batch
+from counting_engine import cfg, CameraCounter, BASE_OUTPUT_RESULT
+from video_io import seek_to_msec, FrameReader
+from motion_gate import MotionGate
+from geometry import counting_roi, counting_points
+from output_sink import OutputSink
+from master_log import MasterLogWriter
+from timestamp_reader import TimestampClock, GlyphTimestampReader
+
+
+class CameraStream:
+    """
+    สถานะของกล้อง 1 ตัวในโหมด multi-camera: VideoCapture + FrameReader + MotionGate + CameraCounter
+    (tracker, person_states และไฟล์ output แยกกันต่อกล้อง; ใช้ร่วมกันแค่ model)
+    """
+    def __init__(self, camera_name, config, run_timestamp, args, sink=None, master_log=None):
+        self.camera_name = camera_name
+        self.video_path = config.get('video_path')
+        self.cap = cv2.VideoCapture(self.video_path)
+        if not self.cap.isOpened(): raise IOError(f"Cannot open video: {self.video_path}")
+        w = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)); h = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        if w == 0 or h == 0: raise IOError("Could not read video dimensions.")
+
+        # ค่าต่อกล้องจาก camera_config.json (แบบเดียวกับที่ run_processor ส่งเป็น argument); CLI override ได้
+        self.start_min = args.start_min if args.start_min is not None else int(config.get('start_min') or 0)
+        self.duration_min = args.duration_min if args.duration_min is not None else config.get('duration_min')
+        stride = args.stride if args.stride is not None else int(config.get('stride') or 1)
+        analysis_fps = args.analysis_fps if args.analysis_fps is not None else config.get('analysis_fps')
+        video_fps = self.cap.get(cv2.CAP_PROP_FPS) or 0.0
+        if analysis_fps and video_fps > 0: stride = int(round(video_fps / float(analysis_fps)))
+        stride = max(1, stride)
+
+        ts_reader = GlyphTimestampReader(camera_name, min_score=getattr(cfg, 'OCR_TEMPLATE_MIN_SCORE', 0.8)) \
+            if getattr(cfg, 'OCR_TEMPLATE_ENABLED', True) else None
+        self.clock = TimestampClock(config.get('timestamp_roi'), anchor_reads=getattr(cfg, 'OCR_ANCHOR_READS', 3),
+                                    recheck_s=getattr(cfg, 'OCR_RECHECK_S', 60.0), sample_s=getattr(cfg, 'OCR_SAMPLE_S', 1.0),
+                                    max_skew_s=getattr(cfg, 'OCR_MAX_SKEW_S', 2.0), reader=ts_reader)
+        self.reader = None
+        try:
+            if self.start_min > 0:
+                start_frame = seek_to_msec(self.cap, self.video_path, self.start_min * 60 * 1000.0)
+                print(f"[{camera_name}] Seeked to frame {start_frame} (start_min={self.start_min})")
+
+            self.motion_gate = None
+            if getattr(cfg, 'MOTION_GATE_ENABLED', True) and not args.no_motion_gate:
+                self.motion_gate = MotionGate(counting_points(config), w, h,
+                                              scale=getattr(cfg, 'MOTION_GATE_SCALE', 0.25),
+                                              pixel_thr=getattr(cfg, 'MOTION_GATE_PIXEL_THR', 25),
+                                              min_changed_ratio=getattr(cfg, 'MOTION_GATE_MIN_CHANGED', 0.002),
+                                              hold_frames=getattr(cfg, 'MOTION_GATE_HOLD_FRAMES', 10))
+            self.roi = None
+            if getattr(cfg, 'ROI_INFERENCE_ENABLED', True) and not args.full_frame:
+                self.roi = counting_roi(config, w, h, getattr(cfg, 'ROI_MARGIN_PX', 120))
+
+            self.reader = FrameReader(self.cap, prefetch=args.prefetch, stride=stride)
+            # CameraCounter เปิดไฟล์ event log -> สร้างท้ายสุด (setup ก่อนหน้าพังแล้วไม่มีไฟล์ค้าง)
+            self.counter = CameraCounter(camera_name, config, run_timestamp, video_hour=args.video_hour,
+                                         stride=stride, log_prefix=f"[{camera_name}] ", sink=sink,
+                                         master_log=master_log, clock=self.clock)
+        except Exception:
+            if self.reader is not None: self.reader.stop()
+            self.cap.release(); raise
+        self.done = False
+        self.throughput = {"frames": 0, "inferred_frames": 0}
+
+    def next_frame(self):
+        """เฟรมถัดไปในช่วงเวลาที่ต้องวิเคราะห์ -> (frame, video_sec, motion, frame_idx) หรือ None เมื่อจบ"""
+        while not self.done:
+            ret, frame, msec, frame_idx = self.reader.read()
+            if not ret: self.done = True; break
+            sec = msec / 1000.0
+            if sec < self.start_min * 60: continue
+            start = self.counter.video_start_time_processed
+            if self.duration_min is not None and start is not None and (sec - start) > (float(self.duration_min) * 60):
+                print(f"[{self.camera_name}] Processing duration of {self.duration_min} minutes reached. Stopping.")
+                self.done = True; break
+            self.counter.mark_processed(sec)
+            self.throughput["frames"] += 1
+            self.clock.observe(frame, sec)
+            motion = self.motion_gate.observe(frame) if self.motion_gate is not None else True
+            return frame, sec, motion, frame_idx
+        return None
+
+    def close(self, elapsed, extra_stats=None):
+        run_stats = dict(extra_stats or {})
+        if self.motion_gate is not None: run_stats.update(self.motion_gate.stats())
+        run_stats.update(self.clock.stats())
+        run_stats.update({"frames_processed": self.throughput["frames"], "inferred_frames": self.throughput["inferred_frames"],
+                          "elapsed_s": round(elapsed, 2)})
+        self.counter.write_summary(run_stats)
+        self.counter.close()
+        self.reader.stop()
+        self.cap.release()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Person Counter - หลายกล้องใน process เดียว (โหลด model ครั้งเดียว)")
+    parser.add_argument("camera_names", nargs="*", help="Cameras from camera_config.json (default: all)")
+    parser.add_argument("--start_min", type=int, default=None, help="Override per-camera start_min")
+    parser.add_argument("--duration_min", type=int, default=None, help="Override per-camera duration_min")
+    parser.add_argument("--video_hour", type=int, default=None, help="Manual hour (e.g., 18) to use for the Log files")
+    parser.add_argument("--stride", type=int, default=None, help="Override per-camera stride")
+    parser.add_argument("--analysis_fps", type=float, default=None, help="Override per-camera analysis_fps")
+    parser.add_argument("--full_frame", action="store_true", help="Run the detector on the full frame instead of the counting ROI")
+    parser.add_argument("--no_motion_gate", action="store_true", help="Run the detector on every frame")
+    parser.add_argument("--preview_every", "--preview-every", dest="preview_every", type=int, default=0, help="Write an annotated debug frame per camera every N analysed frames (0 = off)")
+    parser.add_argument("--max_batch", type=int, default=16, help="Max frames per shared detector call (default: 16)")
+    parser.add_argument("--prefetch", type=int, default=getattr(cfg, 'PREFETCH_FRAMES', 8), help="Frames decoded ahead per camera")
+    args = parser.parse_args()
+
+    try:
+        with open(CONFIG_FILE, "r", encoding='utf-8') as f: full_config = json.load(f)
+    except: raise SystemExit(f"Config '{CONFIG_FILE}' not found.")
+    camera_names = args.camera_names or list(full_config.keys())
+    missing = [c for c in camera_names if c not in full_config]
+    if missing: raise SystemExit(f"Camera(s) not found: {', '.join(missing)}")
+
+    run_timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+    # snapshot/master log ของทุกกล้องใช้ writer pool เดียวกัน (master log ไฟล์เดียวกัน -> thread เดียวกัน)
+    sink = OutputSink(workers=getattr(cfg, 'OUTPUT_WRITER_THREADS', 2), max_queue=getattr(cfg, 'OUTPUT_QUEUE_SIZE', 256))
+    master_log = MasterLogWriter(os.path.join(BASE_OUTPUT_RESULT, f"validation_{run_timestamp[:8]}.csv"),
+                                 flush_interval=getattr(cfg, 'MASTER_LOG_FLUSH_S', 5.0))
+    streams = []
+    for cam in camera_names:
+        try: streams.append(CameraStream(cam, full_config[cam], run_timestamp, args, sink=sink, master_log=master_log))
+        except Exception as e: print(f"!!! [{cam}] skipped: {e}")
+    if not streams: raise SystemExit("No camera could be opened.")
+    load_model()
+    print(f"Multi-camera run: {len(streams)} camera(s), shared detector batch <= {args.max_batch}")
+
+    max_batch = max(1, args.max_batch)
+    inference_calls = 0
+    run_started = time.perf_counter()
+    try:
+        while True:
+            # --- 1. อ่าน 1 เฟรมจากทุกกล้องที่ยังไม่จบ (round-robin) ---
+            round_items = []
+            for s in streams:
+                if s.done: continue
+                item = s.next_frame()
+                if item is not None: round_items.append([s, item[0], item[1], item[2], None, item[3]])
+            if not round_items: break
+
+            # --- 2. รวมเฟรมที่มี motion จากทุกกล้องเป็น batch เดียว (แต่ละกล้องใช้ ROI ของตัวเอง) ---
+            to_detect = [it for it in round_items if it[3]]
+            for i in range(0, len(to_detect), max_batch):
+                chunk = to_detect[i:i + max_batch]
+                for it, dets in zip(chunk, detect_persons_batch([it[1] for it in chunk], [it[0].roi for it in chunk])): it[4] = dets
+                inference_calls += 1
+
+            # --- 3. Tracker / state machine แยกต่อกล้อง ---
+            for s, frame, sec, motion, dets, frame_idx in round_items:
+                if s.motion_gate is None or s.motion_gate.decide(motion, s.counter.live_boxes):
+                    if dets is None:
+                        dets = detect_persons(frame, s.roi); inference_calls += 1
+                    s.throughput["inferred_frames"] += 1
+                else:
+                    dets = []
+                s.counter.update(frame, sec, dets, draw=False, frame_idx=frame_idx)
+                if args.preview_every > 0 and s.throughput["frames"] % args.preview_every == 1 % args.preview_every:
+                    s.counter.save_preview(frame, sec, frame_idx)
+    except KeyboardInterrupt:
+        print("\nUser interrupted process (Ctrl+C).")
+    finally:
+        elapsed = time.perf_counter() - run_started
+        sink.flush(); sink_stats = sink.stats()
+        for s in streams:
+            try: s.close(elapsed, sink_stats)
+            except Exception as e: print(f"!!! [{s.camera_name}] Failed to write summary: {e}")
+        sink.close(); master_log.close()
+        total_frames = sum(s.throughput["frames"] for s in streams)
+        print(f"\nAll cameras finished: {total_frames} frames, {inference_calls} detector calls, "
+              f"{elapsed:.1f}s ({total_frames / elapsed if elapsed > 0 else 0.0:.1f} fps)")
+
+
+if __name__ == "__main__":
+    main()
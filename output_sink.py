@@ -0,0 +1,104 @@
+import time
+import atexit
+import threading
+import queue
+import cv2
+
+_STOP = object()  # สัญญาณให้ writer thread จบ
+
+
+class OutputSink:
+    """
+    เขียน snapshot (JPEG) แบบ asynchronous ด้วย writer threads + คิวแบบจำกัดขนาด
+    เพื่อไม่ให้ loop หลัก (inference) ต้องรอดิสก์/network share
+
+    - งานของไฟล์เดียวกันจะไปที่ thread เดียวกันเสมอ -> เขียนทับตามลำดับที่ submit
+    (master log ใช้ MasterLogWriter ใน master_log.py)
+    - คิวเต็ม: รอได้ไม่เกิน put_timeout วินาที (backpressure) แล้วจึงทิ้งงานนั้น (นับใน dropped)
+    - flush() รอจนทุกงานที่ส่งไปเขียนเสร็จ; close() = flush + หยุด threads (เรียกซ้ำได้, ผูกกับ atexit ด้วย)
+    - workers <= 0 = เขียนทันทีใน thread ที่เรียก (แบบเดิม)
+    """
+    def __init__(self, workers=2, max_queue=256, put_timeout=10.0):
+        self._workers = max(0, int(workers))
+        self._put_timeout = put_timeout
+        self._lock = threading.Lock()
+        self._counters = {"submitted": 0, "written": 0, "dropped": 0, "errors": 0, "max_depth": 0,
+                          "latency_total": 0.0, "latency_max": 0.0}
+        self._closed = False
+        self._queues = []; self._threads = []
+        if self._workers == 0: return
+        per_worker = max(1, int(max_queue) // self._workers)
+        for i in range(self._workers):
+            q = queue.Queue(maxsize=per_worker)
+            t = threading.Thread(target=self._worker_loop, args=(q,), name=f"OutputSink-{i}", daemon=True)
+            self._queues.append(q); self._threads.append(t); t.start()
+        atexit.register(self.close)
+
+    # ---------- submit ----------
+    def write_image(self, path, image):
+        """บันทึกภาพ (image ต้องเป็นสำเนาที่ผู้เรียกจะไม่แก้ต่อ)"""
+        self._submit(path, ("image", path, image))
+
+    def _submit(self, path, job):
+        with self._lock: self._counters["submitted"] += 1
+        if self._workers == 0 or self._closed:
+            self._run_job(job, time.perf_counter()); return
+        q = self._queues[hash(path) % self._workers]
+        try:
+            q.put((job, time.perf_counter()), timeout=self._put_timeout)
+        except queue.Full:
+            with self._lock: self._counters["dropped"] += 1
+            print(f"Warn: Output queue full, dropped write to {path}")
+            return
+        depth = sum(x.qsize() for x in self._queues)
+        with self._lock:
+            if depth > self._counters["max_depth"]: self._counters["max_depth"] = depth
+
+    # ---------- writer ----------
+    def _worker_loop(self, q):
+        while True:
+            item = q.get()
+            try:
+                if item is _STOP: return
+                job, submitted_at = item
+                self._run_job(job, submitted_at)
+            finally:
+                q.task_done()
+
+    def _run_job(self, job, submitted_at):
+        try:
+            _, path, image = job
+            if not cv2.imwrite(path, image): raise IOError("cv2.imwrite returned False")
+        except Exception as e:
+            with self._lock: self._counters["errors"] += 1
+            print(f"Error writing {job[1]}: {e}")
+            return
+        latency = time.perf_counter() - submitted_at
+        with self._lock:
+            self._counters["written"] += 1
+            self._counters["latency_total"] += latency
+            if latency > self._counters["latency_max"]: self._counters["latency_max"] = latency
+
+    # ---------- lifecycle ----------
+    @property
+    def depth(self):
+        return sum(q.qsize() for q in self._queues)
+
+    def flush(self):
+        """รอจนงานที่อยู่ในคิวทั้งหมดเขียนเสร็จ"""
+        for q in self._queues: q.join()
+
+    def close(self):
+        if self._closed: return
+        self.flush()
+        self._closed = True
+        atexit.unregister(self.close) # warm worker สร้าง sink ใหม่ทุก task -> ไม่ให้ handler (และ sink) ค้างจนจบ process
+        for q in self._queues: q.put(_STOP)
+        for t in self._threads: t.join(timeout=5.0)
+
+    def stats(self):
+        with self._lock: c = dict(self._counters)
+        return {"sink_written": c["written"], "sink_dropped": c["dropped"], "sink_errors": c["errors"],
+                "sink_max_depth": c["max_depth"],
+                "sink_avg_latency_ms": round(1000.0 * c["latency_total"] / c["written"], 1) if c["written"] else 0.0,
+                "sink_max_latency_ms": round(1000.0 * c["latency_max"], 1)}
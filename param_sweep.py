@@ -0,0 +1,279 @@
+import os
+import io
+import copy
+import json
+import time
+import shutil
+import warnings
+import argparse
+import itertools
+import contextlib
+import multiprocessing as mp
+from datetime import datetime
+
+import pandas as pd
+
+# --- Param sweep: ลองค่า tuning หลายชุดต่อกล้องด้วย replay จาก detection cache แล้วให้คะแนนเทียบ SS raw data ---
+from counting_engine import cfg
+from csv_validator import SS_FOLDER, MINUTES_TO_CHECK, ACCURACY_CHECK_THRESHOLD, ss_event_times, count_in_window, accuracy_pct
+from detection_cache import DetectionCache
+from output_sink import OutputSink
+from replay_counts import CONFIG_FILE, select_cache, replay
+from warm_worker import available_cpus, thread_env
+
+OUTPUT_DIR = "qa_camera_check/output"
+# ชื่อใน grid (เหมือน model_config) -> key ต่อกล้องใน camera_config.json ที่ CameraCounter อ่าน
+PARAM_KEYS = {"MAX_AGE_FRAMES": "max_age_frames", "STATE_RETENTION_S": "state_retention_s", "SCORE_THR": "score_thr"}
+# เส้นแดง: "red" = [[x1, y1], [x2, y2]] ตรงๆ, "red_dy" = เลื่อนทั้งเส้นขึ้น/ลงกี่ pixel
+LINE_PARAMS = ("red", "red_dy")
+# อยู่ใน model_config แต่ CameraCounter ไม่ได้อ่าน -> sweep แล้วผลเหมือนเดิมทุกชุด
+UNUSED_PARAMS = ("RED_DEBOUNCE_S",)
+
+
+def load_grid(path=None, overrides=()):
+    """
+    grid จากไฟล์ JSON: {"*": {param: [values]}, "<camera>": {param: [values]}} ("*" = ทุกกล้อง, กล้องทับ "*")
+    overrides: ["MAX_AGE_FRAMES=60,120,240", ...] เพิ่มเข้า "*"
+    """
+    grid = {}
+    if path:
+        with open(path, "r", encoding='utf-8') as f: grid = json.load(f)
+    for item in overrides:
+        name, _, values = item.partition("=")
+        if not values: raise SystemExit(f"--param expects NAME=v1,v2,... (got '{item}')")
+        grid.setdefault("*", {})[name.strip()] = [json.loads(v) for v in values.split(",")]
+    for cam_grid in grid.values():
+        for name in list(cam_grid):
+            if name in UNUSED_PARAMS:
+                print(f"Warn: {name} is not read by the counting engine; dropping it from the sweep."); del cam_grid[name]
+            elif name not in PARAM_KEYS and name not in LINE_PARAMS:
+                raise SystemExit(f"Unknown sweep parameter '{name}' (use {', '.join(list(PARAM_KEYS) + list(LINE_PARAMS))})")
+    return grid
+
+
+def camera_grid(grid, camera_name):
+    merged = dict(grid.get("*", {})); merged.update(grid.get(camera_name, {}))
+    return merged
+
+
+def expand(cam_grid):
+    """ทุก combination ของ grid -> list ของ dict {param: value}"""
+    names = sorted(cam_grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(cam_grid[n] for n in names))]
+
+
+def _move_red(config, new_red):
+    """เปลี่ยนเส้นแดง + ปลายเส้นน้ำเงิน/เขียวที่ต่อกับเส้นแดง (ให้ polygon/ROI ยังปิดเหมือนเดิม)"""
+    lines = config['lines']; old_red = [list(p) for p in lines['red']]
+    for name, end in (("blue", 0), ("green", 1)):
+        line = lines.get(name)
+        if line is None: continue
+        for i, p in enumerate(line):
+            if list(p) == old_red[end]: line[i] = list(new_red[end])
+    lines['red'] = [list(p) for p in new_red]
+
+
+def apply_params(config, params):
+    """สำเนา config ของกล้องที่ใส่ค่าจาก params แล้ว (key ต่อกล้องเดียวกับที่ --apply เขียนกลับ)"""
+    config = copy.deepcopy(config)
+    for name, value in params.items():
+        if name in PARAM_KEYS: config[PARAM_KEYS[name]] = value
+        elif name == "red": _move_red(config, value)
+        elif name == "red_dy": _move_red(config, [[x, y + value] for x, y in config['lines']['red']])
+    return config
+
+
+def params_label(params):
+    return " ".join(f"{k}={json.dumps(v, separators=(',', ':'))}" for k, v in sorted(params.items())) or "current"
+
+
+def ss_count_for(config, ss_folder=SS_FOLDER, minutes=MINUTES_TO_CHECK):
+    """SS count (ground truth) ใน window เดียวกับ csv_validator; None = ไม่มีไฟล์ <file_name>.xlsx"""
+    path = os.path.join(ss_folder, f"{str(config.get('file_name', '')).strip()}.xlsx")
+    if not os.path.exists(path): return None
+    times = ss_event_times(pd.read_excel(path))
+    return 0 if times is None else count_in_window(times, minutes)[0]
+
+
+class _RowCollector:
+    """แทน MasterLogWriter ใน sweep: เก็บแถว master log ไว้ใน memory (ไม่เขียน validation_<date>.csv)"""
+    def __init__(self):
+        self.rows = []
+
+    def write_row(self, row):
+        self.rows.append(list(row))
+
+    def flush(self):
+        pass
+
+    def stats(self):
+        return {"master_log_rows": len(self.rows)}
+
+    def close(self):
+        pass
+
+
+_CACHES = {} # ต่อ worker process: path -> DetectionCache (mmap เปิดครั้งเดียว)
+
+
+def _init_worker():
+    import cv2
+    cv2.setNumThreads(1)
+
+
+def _run_job(job):
+    """รัน 1 combination ใน pool worker -> แถวผลลัพธ์ (accuracy ตามสูตรของ csv_validator)"""
+    row = {"camera": job["camera"], "label": job["label"], "params": json.dumps(job["params"], sort_keys=True),
+           "ss_count": job["ss_count"]}
+    started = time.perf_counter()
+    try:
+        cache = _CACHES.get(job["cache_path"])
+        if cache is None: cache = _CACHES[job["cache_path"]] = DetectionCache(job["cache_path"])
+        rows = _RowCollector()
+        with contextlib.redirect_stdout(io.StringIO()): # log ต่อเฟรมของ CameraCounter ไม่ต้องแสดง
+            counter, stats = replay(job["camera"], job["config"], cache, run_timestamp=job["run_timestamp"],
+                                    video_hour=job["video_hour"], start_min=job["start_min"], duration_min=job["duration_min"],
+                                    sink=OutputSink(workers=0), master_log=rows)
+        if job["keep_outputs"]: row["output_dir"] = counter.run_output_dir
+        else: shutil.rmtree(counter.run_output_dir, ignore_errors=True)
+        with warnings.catch_warnings(): # 'H:MM:SS' แบบเดียวกับที่ csv_validator อ่านจาก validation_<date>.csv
+            warnings.simplefilter("ignore", UserWarning)
+            times = pd.to_datetime(pd.Series([r[1] for r in rows.rows], dtype=object), errors='coerce')
+        tdg_count = count_in_window(times, job["minutes"])[0]
+        accuracy = accuracy_pct(job["ss_count"], tdg_count)
+        row.update({"inbound": counter.counts["inbound"], "tdg_count": tdg_count, "diff": abs(job["ss_count"] - tdg_count),
+                    "accuracy": round(accuracy, 2), "passed": 'Y' if accuracy >= ACCURACY_CHECK_THRESHOLD else 'N',
+                    "missing_dets": stats["replay_missing_dets"], "frames": stats["replay_frames"]})
+    except Exception as e:
+        row.update({"error": f"{type(e).__name__}: {e}", "accuracy": -1.0})
+    row["elapsed_s"] = round(time.perf_counter() - started, 3)
+    return row
+
+
+def build_jobs(cameras, full_config, grid, run_timestamp, video_hour=None, minutes=MINUTES_TO_CHECK, keep_outputs=False,
+               cache_dir=None, ss_folder=SS_FOLDER):
+    """1 job ต่อ (กล้อง, combination) + ชุด 'current' (config ปัจจุบัน) ของทุกกล้องไว้เทียบ"""
+    jobs = []
+    for camera_name in cameras:
+        if camera_name not in full_config: print(f"Warn: Camera '{camera_name}' not found in {CONFIG_FILE}; skipping."); continue
+        config = full_config[camera_name]
+        ss_count = ss_count_for(config, ss_folder, minutes)
+        if ss_count is None:
+            print(f"Warn: [{camera_name}] no ground truth '{config.get('file_name')}.xlsx' in {ss_folder}; skipping."); continue
+        combos = expand(camera_grid(grid, camera_name))
+        thrs = [p["SCORE_THR"] for p in combos if "SCORE_THR" in p] + [config.get('score_thr', cfg.SCORE_THR)]
+        # cache ที่ threshold ต่ำพอสำหรับทุกค่าใน grid ก่อน; ไม่มีก็ใช้ที่มี แล้วข้ามค่าที่ต่ำกว่า cache
+        cache = select_cache(config, config.get('video_path'), cache_dir, max_score_thr=min(thrs)) or \
+                select_cache(config, config.get('video_path'), cache_dir, max_score_thr=max(thrs))
+        if cache is None:
+            print(f"Warn: [{camera_name}] no detection cache with SCORE_THR <= {max(thrs)}; run ai_personCount.py on it first."); continue
+        cache_thr = cache.meta.get("parts", {}).get("score_thr"); cache_path = cache.path; cache.close()
+        for i, params in enumerate([{}] + [p for p in combos if p]):
+            if params.get("SCORE_THR", cache_thr) < cache_thr:
+                print(f"Warn: [{camera_name}] SCORE_THR={params['SCORE_THR']} is below the cache's {cache_thr}; skipping."); continue
+            job_config = apply_params(config, params)
+            # cache ที่บันทึกด้วย threshold ต่ำกว่า: กรองกลับเป็นค่าที่รอบจริงใช้ (ไม่งั้น 'current' จะไม่ตรงกับรอบจริง)
+            if job_config.get('score_thr') is None and cache_thr < float(cfg.SCORE_THR): job_config['score_thr'] = float(cfg.SCORE_THR)
+            jobs.append({"camera": camera_name, "config": job_config, "params": params, "label": params_label(params),
+                         "cache_path": cache_path, "ss_count": ss_count, "minutes": minutes, "video_hour": video_hour,
+                         "start_min": int(config.get('start_min') or 0), "duration_min": config.get('duration_min'),
+                         "run_timestamp": f"{run_timestamp}_sweep{i:04d}", "keep_outputs": keep_outputs})
+    return jobs
+
+
+def rank(rows):
+    """เรียงต่อกล้อง: accuracy สูงสุด -> |SS - TDG| น้อยสุด -> missing_dets น้อยสุด -> 'current' ชนะเมื่อเสมอ"""
+    key = lambda r: (-r["accuracy"], r.get("diff", 1 << 30), r.get("missing_dets", 0), r["label"] != "current")
+    ranked = {}
+    for r in rows: ranked.setdefault(r["camera"], []).append(r)
+    for cam_rows in ranked.values():
+        cam_rows.sort(key=key)
+        for i, r in enumerate(cam_rows, 1): r["rank"] = i
+    return ranked
+
+
+def print_table(ranked, top=10):
+    cols = ["rank", "accuracy", "passed", "ss_count", "tdg_count", "diff", "missing_dets", "label"]
+    for camera_name, cam_rows in ranked.items():
+        print(f"\n=== {camera_name}: {len(cam_rows)} combinations ===")
+        df = pd.DataFrame(cam_rows[:top]).reindex(columns=cols + ["error"])
+        if df["error"].isna().all(): df = df.drop(columns=["error"])
+        print(df.to_string(index=False))
+        current = next((r for r in cam_rows if r["label"] == "current"), None)
+        if current is not None and current["rank"] > top:
+            print(f"(current config: rank {current['rank']}, accuracy {current['accuracy']:.2f}%)")
+
+
+def apply_best(ranked, config_path=CONFIG_FILE):
+    """
+    เขียนค่าที่ดีที่สุดต่อกล้องกลับลง camera_config.json (เฉพาะกล้องที่ดีกว่า config ปัจจุบันจริง)
+    เก็บไฟล์เดิมไว้เป็น .bak; SCORE_THR ที่ต่ำกว่า model_config.SCORE_THR ใช้ตอนรันจริงไม่ได้ -> ไม่เขียน
+    """
+    with open(config_path, "r", encoding='utf-8') as f: full_config = json.load(f)
+    changed = []
+    for camera_name, cam_rows in ranked.items():
+        best = cam_rows[0]; current = next((r for r in cam_rows if r["label"] == "current"), None)
+        if best["label"] == "current" or "error" in best or (current is not None and best["accuracy"] <= current["accuracy"]):
+            print(f"[{camera_name}] keeping current config"); continue
+        params = json.loads(best["params"])
+        if params.get("SCORE_THR", float(cfg.SCORE_THR)) < float(cfg.SCORE_THR):
+            print(f"Warn: [{camera_name}] SCORE_THR={params.pop('SCORE_THR')} is below model_config SCORE_THR; not written.")
+        if not params: continue
+        full_config[camera_name] = apply_params(full_config[camera_name], params)
+        changed.append(camera_name)
+        print(f"[{camera_name}] applying {params_label(params)} ({current['accuracy'] if current else '?'}% -> {best['accuracy']}%)")
+    if not changed: return changed
+    shutil.copy2(config_path, config_path + ".bak")
+    tmp = config_path + ".tmp"
+    with open(tmp, "w", encoding='utf-8') as f: json.dump(full_config, f, indent=4)
+    os.replace(tmp, config_path)
+    print(f"Updated {config_path} ({len(changed)} camera(s)); previous version saved as {config_path}.bak")
+    return changed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sweep counting parameters per camera by replaying cached detections, "
+                                                 "scored against the SS raw data like csv_validator")
+    parser.add_argument("cameras", nargs="*", help="Cameras to sweep (default: cameras named in the grid, else every camera)")
+    parser.add_argument("--grid", default=None, help='JSON grid: {"*": {"MAX_AGE_FRAMES": [60, 120]}, "<camera>": {"red_dy": [-10, 0, 10]}}')
+    parser.add_argument("--param", action="append", default=[], help="Add NAME=v1,v2,... to the grid for every camera (repeatable)")
+    parser.add_argument("--workers", type=int, default=None, help="Pool processes (default: all available cores)")
+    parser.add_argument("--minutes", type=int, default=MINUTES_TO_CHECK, help=f"Validation window in minutes (default: {MINUTES_TO_CHECK}, as csv_validator)")
+    parser.add_argument("--video_hour", type=int, default=None, help="Manual hour (e.g., 18) to use for the Log file")
+    parser.add_argument("--top", type=int, default=10, help="Rows per camera in the printed table (default: 10)")
+    parser.add_argument("--keep_outputs", action="store_true", help="Keep each combination's event log/summary under qa_camera_check/camera/")
+    parser.add_argument("--apply", action="store_true", help=f"Write the best parameters per camera back to {CONFIG_FILE}")
+    args = parser.parse_args(argv)
+
+    grid = load_grid(args.grid, args.param)
+    try:
+        with open(CONFIG_FILE, "r", encoding='utf-8') as f: full_config = json.load(f)
+    except: raise SystemExit(f"Config '{CONFIG_FILE}' not found.")
+    cameras = args.cameras or [c for c in grid if c != "*"] or list(full_config)
+    run_timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
+    jobs = build_jobs(cameras, full_config, grid, run_timestamp, video_hour=args.video_hour, minutes=args.minutes,
+                      keep_outputs=args.keep_outputs)
+    if not jobs: raise SystemExit("Nothing to sweep.")
+
+    workers = max(1, min(args.workers or len(available_cpus()), len(jobs)))
+    print(f"Sweeping {len(jobs)} combination(s) over {len({j['camera'] for j in jobs})} camera(s) on {workers} process(es)...")
+    os.environ.update(thread_env(1)) # 1 thread ต่อ process (pool ใช้ทุก core อยู่แล้ว); worker สืบทอด env ตอน spawn
+    rows = []; started = time.perf_counter()
+    with mp.get_context("spawn").Pool(workers, initializer=_init_worker) as pool:
+        for i, row in enumerate(pool.imap_unordered(_run_job, jobs), 1):
+            rows.append(row)
+            result = row.get("error") or f"{row['accuracy']:.2f}% (TDG {row['tdg_count']} / SS {row['ss_count']})"
+            print(f"[{i}/{len(jobs)}] {row['camera']} {row['label']}: {result}")
+    print(f"Sweep finished in {time.perf_counter() - started:.1f}s")
+
+    ranked = rank(rows)
+    print_table(ranked, args.top)
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    out_path = os.path.join(OUTPUT_DIR, f"param_sweep_{run_timestamp}.csv")
+    pd.DataFrame([r for cam_rows in ranked.values() for r in cam_rows]).to_csv(out_path, index=False, encoding='utf-8-sig')
+    print(f"\nFull results: {out_path}")
+    if args.apply: apply_best(ranked)
+
+
+if __name__ == "__main__":
+    main()
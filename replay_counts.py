@@ -0,0 +1,137 @@
+import os
+import json
+import time
+import argparse
+from datetime import datetime
+
+# --- Replay: นับคนใหม่จาก detections ที่บันทึกไว้ใน detection cache (ไม่มี decoder / model / GUI) ---
+from counting_engine import cfg, CameraCounter, BASE_OUTPUT_DIR
+from detection_cache import DetectionCache, find_caches
+from geometry import counting_roi, counting_points
+from master_log import MasterLogWriter
+from motion_gate import MotionGate
+from output_sink import OutputSink
+from timestamp_reader import ReplayClock
+from video_io import FrameSource
+
+CONFIG_FILE = 'config/camera_config.json'
+
+
+def _cache_roi(cache):
+    return cache.meta.get("parts", {}).get("preprocessing", {}).get("roi")
+
+
+def select_cache(config, video_path, cache_dir=None, max_score_thr=None):
+    """
+    เลือก cache ของวิดีโอนี้ (SCORE_THR ปัจจุบัน) สำหรับ replay ตามลำดับ:
+    1. crop ตรงกับที่ ai_personCount จะใช้กับ config ปัจจุบัน (ผลเหมือนรันจริงทุกเฟรม)
+       + cache แบบเต็มเฟรมเป็น fallback ของเฟรมที่ crop ไม่มี (เหมือน ai_personCount)
+    2. cache แบบเต็มเฟรม (--full_frame)
+    3. cache ใหม่สุดของวิดีโอนี้ (crop ต่างจาก config ปัจจุบัน -> เตือน เพราะจำนวนนับอาจต่างจากรันจริง)
+    max_score_thr: รับ cache ที่บันทึกด้วย SCORE_THR <= ค่านี้ (ใกล้สุดก่อน) แทนการต้องเท่ากับ SCORE_THR ปัจจุบัน
+    -> ใช้กรอง score ขึ้นไปทีหลังได้ (param_sweep.py)
+    """
+    cache_dir = cache_dir or getattr(cfg, 'DETECTION_CACHE_DIR', 'qa_camera_check/detection_cache')
+    caches = find_caches(cache_dir, video_path)
+    thr = lambda c: c.meta.get("parts", {}).get("score_thr")
+    if max_score_thr is None: caches = [c for c in caches if thr(c) == float(cfg.SCORE_THR)]
+    else: caches = sorted([c for c in caches if thr(c) is not None and thr(c) <= max_score_thr], key=thr, reverse=True)
+    if not caches: return None
+    full = next((c for c in caches if _cache_roi(c) is None), None)
+    for cache in caches:
+        w, h = cache.meta.get("frame_size") or (0, 0)
+        roi = counting_roi(config, w, h, getattr(cfg, 'ROI_MARGIN_PX', 120)) \
+            if w and h and getattr(cfg, 'ROI_INFERENCE_ENABLED', True) else None
+        if _cache_roi(cache) == (list(roi) if roi is not None else None):
+            if full is not None and full is not cache and full.meta.get("stride") == cache.meta.get("stride"): cache.fallback = full
+            return cache
+    if full is not None: return full
+    print(f"Warn: no detection cache matches the current crop; replaying {caches[0].path} recorded with crop "
+          f"{_cache_roi(caches[0])}. Counts may differ from a live run (pass --cache to choose explicitly).")
+    return caches[0]
+
+
+def replay(camera_name, config, cache, run_timestamp=None, video_hour=None, start_min=0, duration_min=None,
+           snapshots=False, motion_gate=True, log_prefix="", sink=None, master_log=None):
+    """
+    เดิน CameraCounter (SORT -> tid_to_pid -> person_states -> line crossing) ด้วย timeline ใน cache
+    - เฟรม/เวลา/stride/clock anchor มาจากรอบที่บันทึก -> event log ตรงกับรอบจริงทุกแถวเมื่อ config เดิม
+    - motion gate ใช้ flag การเคลื่อนไหวที่บันทึกไว้ + track ที่ยังอยู่ในโซน (ตัดสินเหมือนรอบจริง)
+    - snapshots=True: seek วิดีโอไปยังเฟรมที่บันทึกไว้เฉพาะตอนนับ (ไม่งั้นไม่เปิดวิดีโอเลย)
+    คืน (counter, stats); เฟรมที่ต้องใช้ detections แต่ cache ไม่มี (config ต่างจากรอบที่บันทึก) นับใน replay_missing_dets
+    """
+    run_timestamp = run_timestamp or datetime.now().strftime('%Y%m%d%H%M%S') + "_replay"
+    stride = int(cache.meta.get("stride", 1)); frame_w, frame_h = cache.meta.get("frame_size") or (0, 0)
+    own_sink = sink is None
+    if own_sink: sink = OutputSink(workers=getattr(cfg, 'OUTPUT_WRITER_THREADS', 2), max_queue=getattr(cfg, 'OUTPUT_QUEUE_SIZE', 256))
+    if master_log is None: # ไม่เขียนลง validation_<date>.csv ของรอบจริง
+        master_log = MasterLogWriter(os.path.join(BASE_OUTPUT_DIR, "camera", camera_name, run_timestamp, "validation_replay.csv"),
+                                     flush_interval=getattr(cfg, 'MASTER_LOG_FLUSH_S', 5.0))
+    frame_source = FrameSource(config.get('video_path')) if snapshots else None
+    clock = ReplayClock(cache.meta.get("clock_history", []))
+    counter = CameraCounter(camera_name, config, run_timestamp, video_hour=video_hour, stride=stride, log_prefix=log_prefix,
+                            sink=sink, master_log=master_log, clock=clock, frame_source=frame_source)
+    gate = MotionGate(counting_points(config), frame_w, frame_h) if motion_gate and frame_w and frame_h else None
+    frames = 0; missing = 0
+    started = time.perf_counter()
+    try:
+        for frame_idx, msec, motion, dets in cache.timeline():
+            video_sec = msec / 1000.0
+            if video_sec < start_min * 60: continue
+            if duration_min is not None and counter.video_start_time_processed is not None and \
+               (video_sec - counter.video_start_time_processed) > duration_min * 60:
+                break
+            counter.mark_processed(video_sec)
+            clock.observe(None, video_sec)
+            if gate is None or gate.decide(motion, counter.live_boxes):
+                if dets is None: dets = []; missing += 1
+            else:
+                dets = []
+            counter.update(None, video_sec, dets, draw=False, frame_idx=frame_idx)
+            frames += 1
+    finally:
+        elapsed = time.perf_counter() - started
+        stats = {"detection_cache": cache.path, "replay_frames": frames, "replay_missing_dets": missing,
+                 "elapsed_s": round(elapsed, 3), "fps": round(frames / elapsed, 1) if elapsed > 0 else 0.0}
+        if gate is not None: stats.update(gate.stats())
+        stats.update(clock.stats())
+        if frame_source is not None: stats.update({"snapshot_reads": frame_source.reads, "snapshot_seeks": frame_source.seeks})
+        sink.flush()
+        counter.write_summary(stats)
+        counter.close()
+        if own_sink: sink.close()
+        if frame_source is not None: frame_source.close()
+    return counter, stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Re-count a camera from its detection cache (no decoder/model/GUI)")
+    parser.add_argument("camera_name", help="Name of the camera config.")
+    parser.add_argument("--cache", default=None, help="Detection cache directory to replay (default: best match for this camera's video)")
+    parser.add_argument("--start_min", type=int, default=0, help="Start at this minute in the video (default: 0)")
+    parser.add_argument("--duration_min", type=int, default=None, help="Replay this many minutes (default: everything in the cache)")
+    parser.add_argument("--video_hour", type=int, default=None, help="Manual hour (e.g., 18) to use for the Log file")
+    parser.add_argument("--snapshots", action="store_true", help="Write snapshots by seeking the source video to each counted frame")
+    parser.add_argument("--no_motion_gate", action="store_true", help="Use every recorded detection instead of replaying the motion gate decisions")
+    args = parser.parse_args(argv)
+
+    try:
+        with open(CONFIG_FILE, "r", encoding='utf-8') as f: full_config = json.load(f)
+    except: raise SystemExit(f"Config '{CONFIG_FILE}' not found.")
+    if args.camera_name not in full_config: raise SystemExit(f"Camera '{args.camera_name}' not found.")
+    config = full_config[args.camera_name]
+
+    cache = DetectionCache(args.cache) if args.cache else select_cache(config, config.get('video_path'))
+    if cache is None:
+        raise SystemExit(f"No detection cache for '{config.get('video_path')}'. Run ai_personCount.py on it once first.")
+    print(f"Replaying {cache.path} ({len(cache)} frames, {cache.inferred_frames} with detections)")
+    counter, stats = replay(args.camera_name, config, cache, video_hour=args.video_hour, start_min=args.start_min,
+                            duration_min=args.duration_min, snapshots=args.snapshots, motion_gate=not args.no_motion_gate)
+    print(f"Replay finished: {stats['replay_frames']} frames in {stats['elapsed_s']:.2f}s ({stats['fps']:.0f} fps)")
+    if stats["replay_missing_dets"]:
+        print(f"Warn: {stats['replay_missing_dets']} frames needed detections the cache does not have "
+              f"(record with --full_frame --no_motion_gate for config changes that move the gate/crop).")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,32 @@
 import os
-import csv
 import subprocess
 import sys
 import time
 import json
-import csv_validator
-import generate_master_log
-import google_auth
-
-from googleapiclient.http import MediaFileUpload
+import argparse
+import threading
+# csv_validator (pandas), google_auth และ googleapiclient import เฉพาะตอนถึงขั้นตอนที่ใช้ (startup เร็วขึ้น)
+from warm_worker import WarmWorker, cpu_sets, thread_env, set_affinity
+from task_store import open_store, default_owner
+from task_log import TaskLog
+try:
+    from config import model_config as cfg
+except ImportError:
+    cfg = None
 
 MASTER_LOG_FILE = 'qa_camera_check/master_video_log.csv'
 CONFIG_FILE = 'config/camera_config.json'
 PYTHON_COMMAND = sys.executable # ใช้ Python ตัวเดียวกับที่รันสคริปต์นี้ (เช่น python.exe)
-
-def read_all_tasks():
-    """อ่าน CSV ทั้งหมดมาเก็บใน List of Dictionaries"""
-    if not os.path.exists(MASTER_LOG_FILE):
-        return None, None
-    with open(MASTER_LOG_FILE, 'r', newline='', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        fieldnames = reader.fieldnames if reader.fieldnames else ['camera_name', 'video_path', 'status']
-        return [row for row in reader], fieldnames
+# --- NEW: Warm worker (model โหลดค้างไว้ข้ามวิดีโอ); 0 = เปิด subprocess ใหม่ทุก task แบบเดิม ---
+WARM_WORKER_MAX_TASKS = getattr(cfg, 'WARM_WORKER_MAX_TASKS', 20)
+WARM_WORKER_MAX_RSS_MB = getattr(cfg, 'WARM_WORKER_MAX_RSS_MB', None)
+# --- NEW: สถานะ task อยู่ใน SQLite (task_store.py); master_video_log.csv = ไฟล์ import/export สำหรับคน ---
+TASK_HEARTBEAT_S = getattr(cfg, 'TASK_HEARTBEAT_S', 30.0)
+# --- NEW: output ของแต่ละ task เขียนลงไฟล์ทีละบรรทัด (ไม่เก็บทั้งชั่วโมงไว้ใน RAM) ---
+TASK_LOG_DIR = getattr(cfg, 'TASK_LOG_DIR', 'qa_camera_check/task_logs')
+TASK_LOG_MAX_BYTES = getattr(cfg, 'TASK_LOG_MAX_BYTES', 5_000_000)
+TASK_LOG_BACKUPS = getattr(cfg, 'TASK_LOG_BACKUPS', 3)
+TASK_LOG_RING_LINES = getattr(cfg, 'TASK_LOG_RING_LINES', 200) # บรรทัดท้ายๆ ที่แนบกับ task record ตอน fail
 
 # === (ฟังก์ชัน Helpers สำหรับ Google Drive Upload) ===
 def find_or_create_folder(service, folder_name, parent_id=None):
@@ -56,6 +61,7 @@ def upload_file(service, local_file_path, remote_folder_id):
     file_name = os.path.basename(local_file_path)
     print(f"Uploading '{file_name}' to Drive...")
     try:
+        from googleapiclient.http import MediaFileUpload
         media = MediaFileUpload(local_file_path, resumable=True)
 
         # ตรวจสอบว่ามีไฟล์ชื่อนี้อยู่แล้วหรือไม่ (เพื่ออัปเดตแทนการสร้างซ้ำ)
@@ -115,31 +121,131 @@ def upload_folder_recursive(service, local_folder, remote_parent_folder_id):
             # ถ้าเป็นไฟล์ -> อัปโหลด
             upload_file(service, local_item_path, remote_folder_id)
 
-def write_all_tasks(tasks, fieldnames):
-    """เขียน List of Dictionaries ทับ CSV ทั้งไฟล์"""
-    with open(MASTER_LOG_FILE, 'w', newline='', encoding='utf-8') as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(tasks)
-
-def find_next_task(tasks):
-    """หา task 'failed' ก่อน, ถ้าไม่เจอก็ค่อยหา 'pending'"""
-    for task in tasks:
-        if task['status'] == 'failed':
-            return task
-    for task in tasks:
-        if task['status'] == 'pending':
-            return task
-    return None # ไม่เหลือ task
-
-def update_task_status(tasks, camera_name, new_status):
-    """อัปเดต status ใน list (in-memory)"""
-    for task in tasks:
-        if task['camera_name'] == camera_name:
-            task['status'] = new_status
-            return
-
-def main_processor():
+_print_lock = threading.Lock() # ให้ output ของแต่ละ task พิมพ์ออกมาเป็นก้อนเดียว
+
+def build_command(task_camera_name, camera_configs):
+    # --- (สำคัญ) สร้าง List คำสั่ง ---
+    command = [
+        PYTHON_COMMAND, 
+        'ai_personCount.py', # (หรือ final_person_counter.py ถ้าคุณใช้ชื่อนั้น)
+        task_camera_name,
+        '--headless', # รันเบื้องหลัง: ไม่มีหน้าต่าง/ไม่วาด overlay
+    ]
+    
+    # --- (ตัวอย่าง) การเพิ่ม Arguments ถ้าคุณเก็บไว้ใน Config ---
+    cam_config = camera_configs.get(task_camera_name, {})
+    if cam_config.get("start_min"):
+        command.extend(["--start_min", str(cam_config["start_min"])])
+    if cam_config.get("duration_min"):
+        command.extend(["--duration_min", str(cam_config["duration_min"])])
+    if cam_config.get("stride"):
+        command.extend(["--stride", str(cam_config["stride"])])
+    if cam_config.get("analysis_fps"):
+        command.extend(["--analysis_fps", str(cam_config["analysis_fps"])])
+    return command
+
+class WorkerSlot:
+    """worker 1 ช่อง: warm worker (หรือ subprocess ต่อ task) + core ที่ได้รับแบ่ง + task ที่กำลังรัน"""
+    def __init__(self, index, cpu_set, use_warm):
+        self.index = index; self.cpu_set = cpu_set
+        self.label = f"[worker {index}] " if index is not None else ""
+        self.worker = WarmWorker(max_tasks=WARM_WORKER_MAX_TASKS, max_rss_mb=WARM_WORKER_MAX_RSS_MB,
+                                 name=f"warm-worker-{index or 0}", cpu_set=cpu_set) if use_warm else None
+        self.owner = default_owner(index) # ชื่อผู้ถือ lease ใน task store
+        self.tail = True # live tail ของ output ใน console
+        self.process = None; self.current_task = None
+
+    def run(self, command, log):
+        """รัน 1 task; output ทุกบรรทัดเข้า log (TaskLog) ทันที -> คืน returncode"""
+        if self.worker is not None:
+            # --- NEW: ส่ง task ให้ warm worker (ไม่ต้อง import torch/โหลด weights ใหม่) ---
+            result = self.worker.run(command[2:], on_line=log.write)
+            if result.stderr: log.write('stderr', result.stderr) # worker ตาย/timeout
+            with _print_lock: print(f"{self.label}Task finished in {result.elapsed_s:.1f}s (warm worker)")
+            return result.returncode
+        env = thread_env(len(self.cpu_set)) if self.cpu_set else dict(os.environ)
+        env['PYTHONUNBUFFERED'] = '1' # ให้ child ส่ง output ทีละบรรทัด (ไม่ใช่ทีละ block) -> live tail
+        # ไม่ใช้ preexec_fn: Popen ถูกเรียกจากหลาย worker thread พร้อมกัน (fork ขณะมี thread อื่น -> child ค้างได้)
+        # ผูก core หลัง Popen แทน; thread limits ของ torch/OpenCV มาจาก env ตั้งแต่เริ่ม process อยู่แล้ว
+        self.process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, encoding='utf-8',
+                                        errors='replace', bufsize=1, env=env)
+        if self.cpu_set: set_affinity(self.cpu_set, self.process.pid)
+        pumps = [threading.Thread(target=log.pump, args=(pipe, name), daemon=True)
+                 for pipe, name in ((self.process.stdout, 'stdout'), (self.process.stderr, 'stderr'))]
+        for t in pumps: t.start()
+        self.process.wait() # รอจนจบ
+        for t in pumps: t.join()
+        return self.process.returncode
+
+    def kill(self):
+        if self.process is not None and self.process.poll() is None: self.process.terminate()
+        if self.worker is not None: self.worker.stop()
+
+def _tail_printer(slot, camera_name):
+    prefix = f"{slot.label}[{camera_name}] "
+    def echo(stream, line):
+        with _print_lock: print(f"{prefix}{'! ' if stream == 'stderr' else ''}{line}")
+    return echo
+
+def _export_log(store, label=""):
+    try: store.export_csv(MASTER_LOG_FILE)
+    except OSError as e: # เช่น ไฟล์เปิดค้างใน Excel บน Windows -> ลองใหม่รอบถัดไป
+        with _print_lock: print(f"{label}Warning: could not export '{MASTER_LOG_FILE}': {e}")
+
+def _worker_loop(slot, store, camera_configs, stop_event):
+    while not stop_event.is_set():
+        task = store.claim(slot.owner)
+        if task is None:
+            wait_s = store.next_retry_in()
+            if wait_s is None: return # ไม่เหลือ task ให้ worker นี้
+            stop_event.wait(min(wait_s, 5.0)) # มี task รอ backoff/lease หมดอายุ -> รอแล้วลองใหม่
+            continue
+        task_camera_name = task['camera_name']
+        slot.current_task = task_camera_name
+        with _print_lock:
+            print(f"\n===========================================")
+            print(f"{slot.label}Found task: '{task_camera_name}' (Status: {task['prev_status']}, attempt {task['attempts']})")
+        log = TaskLog(os.path.join(TASK_LOG_DIR, f"{task_camera_name}.log"), max_bytes=TASK_LOG_MAX_BYTES,
+                      backups=TASK_LOG_BACKUPS, ring_lines=TASK_LOG_RING_LINES,
+                      echo=_tail_printer(slot, task_camera_name) if slot.tail else None)
+        log.header(f"{task_camera_name} attempt {task['attempts']} ({slot.owner})")
+        with _print_lock:
+            print(f"{slot.label}Status set to 'running'. Executing 'ai_personCount.py'... (log: {log.path})")
+
+        new_status = 'failed'; error = None # ตั้งค่าเริ่มต้นว่าล้มเหลว
+        try:
+            # 2. รันสคริปต์หลัก (ai_personCount.py) และรอจนจบ
+            returncode = slot.run(build_command(task_camera_name, camera_configs), log)
+            if stop_event.is_set(): return # ถูก Ctrl+C ระหว่างรัน -> main thread คืนสถานะเป็น 'pending' ให้
+            with _print_lock:
+                if returncode == 0:
+                    print(f"{slot.label}Successfully processed '{task_camera_name}' ({log.lines} log lines).")
+                    new_status = 'completed'
+                else:
+                    print(f"{slot.label}!!! FAILED to process '{task_camera_name}' (exit code {returncode}) !!!")
+                    if not slot.tail: # ยังไม่ได้เห็น output -> แสดงบรรทัดท้ายๆ
+                        print("---------- Last lines (from ai_personCount.py) ----------")
+                        print(log.tail())
+                        print("---------------------------------------------------------")
+                    print(f"Full log: {log.path}")
+                    new_status = 'failed'; error = log.tail() or f"exit code {returncode}"
+        except Exception as e:
+            if stop_event.is_set(): return
+            with _print_lock: print(f"{slot.label}An unexpected error occurred: {e}")
+            new_status = 'failed'; error = f"{type(e).__name__}: {e}"
+        finally:
+            log.close()
+
+        # 6. อัปเดตสถานะสุดท้าย (completed, failed = retry หลัง backoff, gave_up = ครบจำนวนครั้งแล้ว)
+        if new_status == 'completed': store.complete(task_camera_name, slot.owner)
+        else: new_status = store.fail(task_camera_name, slot.owner, error)
+        slot.current_task = None
+        _export_log(store, slot.label) # master_video_log.csv ตามสถานะล่าสุด (ไม่ต้องรอจบ batch)
+        with _print_lock: print(f"{slot.label}Status for '{task_camera_name}' set to '{new_status}'.")
+        
+        time.sleep(1) # พัก 1 วิ
+
+def main_processor(workers=1, tail=True):
     # --- โหลด Config ของกล้อง (สำหรับส่ง Arguments) ---
     try:
         with open(CONFIG_FILE,"r",encoding='utf-8') as f: 
@@ -148,161 +254,139 @@ def main_processor():
         print(f"Warning: '{CONFIG_FILE}' not found. Cannot pass arguments like --start_min.")
         camera_configs = {}
 
-    while True:
-        tasks, fieldnames = read_all_tasks()
-        if tasks is None:
-            print(f"Error: '{MASTER_LOG_FILE}' not found.")
-            print("Please run 'python generate_master_log.py' first.")
-            break
-        
-        task_to_run = find_next_task(tasks)
-        if task_to_run is None:
-            print("All AI tasks completed.")
-
-            print("\n===========================================")
-            print("🚀 Starting Data Validation step...")
-            print("===========================================")
-            try:
-                csv_validator.process_data_validation()
-                print("✅ Validation step completed successfully.")
-            except Exception as e:
-                print(f"!!! ERROR during validation step: {e}")
-
-            # --- 🔽 บล็อกนี้ทั้งหมดต้อง "ย่อหน้า" เข้ามา ---
-            print("\n===========================================")
-            print("🚀 Starting Google Drive Upload step...")
-            print("===========================================")
-            try:
-                service = google_auth.get_drive_service()
-                if service:
-                    # 1. หา ID โฟลเดอร์หลัก
-                    base_id = find_or_create_folder(service, "TDG-QA Zonemall")
-
-                    # 2. หา ID โฟลเดอร์ QA Camera
-                    qa_camera_id = find_or_create_folder(service, "QA Camera", base_id)
-
-                    # 3. หา ID โฟลเดอร์ย่อย
-                    output_id = find_or_create_folder(service, "Output", qa_camera_id)
-                    camera_id = find_or_create_folder(service, "Camera", qa_camera_id)
-                    ai_result_id = find_or_create_folder(service, "AI Result", qa_camera_id)
-
-                    # 4. อัปโหลดไฟล์และโฟลเดอร์
-
-                    # 4.1 อัปโหลด master_video_log.csv
-                    upload_file(service, MASTER_LOG_FILE, qa_camera_id) #
-
-                    # 4.2 อัปโหลดโฟลเดอร์ AI Result (หาไฟล์ validation_{date}.csv)
-                    ai_result_path = "qa_camera_check/ai_result" #
-                    for f_name in os.listdir(ai_result_path):
-                        if "validation_" in f_name and f_name.endswith(".csv"):
-                            upload_file(service, os.path.join(ai_result_path, f_name), ai_result_id)
-
-                    # 4.3 อัปโหลดโฟลเดอร์ Output (แบบไม่ recursive เพราะมีแต่ไฟล์)
-                    output_path = "qa_camera_check/output" #
-                    for f_name in os.listdir(output_path):
-                        f_path = os.path.join(output_path, f_name)
-                        if os.path.isfile(f_path):
-                            upload_file(service, f_path, output_id)
-
-                    # 4.4 อัปโหลดโฟลเดอร์ Camera (แบบ Recursive)
-                    # (เราจะอัปโหลดทั้งโฟลเดอร์ 'camera' ไปไว้ใน 'Camera')
-                    
-                    # upload_folder_recursive(service, "qa_camera_check/camera", qa_camera_id)
-
-                    print("✅ Google Drive Upload completed.")
-                else:
-                    print("!!! ERROR: Could not connect to Google Drive for upload.")
-            except Exception as e:
-                print(f"!!! ERROR during Google Drive Upload step: {e}")
+    if not os.path.exists(MASTER_LOG_FILE):
+        print(f"Error: '{MASTER_LOG_FILE}' not found.")
+        print("Please run 'python generate_master_log.py' first.")
+        return
+    store = open_store(cfg)
+    added = store.import_csv(MASTER_LOG_FILE) # กล้องใหม่ / สถานะที่แก้ในไฟล์ CSV
+    if added: print(f"Task store: imported {added} task(s) from '{MASTER_LOG_FILE}'.")
+    print("Task store: " + ", ".join(f"{k}={v}" for k, v in sorted(store.counts().items())))
+
+    # --- NEW: --workers N -> รัน N task พร้อมกัน, แบ่ง core ให้แต่ละ worker (thread limits + affinity) ---
+    workers = max(1, int(workers))
+    cpu_split = cpu_sets(workers) if workers > 1 else [None]
+    slots = [WorkerSlot(i if workers > 1 else None, cpu_split[i], WARM_WORKER_MAX_TASKS > 0) for i in range(workers)]
+    for slot in slots: slot.tail = tail
+    if workers > 1:
+        for slot in slots: print(f"{slot.label}CPUs: {slot.cpu_set}")
+    stop_event = threading.Event()
+    threads = [threading.Thread(target=_worker_loop, args=(slot, store, camera_configs, stop_event), daemon=True) for slot in slots]
+    try:
+        for t in threads: t.start()
+        last_beat = time.time()
+        while any(t.is_alive() for t in threads):
+            for t in threads: t.join(timeout=0.5) # (timeout สั้นๆ เพื่อให้ Ctrl+C ทำงานได้)
+            if time.time() - last_beat >= TASK_HEARTBEAT_S: # ต่อ lease ของ task ที่กำลังรัน
+                last_beat = time.time()
+                for slot in slots:
+                    task_name = slot.current_task
+                    if task_name is not None and not store.heartbeat(task_name, slot.owner):
+                        print(f"{slot.label}Warning: lost lease on '{task_name}' (claimed by another processor?)")
+    except KeyboardInterrupt:
+        print("\nBatch processing interrupted by user.")
+        print("Setting current task status back to 'pending'.")
+        stop_event.set()
+        # ฆ่า process ที่กำลังรัน (ถ้ายังอยู่)
+        for slot in slots: slot.kill()
+        time.sleep(1) # รอ process ปิด
+        # อัปเดตสถานะทันที
+        for slot in slots:
+            if slot.current_task is not None:
+                store.release(slot.current_task, slot.owner)
+                print(f"Status for '{slot.current_task}' set to 'pending'.")
+        print("Exiting.")
+        return
+    finally:
+        for slot in slots:
+            if slot.worker is not None: slot.worker.stop() # คืน memory ของ model ก่อนขั้นตอน validation/upload
+        _export_log(store) # master_video_log.csv สำหรับคน/Drive upload (รวมสถานะ pending หลัง Ctrl+C)
+        store.close()
+
+    # ทุก worker จบแล้ว (ไม่เหลือ task) -> validation + upload
+    print("All AI tasks completed.")
+    finalize_batch()
+
+def finalize_batch():
+    print("\n===========================================")
+    print("🚀 Starting Data Validation step...")
+    print("===========================================")
+    try:
+        import csv_validator
+        csv_validator.process_data_validation()
+        print("✅ Validation step completed successfully.")
+    except Exception as e:
+        print(f"!!! ERROR during validation step: {e}")
 
-            print("All processes finished. Exiting.")
-            break # 
+    # --- 🔽 บล็อกนี้ทั้งหมดต้อง "ย่อหน้า" เข้ามา ---
+    print("\n===========================================")
+    print("🚀 Starting Google Drive Upload step...")
+    print("===========================================")
+    try:
+        import google_auth
+        service = google_auth.get_drive_service()
+        if service:
+            # 1. หา ID โฟลเดอร์หลัก
+            base_id = find_or_create_folder(service, "TDG-QA Zonemall")
+
+            # 2. หา ID โฟลเดอร์ QA Camera
+            qa_camera_id = find_or_create_folder(service, "QA Camera", base_id)
+
+            # 3. หา ID โฟลเดอร์ย่อย
+            output_id = find_or_create_folder(service, "Output", qa_camera_id)
+            camera_id = find_or_create_folder(service, "Camera", qa_camera_id)
+            ai_result_id = find_or_create_folder(service, "AI Result", qa_camera_id)
+
+            # 4. อัปโหลดไฟล์และโฟลเดอร์
+
+            # 4.1 อัปโหลด master_video_log.csv
+            upload_file(service, MASTER_LOG_FILE, qa_camera_id) #
+
+            # 4.2 อัปโหลดโฟลเดอร์ AI Result (หาไฟล์ validation_{date}.csv)
+            ai_result_path = "qa_camera_check/ai_result" #
+            for f_name in os.listdir(ai_result_path):
+                if "validation_" in f_name and f_name.endswith(".csv"):
+                    upload_file(service, os.path.join(ai_result_path, f_name), ai_result_id)
+
+            # 4.3 อัปโหลดโฟลเดอร์ Output (แบบไม่ recursive เพราะมีแต่ไฟล์)
+            output_path = "qa_camera_check/output" #
+            for f_name in os.listdir(output_path):
+                f_path = os.path.join(output_path, f_name)
+                if os.path.isfile(f_path):
+                    upload_file(service, f_path, output_id)
+
+            # 4.4 อัปโหลดโฟลเดอร์ Camera (แบบ Recursive)
+            # (เราจะอัปโหลดทั้งโฟลเดอร์ 'camera' ไปไว้ใน 'Camera')
             
-        task_camera_name = task_to_run['camera_name']
-        print(f"\n===========================================")
-        print(f"Found task: '{task_camera_name}' (Status: {task_to_run['status']})")
-        
-        # 1. อัปเดตสถานะเป็น 'running' และเขียนลง CSV
-        update_task_status(tasks, task_camera_name, 'running')
-        write_all_tasks(tasks, fieldnames)
-        print(f"Status set to 'running'. Executing 'ai_personCount.py'...")
+            # upload_folder_recursive(service, "qa_camera_check/camera", qa_camera_id)
 
-        new_status = 'failed' # ตั้งค่าเริ่มต้นว่าล้มเหลว
-        try:
-            # 2. รันสคริปต์หลัก (ai_personCount.py)
-            
-            # --- (สำคัญ) สร้าง List คำสั่ง ---
-            command = [
-                PYTHON_COMMAND, 
-                'ai_personCount.py', # (หรือ final_person_counter.py ถ้าคุณใช้ชื่อนั้น)
-                task_camera_name,
-            ]
-            
-            # --- (ตัวอย่าง) การเพิ่ม Arguments ถ้าคุณเก็บไว้ใน Config ---
-            cam_config = camera_configs.get(task_camera_name, {})
-            if cam_config.get("start_min"):
-                command.extend(["--start_min", str(cam_config["start_min"])])
-            if cam_config.get("duration_min"):
-                command.extend(["--duration_min", str(cam_config["duration_min"])])
+            print("✅ Google Drive Upload completed.")
+        else:
+            print("!!! ERROR: Could not connect to Google Drive for upload.")
+    except Exception as e:
+        print(f"!!! ERROR during Google Drive Upload step: {e}")
 
-            
-            # รันและรอจนจบ
-            process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, encoding='utf-8')
-            stdout, stderr = process.communicate() # รอจนจบ
-            
-            if process.returncode == 0:
-                print(f"Successfully processed '{task_camera_name}'.")
-                print("---------- Output (from ai_personCount.py) ----------")
-                print(stdout)
-                print("-----------------------------------------------------")
-                new_status = 'completed'
-            else:
-                print(f"!!! FAILED to process '{task_camera_name}' !!!")
-                print("---------- Error (from ai_personCount.py) ----------")
-                print(stderr)
-                print("----------------------------------------------------")
-                new_status = 'failed'
-
-        except KeyboardInterrupt:
-            print("\nBatch processing interrupted by user.")
-            print("Setting current task status back to 'pending'.")
-            new_status = 'pending'
-            # ฆ่า process ที่กำลังรัน (ถ้ายังอยู่)
-            process.terminate()
-            time.sleep(1) # รอ process ปิด
-            # อัปเดตสถานะทันที
-            tasks, fieldnames = read_all_tasks() # อ่านใหม่
-            update_task_status(tasks, task_camera_name, new_status)
-            write_all_tasks(tasks, fieldnames)
-            print(f"Status for '{task_camera_name}' set to 'pending'. Exiting.")
-            break # ออกจาก while loop
-        
-        except Exception as e:
-            print(f"An unexpected error occurred: {e}")
-            new_status = 'failed'
-        
-        # 6. อัปเดตสถานะสุดท้าย (completed หรือ failed)
-        tasks, fieldnames = read_all_tasks() # อ่านใหม่
-        update_task_status(tasks, task_camera_name, new_status)
-        write_all_tasks(tasks, fieldnames)
-        print(f"Status for '{task_camera_name}' set to '{new_status}'.")
-        
-        time.sleep(1) # พัก 1 วิ
+    print("All processes finished. Exiting.")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="รัน ai_personCount ทุกกล้องใน master_video_log.csv แล้ว validate/upload")
+    parser.add_argument("--workers", type=int, default=getattr(cfg, 'RUN_WORKERS', 1), help="Camera tasks to run concurrently; cores are split evenly between them (default: 1)")
+    parser.add_argument("--no_tail", action="store_true", help="Do not echo task output to the console (it is still written to the per-task log)")
+    args = parser.parse_args()
     if not os.path.exists(MASTER_LOG_FILE):
         print(f"Warning: '{MASTER_LOG_FILE}' not found.")
         print("Attempting to run 'generate_master_log.py' automatically...")
         
         try:
             # 1. เรียกฟังก์ชัน create_master_log จากไฟล์ที่ import มา
+            import generate_master_log
             generate_master_log.create_master_log()
             
             # 2. ตรวจสอบอีกครั้งว่าไฟล์ถูกสร้างสำเร็จหรือไม่
             if os.path.exists(MASTER_LOG_FILE):
                 print(f"Successfully generated '{MASTER_LOG_FILE}'.")
                 print("Proceeding with processor...")
-                main_processor() # 3. ถ้าสำเร็จ ก็เริ่มทำงานหลักต่อ
+                main_processor(args.workers, tail=not args.no_tail) # 3. ถ้าสำเร็จ ก็เริ่มทำงานหลักต่อ
             else:
                 print(f"!!! ERROR: 'generate_master_log.py' ran but failed to create the file.")
                 print("Please check 'config/camera_config.json' and permissions.")
@@ -312,4 +396,4 @@ if __name__ == "__main__":
             print("Please fix 'generate_master_log.py' or 'config/camera_config.json' and try again.")
     else:
         print("Master log found. Starting processor...")
-        main_processor()
\ No newline at end of file
+        main_processor(args.workers, tail=not args.no_tail)
\ No newline at end of file
@@ -19,29 +19,33 @@ from __future__ import print_function
 
 import os
 import numpy as np
-import matplotlib
-matplotlib.use('TkAgg')
-import matplotlib.pyplot as plt
-import matplotlib.patches as patches
-from skimage import io
+# matplotlib / skimage ใช้แค่ในโหมด --display ของ demo ด้านล่าง -> import ตอนใช้เท่านั้น
 
 import glob
 import time
 import argparse
-from filterpy.kalman import KalmanFilter
 
 np.random.seed(0)
 
 
+# --- MODIFIED: เลือก solver ครั้งเดียวตอน import (เดิม try import lap ทุกครั้งที่เรียก) ---
+try:
+  import lap
+except ImportError:
+  lap = None
+_linear_sum_assignment = None # scipy fallback: import ครั้งแรกที่ต้องใช้ (scipy.optimize import ช้า)
+
+
 def linear_assignment(cost_matrix):
-  try:
-    import lap
+  global _linear_sum_assignment
+  if lap is not None:
     _, x, y = lap.lapjv(cost_matrix, extend_cost=True)
     return np.array([[y[i],i] for i in x if i >= 0]) #
-  except ImportError:
-    from scipy.optimize import linear_sum_assignment
-    x, y = linear_sum_assignment(cost_matrix)
-    return np.array(list(zip(x, y)))
+  if _linear_sum_assignment is None:
+    from scipy.optimize import linear_sum_assignment as _linear_sum_assignment
+  x, y = _linear_sum_assignment(cost_matrix)
+  return np.array(list(zip(x, y)))
+# --- END MODIFIED ---
 
 
 def iou_batch(bb_test, bb_gt):
@@ -91,15 +95,108 @@ def convert_x_to_bbox(x,score=None):
     return np.array([x[0]-w/2.,x[1]-h/2.,x[0]+w/2.,x[1]+h/2.,score]).reshape((1,5))
 
 
+# --- NEW: รุ่น vectorized ของ convert_* (ทีละหลายกล่อง: (N, 4+) -> (N, 4)) สำหรับ KalmanBoxBank ---
+def convert_bboxes_to_z(bboxes):
+  w = bboxes[:, 2] - bboxes[:, 0]
+  h = bboxes[:, 3] - bboxes[:, 1]
+  with np.errstate(divide='ignore', invalid='ignore'):
+    return np.stack((bboxes[:, 0] + w/2., bboxes[:, 1] + h/2., w * h, w / h), axis=1)
+
+
+def convert_x_to_bboxes(x):
+  with np.errstate(invalid='ignore', divide='ignore'):
+    w = np.sqrt(x[:, 2] * x[:, 3])
+    h = x[:, 2] / w
+  return np.stack((x[:, 0]-w/2., x[:, 1]-h/2., x[:, 0]+w/2., x[:, 1]+h/2.), axis=1)
+
+
+# constant velocity model (ค่าเดียวกับที่ KalmanBoxTracker ตั้งให้ filterpy.KalmanFilter)
+_F = np.eye(7); _F[0,4] = _F[1,5] = _F[2,6] = 1.
+_H = np.eye(4, 7)
+_R = np.eye(4); _R[2:,2:] *= 10.
+_Q = np.eye(7); _Q[-1,-1] *= 0.01; _Q[4:,4:] *= 0.01
+_P0 = np.eye(7); _P0[4:,4:] *= 1000.; _P0 *= 10.
+_I7 = np.eye(7)
+
+
+class KalmanBoxBank(object):
+  """
+  Kalman filter ของทุก track ใน Sort 1 ตัวแบบ struct-of-arrays: x (N, 7), P (N, 7, 7) + ตัวนับต่อ track (N,)
+  predict() ทุก track และ update() ทุก track ที่ match ทำใน NumPy call ชุดเดียวต่อเฟรม (แทน KalmanFilter ต่อ track)
+  สมการเดียวกับ filterpy.KalmanFilter.predict/update (F, H เป็น 0/1 -> ใช้ slice แทน dot ได้โดยค่าไม่เปลี่ยน)
+  """
+  def __init__(self):
+    self.x = np.zeros((0, 7)); self.P = np.zeros((0, 7, 7))
+    self.ids = np.zeros(0, dtype=np.int64)
+    self.time_since_update = np.zeros(0, dtype=np.int64)
+    self.hits = np.zeros(0, dtype=np.int64)
+    self.hit_streak = np.zeros(0, dtype=np.int64)
+    self.age = np.zeros(0, dtype=np.int64)
+
+  def __len__(self):
+    return len(self.ids)
+
+  def add(self, bboxes, ids):
+    """track ใหม่จาก detections ที่ไม่ match (ตามลำดับ) -> ต่อท้าย arrays"""
+    x = np.zeros((len(bboxes), 7)); x[:, :4] = convert_bboxes_to_z(bboxes)
+    zeros = np.zeros(len(bboxes), dtype=np.int64)
+    self.x = np.concatenate((self.x, x)); self.P = np.concatenate((self.P, np.broadcast_to(_P0, (len(bboxes), 7, 7))))
+    self.ids = np.concatenate((self.ids, np.asarray(ids, dtype=np.int64)))
+    self.time_since_update = np.concatenate((self.time_since_update, zeros))
+    self.hits = np.concatenate((self.hits, zeros)); self.hit_streak = np.concatenate((self.hit_streak, zeros))
+    self.age = np.concatenate((self.age, zeros))
+
+  def keep(self, mask):
+    """ตัด track ที่ mask เป็น False ออกจากทุก array (ลำดับเดิม)"""
+    self.x = self.x[mask]; self.P = self.P[mask]; self.ids = self.ids[mask]
+    self.time_since_update = self.time_since_update[mask]
+    self.hits = self.hits[mask]; self.hit_streak = self.hit_streak[mask]; self.age = self.age[mask]
+
+  def predict(self):
+    """predict ทุก track -> กล่องที่ทำนาย (N, 4)"""
+    x = self.x
+    x[x[:, 6] + x[:, 2] <= 0, 6] *= 0.0
+    x[:, :3] += x[:, 4:]                              # F x
+    P = self.P
+    FP = P.copy(); FP[:, :3, :] += P[:, 4:, :]          # F P
+    FPFT = FP.copy(); FPFT[:, :, :3] += FP[:, :, 4:]    # (F P) F^T
+    self.P = FPFT + _Q
+    self.age += 1
+    self.hit_streak[self.time_since_update > 0] = 0
+    self.time_since_update += 1
+    return convert_x_to_bboxes(x)
+
+  def update(self, idx, bboxes):
+    """update track idx (array ของ index) ด้วยกล่องที่ match ทีเดียว"""
+    if len(idx) == 0: return
+    z = convert_bboxes_to_z(bboxes)
+    x = self.x[idx]; P = self.P[idx]
+    y = z - x[:, :4]                                   # z - H x
+    PHT = P[:, :, :4]                                  # P H^T
+    S = PHT[:, :4, :] + _R                             # H P H^T + R
+    K = np.matmul(PHT, np.linalg.inv(S))
+    self.x[idx] = x + np.matmul(K, y[:, :, None])[:, :, 0]
+    I_KH = _I7 - np.matmul(K, _H)
+    self.P[idx] = np.matmul(np.matmul(I_KH, P), I_KH.transpose(0, 2, 1)) + np.matmul(np.matmul(K, _R), K.transpose(0, 2, 1))
+    self.time_since_update[idx] = 0
+    self.hits[idx] += 1; self.hit_streak[idx] += 1
+
+  def get_state(self):
+    return convert_x_to_bboxes(self.x)
+# --- END NEW ---
+
+
 class KalmanBoxTracker(object):
   """
   This class represents the internal state of individual tracked objects observed as bbox.
   """
   count = 0
-  def __init__(self,bbox):
+  def __init__(self,bbox,track_id=None):
     """
     Initialises a tracker using initial bounding box.
     """
+    # filterpy.kalman ดึง scipy.stats มาด้วย (~1 s) -> import ตอนสร้าง track แรกแทนตอน import sort
+    from filterpy.kalman import KalmanFilter
     #define constant velocity model
     self.kf = KalmanFilter(dim_x=7, dim_z=4) 
     self.kf.F = np.array([[1,0,0,0,1,0,0],[0,1,0,0,0,1,0],[0,0,1,0,0,0,1],[0,0,0,1,0,0,0],  [0,0,0,0,1,0,0],[0,0,0,0,0,1,0],[0,0,0,0,0,0,1]])
@@ -113,8 +210,11 @@ class KalmanBoxTracker(object):
 
     self.kf.x[:4] = convert_bbox_to_z(bbox)
     self.time_since_update = 0
-    self.id = KalmanBoxTracker.count
-    KalmanBoxTracker.count += 1
+    # --- MODIFIED: Sort ส่ง id จาก instance ของตัวเอง (global count ใช้เมื่อสร้างตรงๆ เท่านั้น) ---
+    if track_id is None:
+      track_id = KalmanBoxTracker.count
+      KalmanBoxTracker.count += 1
+    self.id = track_id
     self.history = []
     self.hits = 0
     self.hit_streak = 0
@@ -151,61 +251,103 @@ class KalmanBoxTracker(object):
     return convert_x_to_bbox(self.kf.x)
 
 
+# --- NEW: gating -> คำนวณ IoU เฉพาะคู่กล่องที่ซ้อนกันจริง (คู่อื่น IoU = 0 อยู่แล้ว) ---
+GATE_MIN_PAIRS = 64 # det x trk น้อยกว่านี้ -> IoU ทุกคู่ (dense) ถูกกว่า sweep; ได้คู่ชุดเดียวกัน
+
+
+def iou_candidates(bb_test, bb_gt):
+  """
+  คู่ (i, j, iou) ที่ IoU > 0 ระหว่าง bb_test[i] กับ bb_gt[j] (เรียง i แล้ว j)
+  ปัญหาใหญ่: sweep บนแกน x (bb_gt เรียงตาม x1 + searchsorted) -> IoU เฉพาะคู่ที่อยู่ใกล้กัน
+  ค่า IoU ใช้สูตรเดียวกับ iou_batch (ค่าเท่ากันทุกบิต)
+  """
+  n, m = len(bb_test), len(bb_gt)
+  if n * m < GATE_MIN_PAIRS:
+    iou = iou_batch(bb_test, bb_gt)
+    i, j = np.nonzero(iou > 0)
+    return i, j, iou[i, j]
+  order = np.argsort(bb_gt[:, 0], kind='stable'); gx1 = bb_gt[order, 0]
+  max_w = max(0., np.nanmax(bb_gt[:, 2] - bb_gt[:, 0]))
+  lo = np.searchsorted(gx1, bb_test[:, 0] - max_w, side='left') # x1 ของ gt ต่ำกว่านี้ -> x2 ไม่ถึง x1 ของ test
+  hi = np.searchsorted(gx1, bb_test[:, 2], side='left')         # x1 ของ gt >= x2 ของ test -> ไม่ซ้อนแน่นอน
+  counts = np.maximum(hi - lo, 0)
+  i = np.repeat(np.arange(n), counts)
+  j = order[np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(lo, counts)]
+  t, g = bb_test[i], bb_gt[j]
+  w = np.maximum(0., np.minimum(t[:, 2], g[:, 2]) - np.maximum(t[:, 0], g[:, 0]))
+  h = np.maximum(0., np.minimum(t[:, 3], g[:, 3]) - np.maximum(t[:, 1], g[:, 1]))
+  wh = w * h
+  with np.errstate(divide='ignore', invalid='ignore'):
+    iou = wh / ((t[:, 2] - t[:, 0]) * (t[:, 3] - t[:, 1]) + (g[:, 2] - g[:, 0]) * (g[:, 3] - g[:, 1]) - wh)
+  keep = iou > 0
+  i, j, iou = i[keep], j[keep], iou[keep]
+  srt = np.lexsort((j, i))
+  return i[srt], j[srt], iou[srt]
+# --- END NEW ---
+
+
 def associate_detections_to_trackers(detections,trackers,iou_threshold = 0.3):
   """
   Assigns detections to tracked object (both represented as bounding boxes)
 
   Returns 3 lists of matches, unmatched_detections and unmatched_trackers
+  --- MODIFIED: IoU เฉพาะคู่ที่ซ้อนกัน (iou_candidates) -> ถ้าคู่ที่เกิน threshold เป็น 1:1 อยู่แล้ว match ตรงๆ
+  ไม่งั้นแก้ assignment เฉพาะ detection/tracker ที่มีคู่ซ้อนกัน (track เก่าที่ไม่ใกล้ใครไม่เข้า solver)
+  (detection มากกว่า track และมีคู่ชนกัน: solver ทั้ง matrix แบบเดิม)
+  ลำดับ unmatched_detections เหมือนเดิม (= ลำดับ id ของ track ใหม่); unmatched_trackers เรียงจากน้อยไปมาก
   """
-  if(len(trackers)==0):
-    return np.empty((0,2),dtype=int), np.arange(len(detections)), np.empty((0,5),dtype=int)
-
-  iou_matrix = iou_batch(detections, trackers)
-
-  if min(iou_matrix.shape) > 0:
-    a = (iou_matrix > iou_threshold).astype(np.int32)
-    if a.sum(1).max() == 1 and a.sum(0).max() == 1:
-        matched_indices = np.stack(np.where(a), axis=1)
-    else:
-      matched_indices = linear_assignment(-iou_matrix)
+  n, m = len(detections), len(trackers)
+  if(m==0):
+    return np.empty((0,2),dtype=int), np.arange(n), np.empty((0,5),dtype=int)
+  if n == 0:
+    return np.empty((0,2),dtype=int), np.empty(0,dtype=int), np.arange(m)
+  if iou_threshold <= 0: # คู่ที่ IoU = 0 ก็ match ได้ -> ต้องใช้ IoU ทุกคู่
+    di, ti = np.divmod(np.arange(n * m), m); iou = iou_batch(detections, trackers).ravel()
   else:
-    matched_indices = np.empty(shape=(0,2))
-
-  unmatched_detections = []
-  for d, det in enumerate(detections):
-    if(d not in matched_indices[:,0]):
-      unmatched_detections.append(d)
-  unmatched_trackers = []
-  for t, trk in enumerate(trackers):
-    if(t not in matched_indices[:,1]):
-      unmatched_trackers.append(t)
-
-  #filter out matched with low IOU
-  matches = []
-  for m in matched_indices:
-    if(iou_matrix[m[0], m[1]]<iou_threshold):
-      unmatched_detections.append(m[0])
-      unmatched_trackers.append(m[1])
-    else:
-      matches.append(m.reshape(1,2))
-  if(len(matches)==0):
-    matches = np.empty((0,2),dtype=int)
+    di, ti, iou = iou_candidates(detections, trackers)
+
+  above = iou > iou_threshold; rejected = np.empty(0, dtype=int)
+  if above.any() and np.bincount(di[above], minlength=n).max() == 1 and np.bincount(ti[above], minlength=m).max() == 1:
+    matches = np.stack((di[above], ti[above]), axis=1) # fast path: 1:1 อยู่แล้ว (เรียงตาม detection)
+  elif n > m:
+    # detection มากกว่า track: solver ทั้ง matrix เลือกเองว่า detection ไหนไม่ได้คู่ (ลำดับ id ของ track ใหม่ขึ้นกับตรงนี้)
+    iou_matrix = iou_batch(detections, trackers)
+    assigned = linear_assignment(-iou_matrix).reshape(-1, 2).astype(int)
+    #filter out matched with low IOU
+    low = iou_matrix[assigned[:, 0], assigned[:, 1]] < iou_threshold
+    matches = assigned[~low]; rejected = assigned[low, 0]
+  elif len(iou):
+    # n <= m: solver ได้คู่ครบทุก detection -> detection ที่ไม่มีคู่ซ้อนเลยก็คือคู่ IoU ต่ำ ลำดับเหมือนกัน (เรียงตาม detection)
+    rows, di_c = np.unique(di, return_inverse=True); cols, ti_c = np.unique(ti, return_inverse=True)
+    sub = np.zeros((len(rows), len(cols))); sub[di_c, ti_c] = iou # คู่ที่ไม่อยู่ใน candidates: IoU = 0
+    assigned = linear_assignment(-sub).reshape(-1, 2).astype(int)
+    #filter out matched with low IOU
+    assigned = assigned[~(sub[assigned[:, 0], assigned[:, 1]] < iou_threshold)]
+    matches = np.stack((rows[assigned[:, 0]], cols[assigned[:, 1]]), axis=1)
   else:
-    matches = np.concatenate(matches,axis=0)
+    matches = np.empty((0,2),dtype=int)
+  matches = matches[np.argsort(matches[:, 0], kind='stable')]
 
-  return matches, np.array(unmatched_detections), np.array(unmatched_trackers)
+  # unmatched detections: ที่ solver ไม่ได้ให้คู่ (เรียงจากน้อยไปมาก) แล้วต่อด้วยคู่ IoU ต่ำตามลำดับของ solver (เหมือนเดิม)
+  det_free = np.ones(n, dtype=bool); det_free[matches[:, 0]] = False; det_free[rejected] = False
+  trk_free = np.ones(m, dtype=bool); trk_free[matches[:, 1]] = False
+  return matches.astype(int), np.concatenate((np.flatnonzero(det_free), rejected)).astype(int), np.flatnonzero(trk_free)
 
 
 class Sort(object):
-  def __init__(self, max_age=1, min_hits=3, iou_threshold=0.3):
+  def __init__(self, max_age=1, min_hits=3, iou_threshold=0.3, batched=True):
     """
     Sets key parameters for SORT
+    batched=True: Kalman ของทุก track อยู่ใน KalmanBoxBank (predict/update ทีเดียวต่อเฟรม)
+    batched=False: KalmanBoxTracker (filterpy) ต่อ track แบบเดิม (ใช้เทียบผล/benchmark)
     """
     self.max_age = max_age
     self.min_hits = min_hits
     self.iou_threshold = iou_threshold
     self.trackers = []
+    self.bank = KalmanBoxBank() if batched else None
     self.frame_count = 0
+    self.next_id = 0 # track id นับต่อ instance (ไม่ใช้ KalmanBoxTracker.count ที่ใช้ร่วมทั้ง process)
 
   def update(self, dets=np.empty((0, 5))):
     """
@@ -217,6 +359,37 @@ class Sort(object):
     NOTE: The number of objects returned may differ from the number of detections provided.
     """
     self.frame_count += 1
+    if self.bank is None: return self._update_trackers(dets)
+    bank = self.bank
+    # get predicted locations from existing trackers (ทุก track ใน call เดียว) แล้วตัด track ที่ทำนายเป็น NaN
+    pred = bank.predict()
+    valid = ~np.isnan(pred).any(axis=1)
+    if not valid.all():
+      bank.keep(valid); pred = pred[valid]
+    trks = np.zeros((len(pred), 5)); trks[:, :4] = pred
+    matched, unmatched_dets, unmatched_trks = associate_detections_to_trackers(dets,trks, self.iou_threshold)
+
+    # update matched trackers with assigned detections
+    matched = np.asarray(matched, dtype=int).reshape(-1, 2)
+    bank.update(matched[:, 1], dets[matched[:, 0], :])
+
+    # create and initialise new trackers for unmatched detections
+    unmatched_dets = np.asarray(unmatched_dets, dtype=int)
+    if len(unmatched_dets):
+      bank.add(dets[unmatched_dets, :], np.arange(self.next_id, self.next_id + len(unmatched_dets)))
+      self.next_id += len(unmatched_dets)
+    # output เรียงจาก track ล่าสุดไปเก่าสุด (ลำดับเดียวกับ loop reversed เดิม)
+    out = np.flatnonzero((bank.time_since_update < 1) & ((bank.hit_streak >= self.min_hits) | (self.frame_count <= self.min_hits)))[::-1]
+    ret = np.concatenate((bank.get_state()[out], bank.ids[out, None] + 1), axis=1) # +1 as MOT benchmark requires positive
+    # remove dead tracklet
+    alive = bank.time_since_update <= self.max_age
+    if not alive.all(): bank.keep(alive)
+    if(len(ret)>0):
+      return ret
+    return np.empty((0,5))
+
+  def _update_trackers(self, dets):
+    """update แบบเดิม: KalmanBoxTracker (filterpy) ทีละ track"""
     # get predicted locations from existing trackers.
     trks = np.zeros((len(self.trackers), 5))
     to_del = []
@@ -237,7 +410,7 @@ class Sort(object):
 
     # create and initialise new trackers for unmatched detections
     for i in unmatched_dets:
-        trk = KalmanBoxTracker(dets[i,:])
+        trk = KalmanBoxTracker(dets[i,:], track_id=self.next_id); self.next_id += 1
         self.trackers.append(trk)
     i = len(self.trackers)
     for trk in reversed(self.trackers):
@@ -277,6 +450,11 @@ if __name__ == '__main__':
   total_frames = 0
   colours = np.random.rand(32, 3) #used only for display
   if(display):
+    import matplotlib
+    matplotlib.use('TkAgg')
+    import matplotlib.pyplot as plt
+    import matplotlib.patches as patches
+    from skimage import io
     if not os.path.exists('mot_benchmark'):
       print('\n\tERROR: mot_benchmark link not found!\n\n    Create a symbolic link to the MOT benchmark\n    (https://motchallenge.net/data/2D_MOT_2015/#download). E.g.:\n\n    $ ln -s /path/to/MOT2015_challenge/2DMOT2015 mot_benchmark\n\n')
       exit()
@@ -0,0 +1,98 @@
+import os
+import sys
+import json
+import argparse
+import subprocess
+import time
+import statistics
+
+# entry point -> วิธีวัด: ("import", module) = เวลา import เปล่าๆ, ("help", script) = เวลารัน script --help จนจบ
+ENTRY_POINTS = {
+    "import:ai_personCount": ("import", "ai_personCount"),
+    "import:multi_camera": ("import", "multi_camera"),
+    "import:final_person_counter": ("import", "final_person_counter"),
+    "import:run_processor": ("import", "run_processor"),
+    "import:sort": ("import", "sort"),
+    "help:ai_personCount.py": ("help", "ai_personCount.py"),
+    "help:multi_camera.py": ("help", "multi_camera.py"),
+    "help:final_person_counter.py": ("help", "final_person_counter.py"),
+    "help:replay_counts.py": ("help", "replay_counts.py"),
+    "help:param_sweep.py": ("help", "param_sweep.py"),
+    "help:tracker_benchmark.py": ("help", "tracker_benchmark.py"),
+}
+REGRESSION_RATIO = 1.25  # ช้ากว่า baseline เกิน 25% (และเกิน 50 ms) = regression
+
+
+def _measure_once(kind, target):
+    """วัดเวลา (ms) ใน process ใหม่ทุกครั้ง เพื่อไม่ให้ module cache ของรอบก่อนมีผล"""
+    if kind == "import":
+        code = ("import time,sys; t=time.perf_counter(); import %s; "
+                "sys.stdout.write('\\n@@%%.3f' %% ((time.perf_counter()-t)*1000))" % target)
+        out = subprocess.run([sys.executable, "-c", code], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                             text=True, timeout=600).stdout
+        for line in reversed(out.splitlines()):
+            if line.startswith("@@"): return float(line[2:])
+        return None
+    t = time.perf_counter()
+    proc = subprocess.run([sys.executable, target, "--help"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=600)
+    return (time.perf_counter() - t) * 1000 if proc.returncode == 0 else None
+
+
+def run_benchmark(names, repeat):
+    results = {}
+    for name in names:
+        kind, target = ENTRY_POINTS[name]
+        samples = [s for s in (_measure_once(kind, target) for _ in range(repeat)) if s is not None]
+        results[name] = round(statistics.median(samples), 1) if samples else None
+        print(f"{name:<34} {'FAILED' if results[name] is None else f'{results[name]:>9.1f} ms'}")
+    return results
+
+
+def compare(results, baseline):
+    regressions = []
+    for name, ms in results.items():
+        base = baseline.get(name)
+        if ms is None or base is None: continue
+        if ms > base * REGRESSION_RATIO and ms - base > 50:
+            regressions.append(name)
+            print(f"REGRESSION {name}: {base:.1f} ms -> {ms:.1f} ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="วัดเวลา import/startup (ms) ของแต่ละ entry point")
+    parser.add_argument("names", nargs="*", help=f"Entry points to measure (default: all). Choices: {', '.join(ENTRY_POINTS)}")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per entry point; the median is reported (default: 3)")
+    parser.add_argument("--json", dest="json_path", default=None, help="Write results to this JSON file")
+    parser.add_argument("--baseline", default=None, help="Compare against a previous --json file; exit 1 on regression")
+    args = parser.parse_args()
+
+    names = args.names or list(ENTRY_POINTS)
+    unknown = [n for n in names if n not in ENTRY_POINTS]
+    if unknown: raise SystemExit(f"Unknown entry point(s): {', '.join(unknown)}")
+
+    # --json/--baseline เป็น path จาก CWD ของผู้เรียก -> แปลงก่อน chdir
+    json_path = os.path.abspath(args.json_path) if args.json_path else None
+    baseline_path = os.path.abspath(args.baseline) if args.baseline else None
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))  # entry points อ่าน config แบบ relative path
+    # อ่าน/ตรวจ baseline ก่อนรันและก่อนเขียน --json (--json กับ --baseline เป็นไฟล์เดียวกันได้)
+    settings = {"python": sys.version.split()[0], "executable": sys.executable, "repeat": max(1, args.repeat)}
+    baseline = None
+    if baseline_path:
+        with open(baseline_path, "r", encoding='utf-8') as f: saved = json.load(f)
+        diff = {k: (saved.get("settings", {}).get(k), v) for k, v in settings.items() if saved.get("settings", {}).get(k) != v}
+        if diff:
+            raise SystemExit("Baseline was recorded with different settings: " + ", ".join(f"{k} {old} != {new}" for k, (old, new) in diff.items()))
+        baseline = saved.get("results_ms", {})
+    results = run_benchmark(names, settings["repeat"])
+    if json_path:
+        with open(json_path, "w", encoding='utf-8') as f:
+            json.dump({"settings": settings, "results_ms": results}, f, indent=2)
+        print(f"Saved results to: {json_path}")
+    if baseline is not None:
+        if compare(results, baseline): sys.exit(1)
+        print("No startup regressions.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+import os
+import time
+import threading
+from collections import deque
+
+
+class TaskLog:
+    """
+    log ของ 1 task (1 กล้อง): เขียน output ของ ai_personCount ทีละบรรทัดลงไฟล์ทันที พร้อม timestamp
+    - ไฟล์หมุน (rotate) เมื่อเกิน max_bytes: <name>.log -> <name>.log.1 -> ... เก็บไว้ backups ไฟล์
+    - เก็บ ring_lines บรรทัดล่าสุดไว้ใน memory (tail()) สำหรับแนบกับ task record ตอน fail
+    - echo(stream, line) = live tail (เช่น print ลง console ของ run_processor); None = ไม่แสดง
+    thread-safe: subprocess อ่าน stdout/stderr คนละ thread แล้วเขียนเข้ามาพร้อมกันได้
+    """
+    def __init__(self, path, max_bytes=5_000_000, backups=3, ring_lines=200, echo=None):
+        self.path = path; self.max_bytes = max_bytes; self.backups = backups
+        self.echo = echo
+        self._ring = deque(maxlen=max(1, ring_lines))
+        self._lock = threading.Lock()
+        self.lines = 0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._f = open(path, "a", encoding='utf-8')
+
+    def _rotate(self):
+        self._f.close()
+        for i in range(self.backups - 1, 0, -1):
+            src = f"{self.path}.{i}"
+            if os.path.exists(src): os.replace(src, f"{self.path}.{i + 1}")
+        if self.backups > 0: os.replace(self.path, f"{self.path}.1")
+        else: os.remove(self.path)
+        self._f = open(self.path, "a", encoding='utf-8')
+
+    def write(self, stream, line):
+        line = line.rstrip("\r\n")
+        now = time.time()
+        stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(now)) + f".{int(now % 1 * 1000):03d}"
+        with self._lock:
+            if self._f is None: return
+            self._f.write(f"{stamp} [{'err' if stream == 'stderr' else 'out'}] {line}\n")
+            self._f.flush() # ให้ `tail -f` เห็นทันที และไม่หายถ้า process ตาย
+            self._ring.append(line); self.lines += 1
+            if self.max_bytes and self._f.tell() > self.max_bytes: self._rotate()
+        if self.echo is not None: self.echo(stream, line)
+
+    def pump(self, pipe, stream):
+        """อ่าน pipe ของ subprocess ทีละบรรทัดจนปิด (ใช้เป็น target ของ thread)"""
+        try:
+            for line in pipe: self.write(stream, line)
+        finally:
+            pipe.close()
+
+    def header(self, text):
+        """บรรทัดคั่นระหว่างแต่ละ attempt (ไม่ echo, ไม่เข้า ring)"""
+        with self._lock:
+            if self._f is not None: self._f.write(f"===== {time.strftime('%Y-%m-%d %H:%M:%S')} {text} =====\n"); self._f.flush()
+
+    def tail(self):
+        with self._lock: return "\n".join(self._ring)
+
+    def close(self):
+        with self._lock:
+            if self._f is not None: self._f.close(); self._f = None
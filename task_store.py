@@ -0,0 +1,256 @@
+import os
+import csv
+import time
+import socket
+import sqlite3
+import argparse
+import threading
+import contextlib
+
+# สถานะของ task: pending -> running -> completed | failed (รอ backoff แล้ว retry) | gave_up (retry ครบแล้ว)
+CLAIMABLE = ("failed", "pending")  # ลำดับเดิมของ run_processor: failed ก่อน แล้วค่อย pending
+EXPORT_COLUMNS = ["camera_name", "video_path", "status", "attempts", "worker", "claimed_at", "finished_at",
+                  "elapsed_s", "total_elapsed_s", "next_attempt_at", "last_error"]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    camera_name     TEXT PRIMARY KEY,
+    video_path      TEXT,
+    status          TEXT NOT NULL DEFAULT 'pending',
+    attempts        INTEGER NOT NULL DEFAULT 0,
+    worker          TEXT,
+    lease_expires   REAL,
+    next_attempt_at REAL NOT NULL DEFAULT 0,
+    claimed_at      REAL,
+    heartbeat_at    REAL,
+    finished_at     REAL,
+    elapsed_s       REAL,
+    total_elapsed_s REAL NOT NULL DEFAULT 0,
+    last_error      TEXT,
+    seq             INTEGER                         -- ลำดับตาม master_video_log.csv
+);
+CREATE INDEX IF NOT EXISTS tasks_claim ON tasks (status, next_attempt_at, seq);
+CREATE INDEX IF NOT EXISTS tasks_lease ON tasks (status, lease_expires);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+
+def default_owner(tag=None):
+    """ชื่อผู้ถือ lease: host:pid[:tag] (ไม่ซ้ำกันระหว่าง processor ที่รันพร้อมกัน)"""
+    owner = f"{socket.gethostname()}:{os.getpid()}"
+    return f"{owner}:{tag}" if tag is not None else owner
+
+
+def _fmt_time(t):
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(t)) if t else ""
+
+
+class TaskStore:
+    """
+    คิวงานของ run_processor บน SQLite (แทนการอ่าน/เขียน master_video_log.csv ทั้งไฟล์ทุกครั้งที่เปลี่ยนสถานะ)
+    - claim() เลือก + ล็อก task ใน transaction เดียว (BEGIN IMMEDIATE) -> หลาย thread/process ไม่ได้กล้องซ้ำกัน
+    - task ที่ claim แล้วมี lease; heartbeat() ต่ออายุ ถ้า processor ตายจน lease หมด task จะถูก claim ใหม่ได้
+    - fail() นับ attempts: retry หลัง backoff_s * 2^(attempts-1) วินาที, ครบ max_attempts -> 'gave_up'
+    - ทุกการอัปเดตเป็น UPDATE แถวเดียวตาม primary key/index (ไม่ scan ทั้งตาราง)
+    - import_csv()/export_csv() ใช้ไฟล์ master_video_log.csv รูปแบบเดิมเป็นทางเข้า/ออกสำหรับคน
+    """
+    def __init__(self, path, lease_s=300.0, max_attempts=3, backoff_s=60.0):
+        self.path = path
+        self.lease_s = lease_s; self.max_attempts = max(1, int(max_attempts)); self.backoff_s = backoff_s
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # autocommit + transaction เองเฉพาะตอนเขียน; connection เดียวใช้ร่วมกันทุก thread ผ่าน lock
+        self._conn = sqlite3.connect(path, timeout=30.0, isolation_level=None, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        self._export_lock = threading.Lock() # export_csv จากหลาย worker thread ใช้ไฟล์ .tmp เดียวกัน
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(_SCHEMA)
+
+    @contextlib.contextmanager
+    def _write(self):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK"); raise
+            self._conn.execute("COMMIT")
+
+    def _meta(self, key, default=None):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key=?", (key,)).fetchone()
+        return row[0] if row else default
+
+    # ---------------- claim / lease ----------------
+    def claim(self, owner):
+        """คืน dict ของ task ถัดไป (สถานะถูกตั้งเป็น 'running' แล้ว) หรือ None ถ้ายังไม่มีงานที่รันได้ตอนนี้"""
+        now = time.time()
+        with self._write() as db:
+            row = None
+            for status in CLAIMABLE:
+                row = db.execute("SELECT * FROM tasks WHERE status=? AND next_attempt_at<=? ORDER BY seq LIMIT 1",
+                                 (status, now)).fetchone()
+                if row is not None: break
+            if row is None:  # task ของ processor ที่ตายไปแล้ว (lease หมดอายุ)
+                row = db.execute("SELECT * FROM tasks WHERE status='running' AND lease_expires<? ORDER BY seq LIMIT 1",
+                                 (now,)).fetchone()
+            if row is None: return None
+            db.execute("UPDATE tasks SET status='running', worker=?, lease_expires=?, claimed_at=?, heartbeat_at=?, "
+                       "finished_at=NULL, attempts=attempts+1 WHERE camera_name=?",
+                       (owner, now + self.lease_s, now, now, row["camera_name"]))
+        task = dict(row); task["prev_status"] = row["status"]; task["attempts"] = row["attempts"] + 1
+        return task
+
+    def heartbeat(self, camera_name, owner):
+        """ต่อ lease ของ task ที่ owner ถืออยู่; False = lease หลุดไปแล้ว (มีคนอื่น claim ต่อ)"""
+        now = time.time()
+        with self._write() as db:
+            cur = db.execute("UPDATE tasks SET lease_expires=?, heartbeat_at=? WHERE camera_name=? AND worker=? AND status='running'",
+                             (now + self.lease_s, now, camera_name, owner))
+        return cur.rowcount == 1
+
+    def _finish(self, camera_name, owner, status, error=None, retry_at=0.0):
+        now = time.time()
+        with self._write() as db:
+            cur = db.execute(
+                "UPDATE tasks SET status=?, lease_expires=NULL, finished_at=?, next_attempt_at=?, last_error=?, "
+                "elapsed_s=?-claimed_at, total_elapsed_s=total_elapsed_s+(?-claimed_at) "
+                "WHERE camera_name=? AND worker=? AND status='running'",
+                (status, now, retry_at, error, now, now, camera_name, owner))
+        return cur.rowcount == 1
+
+    def complete(self, camera_name, owner):
+        return self._finish(camera_name, owner, "completed")
+
+    def fail(self, camera_name, owner, error=None):
+        """บันทึกว่ารันไม่ผ่าน -> 'failed' (retry หลัง backoff) หรือ 'gave_up' ถ้า attempts ครบ max_attempts"""
+        with self._lock:
+            row = self._conn.execute("SELECT attempts FROM tasks WHERE camera_name=?", (camera_name,)).fetchone()
+        attempts = row[0] if row else self.max_attempts
+        if attempts >= self.max_attempts:
+            self._finish(camera_name, owner, "gave_up", error)
+            return "gave_up"
+        self._finish(camera_name, owner, "failed", error, time.time() + self.backoff_s * 2 ** (attempts - 1))
+        return "failed"
+
+    def release(self, camera_name, owner):
+        """คืน task กลับเป็น 'pending' โดยไม่นับ attempt (เช่น ผู้ใช้กด Ctrl+C)"""
+        with self._write() as db:
+            cur = db.execute("UPDATE tasks SET status='pending', lease_expires=NULL, worker=NULL, attempts=MAX(attempts-1, 0) "
+                             "WHERE camera_name=? AND worker=? AND status='running'", (camera_name, owner))
+        return cur.rowcount == 1
+
+    def next_retry_in(self):
+        """วินาทีจนถึง retry/lease หมดอายุครั้งถัดไปของ task ที่ยังไม่จบ (None = ไม่มีอะไรต้องรอ)"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MIN(t) FROM (SELECT MIN(next_attempt_at) AS t FROM tasks WHERE status IN ('failed','pending') "
+                "UNION ALL SELECT MIN(lease_expires) FROM tasks WHERE status='running')").fetchone()
+        return None if row[0] is None else max(0.0, row[0] - time.time())
+
+    def counts(self):
+        with self._lock:
+            return {r[0]: r[1] for r in self._conn.execute("SELECT status, COUNT(*) FROM tasks GROUP BY status")}
+
+    def reset(self, statuses=("failed", "gave_up")):
+        """ส่ง task ที่มีสถานะใน statuses กลับไปเป็น 'pending' (ล้าง attempts/backoff)"""
+        marks = ",".join("?" * len(statuses))
+        with self._write() as db:
+            cur = db.execute(f"UPDATE tasks SET status='pending', attempts=0, next_attempt_at=0, last_error=NULL, "
+                             f"lease_expires=NULL, worker=NULL WHERE status IN ({marks})", tuple(statuses))
+        return cur.rowcount
+
+    # ---------------- CSV in/out ----------------
+    def import_csv(self, csv_path):
+        """
+        เพิ่มกล้องจาก master_video_log.csv ที่ยังไม่มีใน store
+        ถ้าไฟล์ถูกแก้/สร้างใหม่หลัง export ครั้งล่าสุด (เช่น รัน generate_master_log.py อีกรอบ หรือแก้ status เอง)
+        สถานะที่ต่างจาก store จะถูกนำมาใช้ (ล้าง attempts) -> คนยังคุมคิวผ่านไฟล์เดิมได้
+        """
+        if not os.path.exists(csv_path): return 0
+        edited = os.path.getmtime(csv_path) > float(self._meta("exported_mtime", 0)) + 1e-3
+        with open(csv_path, "r", newline="", encoding='utf-8') as f:
+            rows = list(csv.DictReader(f))
+        changed = 0
+        with self._write() as db:
+            for seq, row in enumerate(rows):
+                name = row.get("camera_name")
+                if not name: continue
+                status = row.get("status") or "pending"
+                if status == "running": status = "pending"  # running ใน CSV = ค้างจากรอบก่อน; lease ใน store เป็นตัวจริง
+                cur = db.execute("INSERT OR IGNORE INTO tasks (camera_name, video_path, status, seq) VALUES (?, ?, ?, ?)",
+                                 (name, row.get("video_path"), status, seq))
+                if cur.rowcount: changed += 1; continue
+                db.execute("UPDATE tasks SET seq=?, video_path=? WHERE camera_name=?", (seq, row.get("video_path"), name))
+                if edited:
+                    cur = db.execute("UPDATE tasks SET status=?, attempts=0, next_attempt_at=0, lease_expires=NULL, "
+                                     "worker=NULL WHERE camera_name=? AND status<>? AND status<>'running'", (status, name, status))
+                    changed += cur.rowcount
+        return changed
+
+    def export_csv(self, csv_path):
+        """เขียน master_video_log.csv (camera_name, video_path, status + คอลัมน์เวลา) แบบ atomic"""
+        with self._export_lock:
+            return self._export_csv(csv_path)
+
+    def _export_csv(self, csv_path):
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM tasks ORDER BY seq, camera_name").fetchall()
+        tmp_path = csv_path + ".tmp"
+        with open(tmp_path, "w", newline="", encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=EXPORT_COLUMNS)
+            writer.writeheader()
+            for r in rows:
+                writer.writerow({
+                    "camera_name": r["camera_name"], "video_path": r["video_path"], "status": r["status"],
+                    "attempts": r["attempts"], "worker": r["worker"] or "",
+                    "claimed_at": _fmt_time(r["claimed_at"]), "finished_at": _fmt_time(r["finished_at"]),
+                    "elapsed_s": f"{r['elapsed_s']:.1f}" if r["elapsed_s"] is not None else "",
+                    "total_elapsed_s": f"{r['total_elapsed_s']:.1f}",
+                    "next_attempt_at": _fmt_time(r["next_attempt_at"]) if r["status"] == "failed" else "",
+                    "last_error": (r["last_error"] or "").strip().replace("\n", " | ")[-300:],
+                })
+        os.replace(tmp_path, csv_path)
+        with self._write() as db:
+            db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('exported_mtime', ?)", (str(os.path.getmtime(csv_path)),))
+        return len(rows)
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None: self._conn.close(); self._conn = None
+
+
+def open_store(cfg=None):
+    """สร้าง TaskStore จากค่าใน config/model_config.py"""
+    return TaskStore(getattr(cfg, 'TASK_DB_PATH', "qa_camera_check/tasks.sqlite3"),
+                     lease_s=getattr(cfg, 'TASK_LEASE_S', 300.0),
+                     max_attempts=getattr(cfg, 'TASK_MAX_ATTEMPTS', 3),
+                     backoff_s=getattr(cfg, 'TASK_RETRY_BACKOFF_S', 60.0))
+
+
+def main():
+    try:
+        from config import model_config as cfg
+    except ImportError:
+        cfg = None
+    parser = argparse.ArgumentParser(description="ดู/จัดการคิวงานของ run_processor (SQLite)")
+    parser.add_argument("command", choices=["status", "import", "export", "reset"])
+    parser.add_argument("--csv", default="qa_camera_check/master_video_log.csv", help="master_video_log.csv path")
+    parser.add_argument("--status", nargs="+", default=["failed", "gave_up"], help="reset: statuses to send back to pending")
+    args = parser.parse_args()
+
+    store = open_store(cfg)
+    try:
+        if args.command == "import": print(f"Imported/updated {store.import_csv(args.csv)} task(s) from {args.csv}")
+        elif args.command == "export": print(f"Exported {store.export_csv(args.csv)} task(s) to {args.csv}")
+        elif args.command == "reset": print(f"Reset {store.reset(tuple(args.status))} task(s) to pending")
+        if args.command in ("import", "reset"): store.export_csv(args.csv)  # ให้ไฟล์ CSV ตรงกับ store เสมอ
+        for status, n in sorted(store.counts().items()): print(f"{status}: {n}")
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
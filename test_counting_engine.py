@@ -0,0 +1,89 @@
+import csv
+
+import numpy as np
+import pytest
+
+from counting_engine import CameraCounter
+from timestamp_reader import TimestampClock
+
+# เส้น red แนวนอนที่ y=100; คนเดินลง (จุดบนกลางกล่องข้ามเส้น) แล้วหายไป = นับ 1
+CONFIG = {
+    "file_name": "test-cam",
+    "pink_zone": [[0, 0], [400, 0], [400, 90], [0, 90]],
+    "lines": {
+        "red": [[0, 100], [400, 100]],
+        "blue": [[0, 100], [0, 300]],
+        "green": [[400, 100], [400, 300]],
+        "yellow": [[0, 300], [400, 300]],
+    },
+    "state_retention_s": 10.0,
+}
+
+
+@pytest.fixture
+def make_counter(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path) # output อยู่ใต้ qa_camera_check/ แบบ relative
+    counters = []
+
+    def make(**kwargs):
+        counters.append(CameraCounter("cam", CONFIG, "20260101000000_test", **kwargs))
+        return counters[-1]
+    yield make
+    for c in counters: c.close()
+
+
+def _box(top):
+    return [180, top, 220, top + 80, 0.9]
+
+
+def _walk(counter, tops, t0=0.0, fps=10.0):
+    """ส่ง 1 กล่องต่อเฟรมตาม tops แล้วคืนเวลาวิดีโอของเฟรมถัดไป"""
+    t = t0
+    for top in tops:
+        counter.mark_processed(t); counter.update(None, t, [_box(top)], draw=False); t += 1 / fps
+    return t
+
+
+def _event_rows(counter):
+    counter.close()
+    with open(counter.event_log_path, newline="", encoding='utf-8') as f: return list(csv.reader(f))[1:]
+
+
+class _Reader:
+    available = True
+
+    def __init__(self): self.calls = 0
+
+    def __call__(self, frame, roi): self.calls += 1; return None
+
+
+@pytest.mark.parametrize("roi", [None, [0, 0, 0, 0], [50, 10, 50, 30], [10, 30, 200, 30]])
+def test_zero_area_timestamp_roi_disables_clock(make_counter, roi):
+    reader = _Reader(); clock = TimestampClock(roi, reader=reader)
+    assert not clock.enabled
+    counter = make_counter(clock=clock)
+    t = _walk(counter, range(60, 150, 10))
+    counter.update(None, t, [], draw=False) # หายไป -> นับ
+    assert counter.counts["inbound"] == 1 and counter._held_rows == [] and reader.calls == 0
+    assert [r[3] for r in _event_rows(counter)] == ["1"]
+
+
+def test_unanchored_clock_holds_rows(make_counter):
+    counter = make_counter(clock=TimestampClock([0, 0, 100, 20], reader=_Reader()))
+    t = _walk(counter, range(60, 150, 10))
+    counter.update(None, t, [], draw=False)
+    assert counter.counts["inbound"] == 1 and len(counter._held_rows) == 1
+
+
+def test_state_retention_uses_video_time(make_counter):
+    # retention นับเป็นวินาทีวิดีโอ (last_seen_time = video_sec) ไม่ใช่เวลาเครื่อง
+    # -> ผลเหมือนกันไม่ว่าจะประมวลผลเร็ว/ช้า หรือ replay จาก cache
+    counter = make_counter()
+    t = _walk(counter, [20, 22, 24, 26, 28]) # อยู่เหนือเส้น ไม่ข้าม
+    last_seen = t - 0.1
+    assert list(counter.person_states) == [1]
+    for sec in (last_seen + 5.0, last_seen + 10.0):
+        counter.update(None, sec, [], draw=False)
+        assert 1 in counter.person_states, sec
+    counter.update(None, last_seen + 10.05, [], draw=False)
+    assert counter.person_states == {}
@@ -0,0 +1,42 @@
+import numpy as np
+
+from geometry import counting_points
+from motion_gate import MotionGate
+
+# 166_rawai2-cam24: เส้น red (y 138-159) อยู่ใต้ pink_zone (y 42-121)
+CAM24 = {
+    "pink_zone": [[237, 42], [245, 117], [442, 121], [452, 50]],
+    "lines": {
+        "red": [[202, 138], [425, 159]],
+        "blue": [[202, 138], [121, 349]],
+        "green": [[425, 159], [477, 271]],
+        "yellow": [[121, 349], [477, 271]],
+    },
+}
+W, H = 640, 360
+
+
+def _frames():
+    """เฟรมว่าง 2 เฟรม แล้วกล่องขาวข้ามเส้น red ด้านนอก pink_zone"""
+    blank = np.zeros((H, W, 3), np.uint8)
+    crossing = blank.copy(); crossing[130:175, 290:330] = 255
+    return [blank, blank, crossing]
+
+
+def _decisions(points):
+    gate = MotionGate(points, W, H, hold_frames=0)
+    return [gate.check(f) for f in _frames()]
+
+
+def test_crossing_red_line_outside_zone_is_not_skipped():
+    assert _decisions(counting_points(CAM24)) == [True, False, True]
+
+
+def test_zone_only_gate_misses_red_line():
+    # กรอบแบบเดิม (pink_zone อย่างเดียว) ไม่เห็นการเคลื่อนไหวที่เส้น red -> ข้าม detector
+    assert _decisions(CAM24["pink_zone"]) == [True, False, False]
+
+
+def test_gate_without_geometry_runs_every_frame():
+    gate = MotionGate(counting_points({}), W, H, hold_frames=0)
+    assert gate.rect is None and all(gate.check(f) for f in _frames())
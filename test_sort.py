@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+import sort
+from sort import Sort, iou_batch, linear_assignment, associate_detections_to_trackers
+from tracker_benchmark import SCENARIOS, make_scenario
+
+# ความเท่ากันของ Sort แบบ batched (KalmanBoxBank + gated association) กับแบบเดิม (filterpy ต่อ track)
+# ฉากสุ่มแบบ seed เดียวกับ tracker_benchmark.py -> ถ้าผลต่าง = id ของคนใน event log เปลี่ยน
+
+
+def _run(seq, batched):
+    tracker = Sort(max_age=120, min_hits=3, iou_threshold=0.2, batched=batched)
+    return [tracker.update(dets) for dets in seq]
+
+
+@pytest.mark.parametrize("name", list(SCENARIOS))
+@pytest.mark.parametrize("seed", [0, 1])
+def test_batched_matches_filterpy(name, seed):
+    pytest.importorskip("filterpy")
+    seq, _ = make_scenario(name, frames=300, seed=seed)
+    for k, (a, b) in enumerate(zip(_run(seq, True), _run(seq, False))):
+        assert a.shape == b.shape, f"frame {k}"
+        np.testing.assert_allclose(a, b, rtol=0, atol=1e-6, equal_nan=True, err_msg=f"frame {k}")
+
+
+def _associate_dense(detections, trackers, iou_threshold):
+    """association แบบเดิม (IoU ทุกคู่ + solver ทั้ง matrix) ใช้เป็นค่าอ้างอิง"""
+    if len(trackers) == 0:
+        return np.empty((0, 2), dtype=int), np.arange(len(detections)), np.empty((0, 5), dtype=int)
+    iou_matrix = iou_batch(detections, trackers)
+    if min(iou_matrix.shape) > 0:
+        a = (iou_matrix > iou_threshold).astype(np.int32)
+        if a.sum(1).max() == 1 and a.sum(0).max() == 1: matched_indices = np.stack(np.where(a), axis=1)
+        else: matched_indices = linear_assignment(-iou_matrix)
+    else:
+        matched_indices = np.empty(shape=(0, 2))
+    unmatched_detections = [d for d in range(len(detections)) if d not in matched_indices[:, 0]]
+    unmatched_trackers = [t for t in range(len(trackers)) if t not in matched_indices[:, 1]]
+    matches = []
+    for m in matched_indices:
+        if iou_matrix[m[0], m[1]] < iou_threshold: unmatched_detections.append(m[0]); unmatched_trackers.append(m[1])
+        else: matches.append(m.reshape(1, 2))
+    matches = np.concatenate(matches, axis=0) if matches else np.empty((0, 2), dtype=int)
+    return matches, np.array(unmatched_detections, dtype=int), np.array(sorted(unmatched_trackers), dtype=int)
+
+
+def _boxes(rng, n, spread):
+    xy = rng.uniform(0, spread, (n, 2)); wh = rng.uniform(20, 80, (n, 2))
+    return np.hstack((xy, xy + wh, rng.uniform(0.3, 1.0, (n, 1))))
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_association_matches_dense(seed):
+    rng = np.random.default_rng(seed)
+    n, m = rng.integers(0, 30, 2)
+    spread = rng.choice([100, 400, 1500]) # หนาแน่น (คู่ชนกันเยอะ) ถึงกระจาย (แทบไม่ซ้อน)
+    dets = _boxes(rng, n, spread); trks = _boxes(rng, m, spread)
+    trks[:, :4] += rng.normal(0, 5, (m, 4)) # track = detection ที่ขยับเล็กน้อย
+    for thr in (0.0, 0.2, 0.3):
+        got = associate_detections_to_trackers(dets, trks, thr); want = _associate_dense(dets, trks, thr)
+        want_matches = want[0][np.argsort(want[0][:, 0], kind='stable')] if len(want[0]) else want[0]
+        np.testing.assert_array_equal(np.asarray(got[0]).reshape(-1, 2), np.asarray(want_matches).reshape(-1, 2))
+        np.testing.assert_array_equal(got[1], want[1]) # ลำดับ = ลำดับ id ของ track ใหม่
+        np.testing.assert_array_equal(np.sort(got[2]), want[2])
+
+
+def test_gated_candidates_match_dense_iou():
+    rng = np.random.default_rng(7)
+    dets = _boxes(rng, 2 * sort.GATE_MIN_PAIRS, 600); trks = _boxes(rng, 40, 600)
+    di, ti, iou = sort.iou_candidates(dets, trks)
+    dense = iou_batch(dets, trks)
+    np.testing.assert_array_equal(np.argwhere(dense > 0), np.stack((di, ti), axis=1))
+    np.testing.assert_allclose(iou, dense[di, ti])
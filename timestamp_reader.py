@@ -0,0 +1,267 @@
+import os
+import re
+import importlib.util
+from datetime import datetime, timedelta
+import cv2
+import numpy as np
+
+# --- Tesseract (import ตอนใช้ครั้งแรก: pytesseract ดึง pandas มาด้วย ~0.3 s) ---
+_pytesseract = False  # False = ยังไม่ได้ลอง import, None = ไม่มี
+
+
+def _tesseract():
+    global _pytesseract
+    if _pytesseract is False:
+        try:
+            import pytesseract as _pytesseract
+            # TESSERACT_PATH = r'...'
+            # _pytesseract.pytesseract.tesseract_cmd = TESSERACT_PATH
+        except ImportError: _pytesseract = None; print("Warn: pytesseract not found.")
+    return _pytesseract
+
+
+def tesseract_available():
+    """มี pytesseract ให้ใช้ไหม (เช็คโดยไม่ import จริง)"""
+    if _pytesseract is not False: return _pytesseract is not None
+    return importlib.util.find_spec("pytesseract") is not None
+
+
+def get_timestamp_from_frame(frame, roi):
+    """OCR เวลาที่ฝังในภาพ (รูปแบบ DD-MM-YYYY HH:MM:SS) ใน timestamp_roi -> datetime หรือ None"""
+    if roi is None: return None
+    pytesseract = _tesseract()
+    if pytesseract is None: return None
+    try:
+        x1,y1,x2,y2=roi; h,w,_=frame.shape; x1,y1=max(0,x1),max(0,y1); x2,y2=min(w,x2),min(h,y2)
+        if y2<=y1 or x2<=x1: return None
+        ts_img=frame[y1:y2,x1:x2]; gray=cv2.cvtColor(ts_img,cv2.COLOR_BGR2GRAY)
+        binary=cv2.adaptiveThreshold(gray,255,cv2.ADAPTIVE_THRESH_GAUSSIAN_C,cv2.THRESH_BINARY_INV, blockSize=7, C=3)
+        text=pytesseract.image_to_string(binary,config=r'--oem 3 --psm 6')
+        match = re.search(r'(\d{2})-(\d{2})-(\d{4}).*?(\d{2}:\d{2}:\d{2})', text.replace(" ", ""))
+        if match:
+            day, month, year, time_str = match.groups()
+            try: return datetime.strptime(f"{day}-{month}-{year} {time_str}", '%d-%m-%Y %H:%M:%S')
+            except ValueError: return None
+    except Exception as e: return None
+    return None
+
+
+# ====================== TEMPLATE DIGIT READER =========================
+GLYPH_CACHE_DIR = "qa_camera_check/glyph_cache"
+GLYPH_SIZE = (10, 16)                 # (w, h) ที่ใช้เทียบ glyph
+TIMESTAMP_LAYOUT = "dd-mm-yyyyhh:mm:ss"  # ลำดับตัวอักษรใน overlay (ช่องว่างไม่เป็น blob)
+_DIGIT_SLOTS = [i for i, c in enumerate(TIMESTAMP_LAYOUT) if c.isalpha()]
+MAX_SAMPLES_PER_DIGIT = 5
+
+
+def _segment_glyphs(gray):
+    """แบ่ง ROI เป็นตัวอักษรด้วย column projection -> list ของภาพ glyph (เรียงซ้ายไปขวา)"""
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    if cv2.countNonZero(binary) > binary.size // 2: binary = cv2.bitwise_not(binary)  # ให้ตัวอักษรเป็น foreground
+    cols = np.flatnonzero(binary.any(axis=0))
+    if cols.size == 0: return []
+    breaks = np.flatnonzero(np.diff(cols) > 1)
+    starts = np.concatenate(([cols[0]], cols[breaks + 1])); ends = np.concatenate((cols[breaks], [cols[-1]]))
+    glyphs = []
+    for x1, x2 in zip(starts, ends):
+        cell = binary[:, x1:x2 + 1]
+        rows = np.flatnonzero(cell.any(axis=1))
+        glyphs.append(cell[rows[0]:rows[-1] + 1])
+    return glyphs
+
+
+def _glyph_vector(glyph):
+    v = cv2.resize(glyph, GLYPH_SIZE, interpolation=cv2.INTER_AREA).astype(np.float32).ravel()
+    v -= v.mean(); n = np.linalg.norm(v)
+    return v / n if n > 0 else v
+
+
+class GlyphTimestampReader:
+    """
+    อ่าน timestamp overlay ของ DVR (ฟอนต์ตายตัว รูปแบบ dd-mm-yyyy hh:mm:ss) ด้วย template matching
+    - แบ่ง ROI เป็นช่องตัวอักษร แล้วเทียบตัวเลขแต่ละช่องกับ template 0-9 ด้วย normalized correlation
+    - template เรียนรู้จากผลของ Tesseract ครั้งแรกๆ ของกล้องนั้น แล้ว cache ไว้ที่ GLYPH_CACHE_DIR/<camera>.npz
+    - ถ้ายังไม่มี template ครบ, แบ่งช่องไม่ได้ตาม layout หรือ score ต่ำกว่า min_score -> ใช้ Tesseract แทน
+    เรียกแบบเดียวกับ get_timestamp_from_frame(frame, roi) จึงส่งเป็น reader ของ TimestampClock ได้
+    """
+    def __init__(self, camera_name, min_score=0.8, cache_dir=GLYPH_CACHE_DIR, fallback=None):
+        self.cache_path = os.path.join(cache_dir, f"{camera_name}.npz")
+        self.min_score = min_score
+        self._fallback = fallback or get_timestamp_from_frame
+        dim = GLYPH_SIZE[0] * GLYPH_SIZE[1]
+        self._sums = np.zeros((10, dim), np.float32); self._counts = np.zeros(10, np.int32)
+        self._templates = None
+        self.fast_reads = 0; self.fallback_reads = 0
+        try:
+            cached = np.load(self.cache_path)
+            if cached["sums"].shape == self._sums.shape:
+                self._sums = cached["sums"].astype(np.float32); self._counts = cached["counts"].astype(np.int32)
+                self._rebuild()
+        except (OSError, KeyError, ValueError):
+            pass
+
+    def _rebuild(self):
+        if not self._counts.all(): self._templates = None; return
+        t = self._sums / self._counts[:, None]
+        t -= t.mean(axis=1, keepdims=True)
+        self._templates = t / np.maximum(np.linalg.norm(t, axis=1, keepdims=True), 1e-6)
+
+    @property
+    def available(self):
+        """อ่านได้จริงไหม: มี template ครบแล้ว หรือมี Tesseract ไว้ fallback/เรียนรู้"""
+        return self._templates is not None or (self._fallback is not get_timestamp_from_frame or tesseract_available())
+
+    def _digit_vectors(self, frame, roi):
+        x1,y1,x2,y2=roi; h,w=frame.shape[:2]; x1,y1=max(0,x1),max(0,y1); x2,y2=min(w,x2),min(h,y2)
+        if y2<=y1 or x2<=x1: return None
+        glyphs = _segment_glyphs(cv2.cvtColor(frame[y1:y2,x1:x2], cv2.COLOR_BGR2GRAY))
+        if len(glyphs) != len(TIMESTAMP_LAYOUT): return None
+        return np.stack([_glyph_vector(glyphs[i]) for i in _DIGIT_SLOTS])
+
+    def _match(self, vecs):
+        """คืน (ตัวเลข string, score ต่ำสุด) จาก template"""
+        scores = vecs @ self._templates.T
+        best = scores.argmax(axis=1)
+        return "".join(str(d) for d in best), float(scores[np.arange(len(best)), best].min())
+
+    def _learn(self, vecs, dt):
+        digits = dt.strftime('%d%m%Y%H%M%S')
+        changed = False
+        for v, ch in zip(vecs, digits):
+            d = int(ch)
+            if self._counts[d] >= MAX_SAMPLES_PER_DIGIT: continue
+            if self._counts[d] > 0:  # ข้าม glyph ที่ไม่เหมือน template เดิม (Tesseract อ่านผิด)
+                t = self._sums[d] / self._counts[d]; t = t - t.mean()
+                if float(v @ t) / max(float(np.linalg.norm(t)), 1e-6) < self.min_score: continue
+            self._sums[d] += v; self._counts[d] += 1; changed = True
+        if not changed: return
+        self._rebuild()
+        try:
+            os.makedirs(os.path.dirname(self.cache_path) or ".", exist_ok=True)
+            np.savez(self.cache_path, sums=self._sums, counts=self._counts)
+        except OSError as e:
+            print(f"Warn: Could not write glyph cache {self.cache_path}: {e}")
+
+    def __call__(self, frame, roi):
+        if roi is None: return None
+        vecs = self._digit_vectors(frame, roi)
+        if vecs is not None and self._templates is not None:
+            digits, score = self._match(vecs)
+            if score >= self.min_score:
+                try:
+                    dt = datetime.strptime(digits, '%d%m%Y%H%M%S')
+                    self.fast_reads += 1
+                    return dt
+                except ValueError:
+                    pass
+        # --- fallback: Tesseract (และใช้ผลที่ได้สอน template) ---
+        self.fallback_reads += 1
+        dt = self._fallback(frame, roi)
+        if dt is not None and vecs is not None: self._learn(vecs, dt)
+        return dt
+
+    def stats(self):
+        return {"ocr_template_reads": self.fast_reads, "ocr_tesseract_reads": self.fallback_reads}
+
+
+class TimestampClock:
+    """
+    แปลงเวลาวิดีโอ (วินาที) -> เวลาจริงตาม timestamp ที่ฝังในภาพ โดยไม่ต้อง OCR ทุกเฟรม
+
+    - ยังไม่ anchor: OCR ทุก sample_s วินาที (เวลาวิดีโอ); ได้ base = เวลาที่อ่าน - video_sec
+      เมื่ออ่านได้ anchor_reads ครั้งติดกันที่ base ต่างกันไม่เกิน max_skew_s -> anchor
+    - anchor แล้ว: OCR ซ้ำทุก recheck_s วินาที ถ้าต่างจากที่คาดเกิน max_skew_s (นาฬิกากล้องกระโดด/drift)
+      จะกลับไปเก็บ read ใหม่จนได้ base ที่ยืนยันแล้วจึงเปลี่ยน (ระหว่างนั้นใช้ mapping เดิม)
+    ไม่มี roi, roi พื้นที่ 0 หรือไม่มี pytesseract -> ปิด (wall_time() คืน None เสมอ)
+    """
+    def __init__(self, roi, anchor_reads=3, recheck_s=60.0, sample_s=1.0, max_skew_s=2.0, reader=None):
+        self.roi = roi
+        self.anchor_reads = max(1, int(anchor_reads)); self.recheck_s = recheck_s
+        self.sample_s = sample_s; self.max_skew_s = max_skew_s
+        self._read = reader or get_timestamp_from_frame
+        available = getattr(self._read, "available", reader is not None or tesseract_available())
+        # timestamp_roi [0, 0, 0, 0] (ค่าเริ่มต้นของ camera_config.json) = ยังไม่ได้ตั้ง -> ปิด ไม่ OCR/ไม่พักแถว event
+        x1, y1, x2, y2 = roi if roi is not None and len(roi) == 4 else (0, 0, 0, 0)
+        self.enabled = x2 > x1 and y2 > y1 and bool(available)
+        self._base = None          # datetime ที่ video_sec = 0
+        self._candidates = []      # base จาก read ที่ยังไม่ยืนยัน
+        self._next_ocr_sec = None
+        self.ocr_calls = 0; self.jumps = 0
+        self.history = []          # [(video_sec, base)] ทุกครั้งที่ anchor/re-anchor (ให้ replay ใช้ mapping เดียวกัน)
+
+    @property
+    def anchored(self):
+        return self._base is not None
+
+    def observe(self, frame, video_sec):
+        """เรียกทุกเฟรมตามลำดับ; จะ OCR เฉพาะเฟรมที่ถึงรอบเท่านั้น"""
+        if not self.enabled: return
+        if self._next_ocr_sec is not None and video_sec < self._next_ocr_sec: return
+        dt = self._read(frame, self.roi); self.ocr_calls += 1
+        base = dt - timedelta(seconds=video_sec) if dt is not None else None
+
+        if self._base is not None and base is not None and abs((base - self._base).total_seconds()) <= self.max_skew_s:
+            self._candidates = []  # ยังตรงกับ mapping เดิม (read ที่ไม่ตรงก่อนหน้าเป็นแค่ OCR ผิด)
+            self._next_ocr_sec = video_sec + self.recheck_s
+            return
+        if base is None:
+            self._next_ocr_sec = video_sec + self.sample_s; return
+
+        # เก็บ read ที่ต้องยืนยัน (anchor ครั้งแรก หรือ mapping เดิมไม่ตรงแล้ว)
+        if self._candidates and abs((base - self._candidates[-1]).total_seconds()) > self.max_skew_s:
+            self._candidates = []  # ไม่ต่อเนื่องกับ read ก่อนหน้า -> เริ่มนับใหม่
+        self._candidates.append(base)
+        if len(self._candidates) >= self.anchor_reads:
+            # burned-in clock ปัดเศษวินาทีลง -> ใช้ base ที่มากที่สุดของชุดที่ยืนยันแล้ว
+            new_base = max(self._candidates); self._candidates = []
+            if self._base is not None:
+                self.jumps += 1
+                print(f"Timestamp clock re-anchored ({(new_base - self._base).total_seconds():+.0f}s) at video time {video_sec:.1f}s")
+            else:
+                print(f"Timestamp clock anchored: video 0s = {new_base.strftime('%d-%m-%Y %H:%M:%S')}")
+            self._base = new_base; self.history.append((video_sec, new_base))
+            self._next_ocr_sec = video_sec + self.recheck_s
+        else:
+            self._next_ocr_sec = video_sec + self.sample_s
+
+    def wall_time(self, video_sec):
+        if self._base is None or video_sec is None: return None
+        return self._base + timedelta(seconds=video_sec)
+
+    def stats(self):
+        stats = {"ocr_calls": self.ocr_calls, "ocr_anchored": self.anchored, "ocr_clock_jumps": self.jumps}
+        if hasattr(self._read, "stats"): stats.update(self._read.stats())
+        return stats
+
+
+class ReplayClock:
+    """
+    TimestampClock สำหรับ replay (ไม่มีภาพให้ OCR): ใช้ anchor ที่รอบจริงบันทึกไว้ (TimestampClock.history)
+    observe(None, video_sec) เปลี่ยน mapping ที่เฟรมเดียวกับรอบจริง -> เวลาใน log ตรงกันทุกแถว
+    history = [(video_sec, datetime หรือ ISO string)]
+    """
+    def __init__(self, history=()):
+        self._history = sorted((float(sec), base if isinstance(base, datetime) else datetime.fromisoformat(base))
+                               for sec, base in history)
+        self._i = 0; self._base = None
+        self.jumps = 0
+
+    @property
+    def enabled(self):
+        return bool(self._history) # รอบที่บันทึกไม่เคย anchor -> ไม่มีเวลาจริงให้รอ
+
+    @property
+    def anchored(self):
+        return self._base is not None
+
+    def observe(self, frame, video_sec):
+        while self._i < len(self._history) and self._history[self._i][0] <= video_sec:
+            if self._base is not None: self.jumps += 1
+            self._base = self._history[self._i][1]; self._i += 1
+
+    def wall_time(self, video_sec):
+        if self._base is None or video_sec is None: return None
+        return self._base + timedelta(seconds=video_sec)
+
+    def stats(self):
+        return {"ocr_calls": 0, "ocr_anchored": self.anchored, "ocr_clock_jumps": self.jumps}
@@ -0,0 +1,188 @@
+import gc
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+
+import numpy as np
+
+from sort import Sort
+
+# --- Tracker benchmark: วัด Sort.update() ด้วยฝูงคนสังเคราะห์ (ไม่ต้องใช้ MOT det.txt / วิดีโอ / matplotlib) ---
+FRAME_W, FRAME_H = 1280, 720
+# ค่าต่อ scenario: spawn = โอกาสมีคนใหม่ต่อเฟรม, dropout = โอกาส detector พลาดต่อคนต่อเฟรม,
+# fp_rate = โอกาสมีกล่องหลอกต่อเฟรม, occluders = จำนวนสิ่งบัง (ไม่มี detection เมื่อคนอยู่หลัง), flow = random/entrance
+SCENARIOS = {
+    "sparse":    dict(spawn=0.02, max_people=4,  dropout=0.05, fp_rate=0.01, occluders=0, flow="random"),
+    "crowd":     dict(spawn=0.35, max_people=60, dropout=0.05, fp_rate=0.05, occluders=0, flow="random"),
+    "occlusion": dict(spawn=0.15, max_people=25, dropout=0.05, fp_rate=0.02, occluders=3, flow="random"),
+    "entrance":  dict(spawn=0.12, max_people=30, dropout=0.10, fp_rate=0.02, occluders=0, flow="entrance"),
+    "dropout":   dict(spawn=0.15, max_people=25, dropout=0.40, fp_rate=0.30, occluders=0, flow="random"),
+}
+BACKENDS = {"batched": True, "filterpy": False} # Sort(batched=...)
+REGRESSION_RATIO = 1.25  # fps ต่ำกว่า baseline / 1.25 หรือ p99 สูงกว่า baseline * 1.25 (และเกิน 0.1 ms) = regression
+
+
+def make_scenario(name, frames=1500, seed=0):
+    """
+    detections ต่อเฟรม (list ของ array (k, 5): x1, y1, x2, y2, score) + จำนวนคนทั้งหมดที่เกิดขึ้น
+    entrance: คนเดินเข้าจากขอบบนลงล่าง (30% เดินสวนขึ้น) ผ่านเส้นกลางภาพ แบบกล้องหน้าร้าน
+    """
+    p = SCENARIOS[name]; rng = np.random.default_rng(seed)
+    occluders = [(x, y, x + rng.uniform(80, 200), y + rng.uniform(100, 250))
+                 for x, y in zip(rng.uniform(0, FRAME_W - 200, p["occluders"]), rng.uniform(0, FRAME_H - 250, p["occluders"]))]
+    people = []; born = 0; out = []
+    for _ in range(frames):
+        if rng.random() < p["spawn"] and len(people) < p["max_people"]:
+            w, h = rng.uniform(30, 60), rng.uniform(70, 140)
+            if p["flow"] == "entrance":
+                down = rng.random() < 0.7
+                x, y = rng.uniform(100, FRAME_W - 160), (-h * 0.5 if down else FRAME_H - h * 0.5)
+                vx, vy = rng.normal(0, 0.8), rng.uniform(1.5, 5.0) * (1 if down else -1)
+            else:
+                x, y = rng.uniform(0, FRAME_W - w), rng.uniform(0, FRAME_H - h)
+                vx, vy = rng.uniform(-4, 4), rng.uniform(-3, 3)
+            people.append([x, y, vx, vy, w, h]); born += 1
+        dets = []
+        for person in people:
+            person[0] += person[2] + rng.normal(0, 0.7); person[1] += person[3] + rng.normal(0, 0.7)
+            x, y, _, _, w, h = person
+            cx, cy = x + w / 2, y + h / 2
+            if rng.random() < p["dropout"] or any(o[0] < cx < o[2] and o[1] < cy < o[3] for o in occluders): continue
+            dets.append([x + rng.normal(0, 2), y + rng.normal(0, 2), x + w + rng.normal(0, 2), y + h + rng.normal(0, 2), rng.uniform(0.35, 0.95)])
+        people = [q for q in people if -q[4] < q[0] < FRAME_W and -q[5] < q[1] < FRAME_H]
+        if rng.random() < p["fp_rate"]:
+            x, y = rng.uniform(0, FRAME_W - 60), rng.uniform(0, FRAME_H - 120)
+            dets.append([x, y, x + rng.uniform(20, 60), y + rng.uniform(40, 120), rng.uniform(0.35, 0.6)])
+        out.append(np.array(dets) if dets else np.empty((0, 5)))
+    return out, born
+
+
+def _tracker(batched, max_age, min_hits, iou_threshold):
+    return Sort(max_age=max_age, min_hits=min_hits, iou_threshold=iou_threshold, batched=batched)
+
+
+def _live_tracks(tracker):
+    return len(tracker.bank) if tracker.bank is not None else len(tracker.trackers)
+
+
+def time_run(frames, batched, max_age=120, min_hits=3, iou_threshold=0.2):
+    """1 รอบ: latency ต่อเฟรม (วินาที), track id ที่ออกมาทั้งหมด, จำนวน track ค้างสูงสุด"""
+    tracker = _tracker(batched, max_age, min_hits, iou_threshold)
+    lat = np.empty(len(frames)); ids = set(); peak_tracks = 0
+    for k, dets in enumerate(frames):
+        t = time.perf_counter()
+        out = tracker.update(dets)
+        lat[k] = time.perf_counter() - t
+        ids.update(out[:, 4].astype(int).tolist()); peak_tracks = max(peak_tracks, _live_tracks(tracker))
+    return lat, ids, peak_tracks
+
+
+def alloc_run(frames, batched, max_age=120, min_hits=3, iou_threshold=0.2):
+    """
+    รอบแยก (tracemalloc ทำให้ช้า): peak ของหน่วยความจำที่จองระหว่าง update() ต่อเฟรม (KB)
+    + จำนวน memory block ที่เพิ่มขึ้นสุทธิทั้งรอบ (sys.getallocatedblocks; โตเรื่อยๆ = มีของค้าง)
+    """
+    tracker = _tracker(batched, max_age, min_hits, iou_threshold)
+    gc.collect(); blocks = sys.getallocatedblocks()
+    peaks = np.empty(len(frames))
+    tracemalloc.start()
+    try:
+        for k, dets in enumerate(frames):
+            before, _ = tracemalloc.get_traced_memory(); tracemalloc.reset_peak()
+            tracker.update(dets)
+            peaks[k] = (tracemalloc.get_traced_memory()[1] - before) / 1024.0
+    finally:
+        tracemalloc.stop()
+    del tracker; gc.collect()
+    return peaks, sys.getallocatedblocks() - blocks
+
+
+def run_benchmark(names, backends, frames=1500, repeat=3, seed=0, alloc=True, **sort_args):
+    results = {}
+    warm, _ = make_scenario("sparse", 50, seed)
+    for backend in backends: time_run(warm, BACKENDS[backend], **sort_args) # import filterpy / lap, cache ของ numpy
+    for name in names:
+        scenario, people = make_scenario(name, frames, seed)
+        n_dets = sum(len(d) for d in scenario)
+        for backend in backends:
+            runs = [time_run(scenario, BACKENDS[backend], **sort_args) for _ in range(max(1, repeat))]
+            lat = np.concatenate([r[0] for r in runs]) * 1000.0
+            fps = float(np.median([len(scenario) / r[0].sum() for r in runs]))
+            res = {"frames": len(scenario), "people": people, "dets_per_frame": round(n_dets / len(scenario), 2),
+                   "fps": round(fps, 1), "p50_ms": round(float(np.percentile(lat, 50)), 4),
+                   "p90_ms": round(float(np.percentile(lat, 90)), 4), "p99_ms": round(float(np.percentile(lat, 99)), 4),
+                   "max_ms": round(float(lat.max()), 4), "tracks_created": len(runs[0][1]), "peak_live_tracks": runs[0][2]}
+            if alloc:
+                peaks, net_blocks = alloc_run(scenario, BACKENDS[backend], **sort_args)
+                res.update({"alloc_peak_kb_p50": round(float(np.percentile(peaks, 50)), 2),
+                            "alloc_peak_kb_p99": round(float(np.percentile(peaks, 99)), 2), "net_blocks": int(net_blocks)})
+            results[f"{name}:{backend}"] = res
+            line = (f"{name + ':' + backend:<20} {res['fps']:>9.0f} fps  p50 {res['p50_ms']:.3f}  p90 {res['p90_ms']:.3f}  "
+                    f"p99 {res['p99_ms']:.3f}  max {res['max_ms']:.2f} ms  tracks {res['tracks_created']}/{people} people")
+            if alloc: line += f"  alloc p50 {res['alloc_peak_kb_p50']:.1f} KB"
+            print(line)
+    return results
+
+
+def compare(results, baseline):
+    regressions = []
+    for name, res in results.items():
+        base = baseline.get(name)
+        if not base: continue
+        if res["fps"] < base["fps"] / REGRESSION_RATIO or \
+           (res["p99_ms"] > base["p99_ms"] * REGRESSION_RATIO and res["p99_ms"] - base["p99_ms"] > 0.1):
+            regressions.append(name)
+            print(f"REGRESSION {name}: {base['fps']:.0f} -> {res['fps']:.0f} fps, p99 {base['p99_ms']:.3f} -> {res['p99_ms']:.3f} ms")
+        if res.get("tracks_created") != base.get("tracks_created"): # ไม่นับเป็น regression แต่แปลว่าผลการ track เปลี่ยน
+            print(f"CHANGED {name}: tracks_created {base.get('tracks_created')} -> {res.get('tracks_created')}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="วัดความเร็ว Sort.update() ด้วย scenario ฝูงคนสังเคราะห์")
+    parser.add_argument("names", nargs="*", help=f"Scenarios to run (default: all). Choices: {', '.join(SCENARIOS)}")
+    parser.add_argument("--backend", choices=list(BACKENDS) + ["both"], default="batched", help="Kalman backend of Sort (default: batched)")
+    parser.add_argument("--frames", type=int, default=1500, help="Frames per scenario (default: 1500)")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per scenario; fps is the median (default: 3)")
+    parser.add_argument("--seed", type=int, default=0, help="Scenario random seed (default: 0)")
+    parser.add_argument("--max_age", type=int, default=120, help="Sort max_age (default: 120, as MAX_AGE_FRAMES)")
+    parser.add_argument("--min_hits", type=int, default=3, help="Sort min_hits (default: 3)")
+    parser.add_argument("--iou_threshold", type=float, default=0.2, help="Sort iou_threshold (default: 0.2, as CameraCounter)")
+    parser.add_argument("--no_alloc", action="store_true", help="Skip the tracemalloc allocation pass")
+    parser.add_argument("--json", dest="json_path", default=None, help="Write results to this JSON file")
+    parser.add_argument("--baseline", default=None, help="Compare against a previous --json file; exit 1 on regression")
+    args = parser.parse_args()
+
+    names = args.names or list(SCENARIOS)
+    unknown = [n for n in names if n not in SCENARIOS]
+    if unknown: raise SystemExit(f"Unknown scenario(s): {', '.join(unknown)}")
+    backends = list(BACKENDS) if args.backend == "both" else [args.backend]
+    settings = {"frames": args.frames, "seed": args.seed, "max_age": args.max_age,
+                "min_hits": args.min_hits, "iou_threshold": args.iou_threshold}
+
+    # อ่าน baseline ก่อนรัน (--json ชื่อเดียวกันจะได้ไม่เทียบกับตัวเอง) และต้องวัดด้วย settings เดียวกัน
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding='utf-8') as f: saved = json.load(f)
+        diff = {k: (saved.get("settings", {}).get(k), v) for k, v in settings.items() if saved.get("settings", {}).get(k) != v}
+        if diff:
+            raise SystemExit("Baseline was recorded with different settings: " +
+                             ", ".join(f"{k} {old} != {new}" for k, (old, new) in diff.items()))
+        baseline = saved.get("results", {})
+
+    results = run_benchmark(names, backends, frames=args.frames, repeat=args.repeat, seed=args.seed, alloc=not args.no_alloc,
+                            max_age=args.max_age, min_hits=args.min_hits, iou_threshold=args.iou_threshold)
+    if args.json_path:
+        with open(args.json_path, "w", encoding='utf-8') as f:
+            json.dump({"python": sys.version.split()[0], "numpy": np.__version__, "settings": settings,
+                       "results": results}, f, indent=2)
+        print(f"Saved results to: {args.json_path}")
+    if baseline is not None:
+        if compare(results, baseline): sys.exit(1)
+        print("No tracker regressions.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,342 @@
+import os
+import sys
+import json
+import math
+import shutil
+import subprocess
+import threading
+import queue
+import cv2
+import numpy as np
+
+# --- Keyframe index (cache ไว้ข้างไฟล์วิดีโอ เช่น video.mp4.kfidx.json) ---
+KEYFRAME_INDEX_SUFFIX = ".kfidx.json"
+KEYFRAME_INDEX_VERSION = 2
+
+
+def _index_path(video_path):
+    return video_path + KEYFRAME_INDEX_SUFFIX
+
+
+def _video_signature(video_path):
+    """ขนาดไฟล์ + mtime ใช้ตรวจว่า index ยังตรงกับวิดีโอหรือไม่"""
+    st = os.stat(video_path)
+    return {"size": st.st_size, "mtime": int(st.st_mtime)}
+
+
+def _probe_keyframes(video_path, fps):
+    """อ่านเวลา keyframe จาก packet flags ด้วย ffprobe (ไม่ต้อง decode ภาพ)"""
+    ffprobe = shutil.which("ffprobe")
+    if ffprobe is None or not fps:
+        return None
+    cmd = [ffprobe, "-v", "error", "-select_streams", "v:0",
+           "-show_entries", "packet=pts_time,flags", "-of", "csv=p=0", video_path]
+    try:
+        out = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                             text=True, timeout=300).stdout
+    except Exception as e:
+        print(f"Warn: ffprobe keyframe scan failed: {e}")
+        return None
+    # frame number ของ OpenCV นับจากเฟรมแรกที่แสดง (= pts ต่ำสุดของ stream) ไม่ใช่จาก pts 0
+    # (ไฟล์ที่ตัดมาจาก NVR/mpegts มักเริ่มที่ pts > 0) -> ลบ pts เริ่มต้นก่อนแปลงเป็นเฟรม
+    packets = []
+    for line in out.splitlines():
+        parts = line.strip().split(",")
+        if len(parts) < 2: continue
+        try: packets.append((float(parts[0]), "K" in parts[1]))
+        except ValueError: continue
+    if not packets: return None
+    start = min(pts for pts, _ in packets)
+    keyframes = {int(round((pts - start) * fps)) for pts, key in packets if key}
+    return sorted(keyframes) if keyframes else None
+
+
+def load_keyframe_index(video_path, fps):
+    """
+    โหลด keyframe index จาก cache ถ้า signature ตรงกัน, ถ้าไม่ตรง/ไม่มีให้สร้างใหม่
+    คืนค่า list ของ frame number ที่เป็น keyframe หรือ None ถ้าสร้างไม่ได้
+    """
+    path = _index_path(video_path)
+    try: signature = _video_signature(video_path)
+    except OSError: return None
+
+    try:
+        with open(path, "r", encoding='utf-8') as f: cached = json.load(f)
+        if cached.get("version") == KEYFRAME_INDEX_VERSION and cached.get("signature") == signature \
+           and abs(cached.get("fps", 0) - fps) < 1e-3:
+            return cached.get("keyframes")
+    except (OSError, ValueError):
+        pass
+
+    keyframes = _probe_keyframes(video_path, fps)
+    if keyframes is None:
+        return None
+    try:
+        with open(path, "w", encoding='utf-8') as f:
+            json.dump({"version": KEYFRAME_INDEX_VERSION, "signature": signature,
+                       "fps": fps, "keyframes": keyframes}, f)
+        print(f"Saved keyframe index: {path} ({len(keyframes)} keyframes)")
+    except OSError as e:
+        print(f"Warn: Could not write keyframe index {path}: {e}")
+    return keyframes
+
+
+def _nearest_keyframe_before(keyframes, target_frame):
+    best = 0
+    for kf in keyframes:
+        if kf > target_frame: break
+        best = kf
+    return best
+
+
+def seek_to_msec(cap, video_path, target_msec):
+    """
+    Seek ไปยังเฟรมแรกที่เวลา >= target_msec แบบ frame-accurate
+    1. กระโดดไป keyframe ที่ใกล้ที่สุดก่อนเป้าหมาย (จาก index)
+    2. cap.grab() ไปข้างหน้าจนถึงเฟรมเป้าหมาย (ไม่ต้องแปลงเป็น BGR)
+    คืนค่า frame number ของเฟรมถัดไปที่ cap.read() จะได้
+    """
+    if target_msec <= 0:
+        return int(cap.get(cv2.CAP_PROP_POS_FRAMES))
+    fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+    if fps <= 0:
+        # ไม่รู้ fps -> ปล่อยให้ backend seek ตามเวลาเอง
+        cap.set(cv2.CAP_PROP_POS_MSEC, target_msec)
+        return int(cap.get(cv2.CAP_PROP_POS_FRAMES))
+
+    target_frame = int(math.ceil(target_msec / 1000.0 * fps - 1e-6))
+    return seek_to_frame(cap, video_path, target_frame)
+
+
+def seek_to_frame(cap, video_path, target_frame):
+    """Seek ไปยังเฟรมหมายเลข target_frame (keyframe ก่อนหน้า + grab) คืน frame number ของเฟรมถัดไปที่ cap.read() จะได้"""
+    fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    if frame_count > 0: target_frame = min(target_frame, frame_count)
+
+    keyframes = load_keyframe_index(video_path, fps) if fps > 0 else None
+    if not keyframes:
+        # ไม่มี index (เช่น ไม่มี ffprobe) -> ให้ backend seek + decode ไปข้างหน้าเอง
+        cap.set(cv2.CAP_PROP_POS_FRAMES, target_frame)
+        return int(cap.get(cv2.CAP_PROP_POS_FRAMES))
+
+    kf_frame = _nearest_keyframe_before(keyframes, target_frame)
+    cap.set(cv2.CAP_PROP_POS_FRAMES, kf_frame)
+    pos = int(cap.get(cv2.CAP_PROP_POS_FRAMES))
+    while pos < target_frame:
+        if not cap.grab(): break
+        pos += 1
+    return pos
+
+
+class FrameSource:
+    """
+    อ่านเฟรมตามหมายเลข (random access) เช่น snapshot ตอน replay: เรียก source(frame_idx) -> ภาพ BGR หรือ None
+    เฟรมที่ขอเรียงไปข้างหน้าใกล้ๆ กันจะ grab ต่อจากตำแหน่งเดิม ไม่ต้อง seek ใหม่ทุกครั้ง
+    """
+    def __init__(self, video_path, max_forward=250):
+        self.video_path = video_path; self.max_forward = max_forward
+        self._cap = None; self._pos = None
+        self.reads = 0; self.seeks = 0
+
+    def __call__(self, frame_idx):
+        if self._cap is None:
+            self._cap = cv2.VideoCapture(self.video_path)
+            if not self._cap.isOpened(): raise IOError(f"Cannot open video: {self.video_path}")
+        if self._pos is None or frame_idx < self._pos or frame_idx - self._pos > self.max_forward:
+            self._pos = seek_to_frame(self._cap, self.video_path, frame_idx); self.seeks += 1
+        while self._pos < frame_idx:
+            if not self._cap.grab(): return None
+            self._pos += 1
+        ok, frame = self._cap.read()
+        if not ok: self._pos = None; return None
+        self._pos += 1; self.reads += 1
+        return frame
+
+    def close(self):
+        if self._cap is not None: self._cap.release(); self._cap = None
+
+
+# ====================== PREFETCH DECODER =========================
+_EOS = object()  # สัญญาณจบ stream (ทั้งกรณีจบวิดีโอปกติและกรณี error)
+
+
+class FrameReader:
+    """
+    อ่านเฟรมจาก cv2.VideoCapture โดย decode ล่วงหน้าใน background thread
+    ลง ring ของ frame buffer ที่จองไว้ล่วงหน้า (prefetch ช่อง)
+
+    read() คืน (ok, frame, msec, frame_idx); frame ที่ได้เป็น buffer ใน ring
+    ใช้ได้ (และวาดทับได้) จนกว่าจะเรียก read() ครั้งถัดไป ถ้าต้องเก็บไว้นานกว่านั้นให้ .copy()
+    เมื่อ ring เต็ม decoder จะรอ (backpressure); prefetch <= 0 = อ่านใน thread เดียวกันแบบเดิม
+
+    stride > 1: ส่งเฉพาะทุกๆ stride เฟรม เฟรมที่ข้ามจะใช้แค่ cap.grab() (ไม่ retrieve/แปลง BGR)
+    msec/frame_idx ที่คืนเป็นเวลาจริงของเฟรมนั้นในวิดีโอ
+    """
+    def __init__(self, cap, prefetch=8, stride=1):
+        self._cap = cap
+        self._stride = max(1, int(stride))
+        self._next_idx = int(cap.get(cv2.CAP_PROP_POS_FRAMES))
+        self._last_msec = cap.get(cv2.CAP_PROP_POS_MSEC)
+        self._threaded = prefetch > 0
+        self.error = None
+        if not self._threaded: return
+
+        w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)); h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self._buffers = [np.empty((h, w, 3), dtype=np.uint8) for _ in range(prefetch)]
+        self._free = queue.Queue()
+        self._ready = queue.Queue()
+        for slot in range(prefetch): self._free.put(slot)
+        self._held = None
+        self._stop = threading.Event()
+        self._finished = False
+        self._thread = threading.Thread(target=self._decode_loop, name="FrameReader", daemon=True)
+        self._thread.start()
+
+    def _next_free_slot(self):
+        while not self._stop.is_set():
+            try: return self._free.get(timeout=0.1)
+            except queue.Empty: continue
+        return None
+
+    def _skip(self):
+        """grab() เฟรมที่ไม่ต้องวิเคราะห์ทิ้งไป คืนจำนวนเฟรมที่ข้ามได้จริง"""
+        skipped = 0
+        while skipped < self._stride - 1 and self._cap.grab(): skipped += 1
+        return skipped
+
+    def _decode_loop(self):
+        frame_idx = self._next_idx
+        try:
+            while True:
+                slot = self._next_free_slot()
+                if slot is None: break
+                ok, buf = self._cap.read(self._buffers[slot])
+                if not ok: break
+                if buf is not self._buffers[slot]: self._buffers[slot] = buf  # ขนาดเฟรมเปลี่ยนกลางไฟล์
+                self._ready.put((slot, self._cap.get(cv2.CAP_PROP_POS_MSEC), frame_idx))
+                frame_idx += 1 + self._skip()
+        except Exception as e:
+            self.error = e
+        finally:
+            self._ready.put(_EOS)
+
+    def read(self):
+        if not self._threaded:
+            ok, frame = self._cap.read()
+            if not ok: return False, None, None, None
+            self._last_msec = self._cap.get(cv2.CAP_PROP_POS_MSEC)
+            frame_idx = self._next_idx; self._next_idx += 1 + self._skip()
+            return True, frame, self._last_msec, frame_idx
+
+        if self._held is not None:
+            self._free.put(self._held); self._held = None
+        if self._finished: return False, None, None, None
+        item = self._ready.get()
+        if item is _EOS:
+            self._finished = True
+            if self.error is not None: raise IOError(f"Video decode failed: {self.error}")
+            return False, None, None, None
+        slot, msec, frame_idx = item
+        self._held = slot; self._last_msec = msec
+        return True, self._buffers[slot], msec, frame_idx
+
+    @property
+    def position_msec(self):
+        """เวลา (ms) ของเฟรมล่าสุดที่ส่งให้ผู้เรียก"""
+        return self._last_msec
+
+    def stop(self):
+        """หยุด decoder thread (ต้องเรียกก่อน cap.release())"""
+        if not self._threaded: return
+        self._stop.set()
+        # join แบบไม่มี timeout: ถ้าคืนก่อน thread จบ cap.release() จะชนกับ cap.read() ที่ค้างอยู่ (use-after-release)
+        # decoder เช็ค _stop ทุกเฟรม/ทุก 0.1 วินาที จึงรอแค่ read ที่กำลังทำอยู่ให้เสร็จ
+        self._thread.join()
+
+
+# ====================== SHARED FRAME RING =========================
+class FrameRing:
+    """
+    เก็บสำเนาเฟรมแบบ reference-counted โดยใช้ frame index เป็น key
+    (แทนการให้ person state แต่ละคนเก็บ frame.copy() ของตัวเอง)
+
+    put(idx, frame) คัดลอกเฟรมเข้ามา 1 ครั้งต่อ frame index แล้วคืน idx (เพิ่ม ref ให้ 1)
+    release(idx) ลด ref; เมื่อ ref เป็น 0 buffer จะกลับเข้า pool เพื่อใช้ซ้ำ (ไม่ต้องจองใหม่)
+    """
+    def __init__(self, max_free=4):
+        self._frames = {}   # idx -> [buffer, refcount]
+        self._free = []     # buffer ที่ว่างแล้ว (ใช้ซ้ำได้ถ้าขนาดตรงกัน)
+        self._max_free = max_free
+        self.peak_frames = 0
+        self.peak_bytes = 0
+
+    def put(self, frame_idx, frame):
+        entry = self._frames.get(frame_idx)
+        if entry is not None:
+            entry[1] += 1; return frame_idx
+        buf = None
+        while self._free:
+            cand = self._free.pop()
+            if cand.shape == frame.shape and cand.dtype == frame.dtype: buf = cand; break
+        if buf is None: buf = np.empty_like(frame)
+        np.copyto(buf, frame)
+        self._frames[frame_idx] = [buf, 1]
+        held = len(self._frames)
+        if held > self.peak_frames:
+            self.peak_frames = held
+            self.peak_bytes = max(self.peak_bytes, sum(e[0].nbytes for e in self._frames.values()))
+        return frame_idx
+
+    def get(self, frame_idx):
+        entry = self._frames.get(frame_idx)
+        return entry[0] if entry is not None else None
+
+    def release(self, frame_idx):
+        entry = self._frames.get(frame_idx)
+        if entry is None: return
+        entry[1] -= 1
+        if entry[1] <= 0:
+            del self._frames[frame_idx]
+            if len(self._free) < self._max_free: self._free.append(entry[0])
+
+    def __len__(self):
+        return len(self._frames)
+
+    def __contains__(self, frame_idx):
+        return frame_idx in self._frames
+
+    def stats(self):
+        return {"frame_ring_peak_frames": self.peak_frames,
+                "frame_ring_peak_mb": round(self.peak_bytes / (1024 * 1024), 1)}
+
+
+def current_memory_mb():
+    """RSS ปัจจุบันของ process (MB) จาก psutil หรือ /proc (Linux), ไม่ได้ -> None"""
+    try:
+        import psutil
+        return round(psutil.Process().memory_info().rss / (1024 * 1024), 1)
+    except Exception:
+        pass
+    try:
+        with open("/proc/self/statm") as f: pages = int(f.read().split()[1])
+        return round(pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024), 1)
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def peak_memory_mb():
+    """Peak RSS ของ process (MB) จาก resource (Linux/macOS) หรือ psutil (ถ้ามี), ไม่ได้ -> None"""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux รายงานเป็น KB, macOS เป็น bytes
+        return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)
+    except ImportError:
+        pass
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        return round(getattr(info, "peak_wset", info.rss) / (1024 * 1024), 1)
+    except Exception:
+        return None
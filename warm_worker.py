@@ -0,0 +1,206 @@
+import os
+import io
+import gc
+import sys
+import time
+import threading
+import traceback
+import contextlib
+import multiprocessing as mp
+from collections import namedtuple
+
+# ผลของ 1 task (ให้หน้าตาเหมือนผลจาก subprocess เดิม: returncode/stdout/stderr)
+TaskResult = namedtuple("TaskResult", "returncode stdout stderr elapsed_s")
+
+
+# ====================== CPU BUDGET =========================
+_THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS", "NUMEXPR_NUM_THREADS")
+
+
+def available_cpus():
+    if hasattr(os, "sched_getaffinity"): return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def cpu_sets(workers):
+    """แบ่ง core ที่ใช้ได้ให้ worker แต่ละตัวเท่าๆ กัน (ไม่ซ้อนกัน) -> list ของ list core id"""
+    cpus = available_cpus(); workers = max(1, int(workers))
+    per = max(1, len(cpus) // workers)
+    return [cpus[(i * per) % len(cpus):(i * per) % len(cpus) + per] for i in range(workers)]
+
+
+def thread_env(n_threads, base=None):
+    """environment สำหรับ subprocess ที่จำกัดจำนวน thread ของ OpenMP/MKL/BLAS (torch ใช้ค่านี้ตอน import)"""
+    env = dict(os.environ if base is None else base)
+    for var in _THREAD_ENV_VARS: env[var] = str(n_threads)
+    return env
+
+
+def set_affinity(cpu_set, pid=0):
+    """ผูก process (pid=0 = process ปัจจุบัน) กับ core ที่กำหนด (Linux: sched_setaffinity, Windows: psutil ถ้ามี; macOS ไม่รองรับ)"""
+    if not cpu_set: return False
+    try:
+        if hasattr(os, "sched_setaffinity"): os.sched_setaffinity(pid, cpu_set); return True
+        import psutil
+        psutil.Process(pid or None).cpu_affinity(list(cpu_set)); return True
+    except Exception:
+        return False
+
+
+def apply_cpu_budget(cpu_set):
+    """ใช้ใน worker ก่อน import torch: env thread limits + affinity + cv2.setNumThreads"""
+    n = max(1, len(cpu_set))
+    for var in _THREAD_ENV_VARS: os.environ[var] = str(n)
+    set_affinity(cpu_set)
+    import cv2
+    cv2.setNumThreads(n)
+
+
+def limit_torch_threads(n):
+    torch = sys.modules.get("torch")
+    if torch is not None: torch.set_num_threads(max(1, n))
+
+
+def _exit_code(e):
+    if e.code is None: return 0
+    if isinstance(e.code, int): return e.code
+    print(e.code, file=sys.stderr); return 1
+
+
+class _LineWriter(io.TextIOBase):
+    """stdout/stderr ของ worker: ส่งทีละบรรทัดกลับทาง pipe ทันที (ไม่เก็บ output ทั้ง task ไว้ใน memory)"""
+    def __init__(self, conn, stream, lock):
+        self._conn = conn; self._stream = stream; self._lock = lock; self._buf = ""
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        with self._lock: # print จาก thread อื่น (เช่น OutputSink) ต้องไม่แทรกกลาง message ใน pipe
+            self._buf += text
+            *lines, self._buf = self._buf.split("\n")
+            for line in lines: self._conn.send(("line", self._stream, line))
+        return len(text)
+
+    def flush(self):
+        with self._lock:
+            if self._buf: self._conn.send(("line", self._stream, self._buf)); self._buf = ""
+
+
+def _serve(conn, cpu_set=None):
+    """
+    loop ของ worker process: import ai_personCount + โหลด YOLO ครั้งเดียว
+    แล้วรับ argv ทาง pipe -> เรียก ai_personCount.main(argv) -> ส่งผลกลับ (None = ปิด worker)
+    """
+    if cpu_set: apply_cpu_budget(cpu_set)
+    import ai_personCount
+    from video_io import current_memory_mb
+    try:
+        ai_personCount.load_model()
+        if cpu_set: limit_torch_threads(len(cpu_set))
+    except Exception as e:
+        conn.send(("error", f"{type(e).__name__}: {e}")); return
+    conn.send(("ready", os.getpid()))
+    while True:
+        try: argv = conn.recv()
+        except (EOFError, KeyboardInterrupt): break
+        if argv is None: break
+        lock = threading.Lock(); code = 0
+        out, err = _LineWriter(conn, "stdout", lock), _LineWriter(conn, "stderr", lock)
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(out), contextlib.redirect_stderr(err):
+            try: ai_personCount.main(list(argv))
+            except SystemExit as e: code = _exit_code(e)
+            except BaseException: traceback.print_exc(); code = 1
+            out.flush(); err.flush()
+        gc.collect()
+        with lock: conn.send(("done", code, time.perf_counter() - started, current_memory_mb()))
+
+
+class WarmWorker:
+    """
+    ตัวจัดการ worker process 1 ตัวที่ถือ model/imports ค้างไว้ระหว่างวิดีโอ (สื่อสารผ่าน multiprocessing Pipe)
+    - start ตอน run() ครั้งแรก (หรือเรียก start() ล่วงหน้าเพื่อ warm ก่อน)
+    - recycle (ปิดแล้วเปิดใหม่) เมื่อรันครบ max_tasks, RSS เกิน max_rss_mb, worker ตาย หรือ task เกิน timeout
+    ใช้ spawn เสมอ เพื่อให้ worker สะอาดและทำงานเหมือนกันทั้ง Windows/Linux/macOS
+    """
+    def __init__(self, max_tasks=20, max_rss_mb=None, startup_timeout=600.0, name="warm-worker", cpu_set=None):
+        self.max_tasks = max_tasks; self.max_rss_mb = max_rss_mb; self.cpu_set = cpu_set
+        self.startup_timeout = startup_timeout; self.name = name
+        self._ctx = mp.get_context("spawn")
+        self._proc = None; self._conn = None
+        self.tasks_done = 0; self.recycles = 0
+
+    @property
+    def alive(self):
+        return self._proc is not None and self._proc.is_alive()
+
+    def start(self):
+        if self.alive: return
+        parent_conn, child_conn = self._ctx.Pipe()
+        self._proc = self._ctx.Process(target=_serve, args=(child_conn, self.cpu_set), name=self.name, daemon=True)
+        self._proc.start(); child_conn.close()
+        self._conn = parent_conn; self.tasks_done = 0
+        started = time.perf_counter()
+        if not self._conn.poll(self.startup_timeout):
+            self.stop(); raise RuntimeError(f"{self.name}: worker did not become ready in {self.startup_timeout:.0f}s")
+        try: msg = self._conn.recv()
+        except EOFError:
+            self._proc.join(timeout=5.0); msg = ("error", f"worker exited with code {self._proc.exitcode}")
+        if msg[0] != "ready":
+            self.stop(); raise RuntimeError(f"{self.name}: worker failed to start: {msg[1]}")
+        print(f"{self.name}: started pid {msg[1]} (model warm in {time.perf_counter() - started:.1f}s)")
+
+    def run(self, argv, timeout=None, on_line=None):
+        """
+        รัน ai_personCount ด้วย argv (ไม่รวมชื่อ script) ใน worker; คืน TaskResult
+        on_line(stream, line) ถูกเรียกทุกบรรทัดที่ worker พิมพ์ (stream = "stdout"/"stderr")
+        ถ้าให้ on_line มา stdout/stderr ใน TaskResult จะว่าง (ไม่เก็บ output ไว้ใน memory)
+        """
+        self.start()
+        started = time.perf_counter()
+        captured = {"stdout": [], "stderr": []}
+        self._conn.send(list(argv))
+        msg = None
+        while msg is None:
+            if timeout is not None and time.perf_counter() - started > timeout:
+                self.stop()
+                return TaskResult(-1, "", f"{self.name}: task timed out after {timeout:.0f}s; worker killed", time.perf_counter() - started)
+            if self._conn.poll(1.0):
+                try: msg = self._conn.recv()
+                except EOFError: break
+                if msg[0] == "line":
+                    if on_line is not None: on_line(msg[1], msg[2])
+                    else: captured[msg[1]].append(msg[2])
+                    msg = None
+            elif not self._proc.is_alive():
+                break
+        if msg is None:
+            self._proc.join(timeout=5.0); exitcode = self._proc.exitcode
+            self.stop()
+            return TaskResult(-1, "", f"{self.name}: worker died (exit code {exitcode}); it will be restarted", time.perf_counter() - started)
+
+        _, code, elapsed, rss_mb = msg
+        self.tasks_done += 1
+        if self.max_tasks and self.tasks_done >= self.max_tasks:
+            print(f"{self.name}: recycling after {self.tasks_done} tasks"); self.recycle()
+        elif self.max_rss_mb and rss_mb is not None and rss_mb > self.max_rss_mb:
+            print(f"{self.name}: recycling, RSS {rss_mb:.0f} MB > {self.max_rss_mb} MB"); self.recycle()
+        return TaskResult(code, "\n".join(captured["stdout"]), "\n".join(captured["stderr"]), elapsed)
+
+    def recycle(self):
+        self.stop(); self.recycles += 1
+
+    def stop(self):
+        """ขอให้ worker ปิดเอง แล้ว terminate ถ้าไม่ปิดภายในเวลา"""
+        if self._proc is None: return
+        try:
+            if self._proc.is_alive(): self._conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self._proc.join(timeout=10.0)
+        if self._proc.is_alive():
+            self._proc.terminate(); self._proc.join(timeout=5.0)
+        try: self._conn.close()
+        except OSError: pass
+        self._proc = None; self._conn = None